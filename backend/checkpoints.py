@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+from job_store import job_key
+
+load_dotenv()
+
+# changable variables
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./checkpoints.db")
+
+# pipeline stages of a job, a checkpoint only moves forward
+SEARCHED = 1    # returned by the portal search, not scored yet
+SCORED = 2      # kept by filtering, preranking and LLM scoring, to be applied
+DOCUMENTS = 3   # resume, cover letter and evidence points generated
+SUBMITTED = 4   # application accepted by the portal, not stored as applied yet
+
+STAGE_NAMES = {SEARCHED: "searched", SCORED: "scored", DOCUMENTS: "documents", SUBMITTED: "submitted"}
+
+
+class CheckpointStore:
+    """
+    Durable progress of every job in a user's pipeline (sqlite, one connection per thread),
+    so a restarted backend resumes from the last finished stage instead of redoing the LLM work.
+    A checkpoint is cleared once the job reaches a job store list. Also remembers which users
+    are active, their pipelines are started again on startup, and when each user last searched.
+    The database is shared by the API and the worker shard processes.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_checkpoints ("
+                " user_id TEXT NOT NULL,"
+                " job_id TEXT NOT NULL,"
+                " stage INTEGER NOT NULL,"
+                " job TEXT NOT NULL,"
+                " documents TEXT,"
+                " from_state TEXT,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (user_id, job_id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS active_users ("
+                " user_id TEXT PRIMARY KEY,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_searches ("
+                " user_id TEXT PRIMARY KEY,"
+                " searched_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def save(self, user_id: str, stage: int, jobs: list, from_state: str = None, documents: dict = None):
+        """Checkpoint `jobs` at `stage`. A job already at a later stage keeps its checkpoint."""
+        if not jobs:
+            return
+        now = time.time()
+        docs = json.dumps(documents) if documents is not None else None
+        rows = [(str(user_id), str(job_key(job)), stage, json.dumps(job), docs, from_state, now) for job in jobs]
+        conn = self._conn()
+        conn.executemany(
+            "INSERT INTO job_checkpoints (user_id, job_id, stage, job, documents, from_state, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (user_id, job_id) DO UPDATE SET"
+            "  stage = excluded.stage, job = excluded.job,"
+            "  documents = COALESCE(excluded.documents, documents),"
+            "  from_state = COALESCE(excluded.from_state, from_state),"
+            "  updated_at = excluded.updated_at"
+            " WHERE excluded.stage >= job_checkpoints.stage",
+            rows
+        )
+        conn.commit()
+
+    def advance(self, user_id: str, job_id: str, stage: int):
+        conn = self._conn()
+        conn.execute(
+            "UPDATE job_checkpoints SET stage = ?, updated_at = ? WHERE user_id = ? AND job_id = ? AND stage < ?",
+            (stage, time.time(), str(user_id), str(job_id), stage)
+        )
+        conn.commit()
+
+    def clear(self, user_id: str, job_ids: list):
+        if not job_ids:
+            return
+        conn = self._conn()
+        conn.executemany(
+            "DELETE FROM job_checkpoints WHERE user_id = ? AND job_id = ?",
+            [(str(user_id), str(job_id)) for job_id in job_ids]
+        )
+        conn.commit()
+
+    def _row(self, row) -> dict:
+        job_id, stage, job, documents, from_state = row
+        return {
+            "job_id": job_id,
+            "stage": stage,
+            "job": json.loads(job),
+            "documents": json.loads(documents) if documents else None,
+            "from_state": from_state,
+        }
+
+    def get(self, user_id: str, job_id: str):
+        row = self._conn().execute(
+            "SELECT job_id, stage, job, documents, from_state FROM job_checkpoints WHERE user_id = ? AND job_id = ?",
+            (str(user_id), str(job_id))
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def load(self, user_id: str) -> list:
+        """Every checkpoint of the user, furthest stage first."""
+        rows = self._conn().execute(
+            "SELECT job_id, stage, job, documents, from_state FROM job_checkpoints"
+            " WHERE user_id = ? ORDER BY stage DESC, rowid",
+            (str(user_id),)
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def set_active(self, user_id: str, active: bool):
+        conn = self._conn()
+        if active:
+            conn.execute("INSERT OR REPLACE INTO active_users (user_id, updated_at) VALUES (?, ?)", (str(user_id), time.time()))
+        else:
+            conn.execute("DELETE FROM active_users WHERE user_id = ?", (str(user_id),))
+        conn.commit()
+
+    def active_users(self) -> list:
+        return [row[0] for row in self._conn().execute("SELECT user_id FROM active_users ORDER BY updated_at")]
+
+    def set_last_search(self, user_id: str, searched_at: float = None):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO user_searches (user_id, searched_at) VALUES (?, ?)",
+            (str(user_id), searched_at if searched_at is not None else time.time())
+        )
+        conn.commit()
+
+    def last_search(self, user_id: str):
+        """Time of the user's last job search, None if it never searched."""
+        row = self._conn().execute("SELECT searched_at FROM user_searches WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row[0] if row else None
+
+
+checkpoints = CheckpointStore()
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+from job_store import job_store , job_key , STATES , HEAVY_FIELDS
+from checkpoints import checkpoints
+
+load_dotenv()
+
+# changable variables
+DASHBOARD_RECENT_JOBS = int(os.getenv("DASHBOARD_RECENT_JOBS", 5))
+DASHBOARD_MAX_USERS = int(os.getenv("DASHBOARD_MAX_USERS", 1024))  # users whose numbers are kept, least recently read go first
+
+
+def _summary(job:dict) -> dict:
+    return {k: v for k, v in job.items() if k not in HEAVY_FIELDS}
+
+
+class DashboardStats:
+    """
+    Per-user numbers of the dashboard: size of every job list, its latest jobs and the last search time.
+    A user is read from the store once (list sizes and the latest jobs, no full list scan),
+    after that the store's change events keep the numbers up to date. A list changed by another
+    process (event without a size) is read again. The last search time is kept in the checkpoint
+    database, searches run in the worker processes. At most `max_users` users are kept, an evicted
+    user is read from the store again on the next request.
+    """
+
+    def __init__(self, store = job_store , recent:int = DASHBOARD_RECENT_JOBS , progress = checkpoints ,
+                 max_users:int = DASHBOARD_MAX_USERS):
+        self.store = store
+        self.recent = recent
+        self.progress = progress
+        self.max_users = max(1, max_users)
+        # user_id -> {"counts": {state: int or None}, "recent": {state: [(cursor, job)] newest first or None}}, least recently read first
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+        store.add_listener(self._on_change)
+
+    def _load(self, user_id:str) -> dict:
+        # called with self._lock held
+        user = self._users.get(user_id)
+        if user is None:
+            user = {
+                "counts": {state: self.store.count(user_id, state) for state in STATES},
+                "recent": {state: None for state in STATES},
+            }
+            self._users[user_id] = user
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return user
+
+    def _on_change(self, user_id:str , state:str , old_version:str , new_version:str , size:int , puts:list , deletes:list):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return
+            if size is None:
+                # changed by another process, read it again on the next request
+                user["counts"][state] = None
+                user["recent"][state] = None
+                return
+            user["counts"][state] = size
+
+            recent = user["recent"][state]
+            if recent is None:
+                return
+            # the last put of an id wins
+            latest_puts = {job_key(job): (cursor, job) for cursor, job in puts}
+            changed = set(str(job_id) for job_id in deletes) | set(latest_puts)
+            recent = [(cursor, job) for cursor, job in recent if job_key(job) not in changed]
+            recent.extend((cursor, _summary(job)) for cursor, job in latest_puts.values())
+            recent.sort(key=lambda item: item[0], reverse=True)
+
+            # deletes may leave fewer jobs than the list holds, read them again on the next request
+            if len(recent) < min(self.recent, size):
+                user["recent"][state] = None
+            else:
+                user["recent"][state] = recent[:self.recent]
+
+    def record_search(self, user_id:str):
+        self.progress.set_last_search(user_id, time.time())
+
+    def get(self, user_id:str) -> dict:
+        user_id = str(user_id)
+        with self._lock:
+            user = self._load(user_id)
+            for state in STATES:
+                if user["counts"][state] is None:
+                    user["counts"][state] = self.store.count(user_id, state)
+            counts = dict(user["counts"])
+            recent = {}
+            for state in STATES:
+                if user["recent"][state] is None:
+                    records = self.store.latest(user_id, state, self.recent)
+                    user["recent"][state] = [(cursor, _summary(job)) for cursor, job in records]
+                recent[state] = [job for _, job in user["recent"][state]]
+        last_search = self.progress.last_search(user_id)
+
+        counts["total"] = sum(counts[state] for state in STATES)
+        return {
+            "counts": counts,
+            "recent": recent,
+            "last_search_at": datetime.utcfromtimestamp(last_search).isoformat() if last_search else None,
+        }
+
+
+dashboard_stats = DashboardStats()
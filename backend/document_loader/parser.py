@@ -9,6 +9,8 @@ import pymupdf4llm
 from dotenv import load_dotenv
 import uuid
 
+from llm_scheduler import llm_scheduler , PRIORITY_INTERACTIVE
+
 load_dotenv()
 
 
@@ -131,12 +133,30 @@ def _clean_model_response(response: str) -> dict:
     return json.loads(json_str)
 
 
+def _clean_model_array_response(response: str) -> list:
+    print("[parser] Cleaning model response and extracting JSON array...")
+    # Remove code fences and extract JSON array
+    response = re.sub(r"```json|```", "", response).strip().strip("'")
+    clean_json = response.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ').strip()
+
+    start_idx = clean_json.find('[')
+    end_idx = clean_json.rfind(']')
+
+    if start_idx == -1 or end_idx == -1:
+        raise ValueError("No JSON array found in model response")
+
+    result = json.loads(clean_json[start_idx:end_idx + 1])
+    if not isinstance(result, list):
+        raise ValueError("Model response is not a JSON array")
+    return result
+
+
 def parse_markdown_and_extract(markdown: str) -> dict:
     print("[parser] Parsing markdown and extracting structured data via LLM...")
     model = _build_model()
     prompt = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("human", HUMAN_PROMPT)])
     chain = prompt | model
-    resp = chain.invoke({"resume_text": markdown}).content
+    resp = llm_scheduler.invoke(chain, {"resume_text": markdown}, priority=PRIORITY_INTERACTIVE).content
     print(resp)
     return _clean_model_response(resp)
 
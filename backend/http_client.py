@@ -0,0 +1,84 @@
+import os
+import asyncio
+import threading
+import importlib.util
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_BASE_URL = os.environ["API_BASE_URL"]
+
+# changable variables
+PORTAL_HTTP_MAX_CONNECTIONS = int(os.getenv("PORTAL_HTTP_MAX_CONNECTIONS", 20))
+PORTAL_HTTP_MAX_KEEPALIVE = int(os.getenv("PORTAL_HTTP_MAX_KEEPALIVE", 10))
+PORTAL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("PORTAL_HTTP_KEEPALIVE_EXPIRY", 30))  # sec
+PORTAL_HTTP_CONNECT_TIMEOUT = float(os.getenv("PORTAL_HTTP_CONNECT_TIMEOUT", 5))  # sec
+PORTAL_HTTP_READ_TIMEOUT = float(os.getenv("PORTAL_HTTP_READ_TIMEOUT", 30))  # sec
+# only used when the h2 package is installed
+PORTAL_HTTP2 = os.getenv("PORTAL_HTTP2", "false").lower() == "true"
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PortalHTTP:
+    """
+    Keep-alive connection pool for every call to the job portal (API_BASE_URL).
+    An httpx client is bound to the event loop it runs on, so there is one pooled client per loop:
+    the server loop opens its client with the app lifespan, every worker loop gets one on first use
+    and closes it when the worker ends.
+    """
+
+    def __init__(self, base_url:str = API_BASE_URL):
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=PORTAL_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=PORTAL_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=PORTAL_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = httpx.Timeout(PORTAL_HTTP_READ_TIMEOUT, connect=PORTAL_HTTP_CONNECT_TIMEOUT)
+        self.http2 = PORTAL_HTTP2 and HTTP2_AVAILABLE
+        if PORTAL_HTTP2 and not HTTP2_AVAILABLE:
+            print("PORTAL_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+
+        # event loop -> client
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                # drop clients of loops that ended without closing them
+                for old_loop in [l for l in self._clients if l.is_closed()]:
+                    del self._clients[old_loop]
+                client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    limits=self.limits,
+                    timeout=self.timeout,
+                    http2=self.http2,
+                )
+                self._clients[loop] = client
+            return client
+
+    async def start(self):
+        self.client()
+
+    async def close(self):
+        """Close the client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    async def post(self, path:str , **kwargs) -> httpx.Response:
+        return await self.client().post(path, **kwargs)
+
+    async def get(self, path:str , **kwargs) -> httpx.Response:
+        return await self.client().get(path, **kwargs)
+
+
+portal_http = PortalHTTP()
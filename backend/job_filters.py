@@ -0,0 +1,114 @@
+import asyncio
+import numpy as np
+
+from data_types import User
+from notification_bus import notification_bus
+from job_store import job_store , REJECTED
+
+# user preference values (see frontend onboarding/preferences)
+WORK_MODE_FLAGS = {
+    "Remote": "is_remote",
+    "Hybrid": "is_hybride",
+    "Onsite": "is_onsite",
+}
+SPONSORSHIP_NEEDED_NOW = "yes_now"
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_list(value):
+    # preferences may be stored as a list or as a comma separated string
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def hard_constraint_mismatches(jobs:list , user_data:dict) -> list:
+    """
+    Evaluate the user's hard preferences over the whole job list at once.
+    Returns one list of mismatch reasons per job (empty list = job passes).
+    """
+    n = len(jobs)
+    reasons = [[] for _ in range(n)]
+    if n == 0:
+        return reasons
+
+    # 1. Salary below the user's minimum (jobs without a salary are kept)
+    minimum_salary = _to_float(user_data.get("minimumSalary"))
+    if not np.isnan(minimum_salary):
+        salary = np.array([_to_float(job.get("salary_offered")) for job in jobs])
+        low_salary = ~np.isnan(salary) & (salary < minimum_salary)
+        for i in np.flatnonzero(low_salary):
+            reasons[i].append(f"salary {int(salary[i])} is below the minimum {int(minimum_salary)}")
+
+    # 2. None of the job's work modes is allowed (jobs with no mode flags are kept)
+    allowed_modes = [WORK_MODE_FLAGS[m] for m in _to_list(user_data.get("workMode")) if m in WORK_MODE_FLAGS]
+    if allowed_modes:
+        flags = list(WORK_MODE_FLAGS.values())
+        modes = np.array([[bool(job.get(flag)) for flag in flags] for job in jobs], dtype=bool)
+        allowed = np.array([flag in allowed_modes for flag in flags], dtype=bool)
+        mode_mismatch = modes.any(axis=1) & ~(modes & allowed).any(axis=1)
+        for i in np.flatnonzero(mode_mismatch):
+            offered = [name for name, flag in WORK_MODE_FLAGS.items() if jobs[i].get(flag)]
+            reasons[i].append(f"work mode {'/'.join(offered)} is not in the preferred modes")
+
+    # 3. Visa sponsorship needed but not offered
+    if user_data.get("sponsorshipRequirement") == SPONSORSHIP_NEEDED_NOW:
+        sponsorship = np.array([job.get("visa_sponsorship_offered") is False for job in jobs], dtype=bool)
+        for i in np.flatnonzero(sponsorship):
+            reasons[i].append("visa sponsorship is required but not offered")
+
+    return reasons
+
+
+def reject_jobs(user_id:str , rejected_list:list):
+    """Store jobs as rejected and send the rejected event for each of them (blocking, run it off the event loop)."""
+    job_store.append(user_id, REJECTED, rejected_list)
+
+    for job in rejected_list:
+        role = job.get("title")
+        company = job.get("company")
+        job_id = job.get("id")
+        data = {
+            "type": "rejected",
+            "message": f"Application for {role} in {company} has been discarded.",
+            "job_id": f"{job_id}"
+        }
+        notification_bus.publish(user_id , data)
+
+
+async def prefilter_jobs(user:User , jobs:list , user_data=None):
+    """
+    Rule based stage before LLM ranking.
+    Jobs that break a hard preference are stored as rejected with a generated reason
+    and the user is notified, the remaining jobs are returned in their original order.
+    """
+    if not jobs or user_data is None:
+        return jobs or []
+
+    user_id = str(user.user_id)
+    reasons = hard_constraint_mismatches(jobs, user_data)
+
+    kept = []
+    rejected_list = []
+    for job, job_reasons in zip(jobs, reasons):
+        if not job_reasons:
+            kept.append(job)
+            continue
+
+        job["match_score"] = 0
+        job["match_reason"] = "Rejected by preference filter: " + "; ".join(job_reasons) + "."
+        rejected_list.append(job)
+
+    if rejected_list:
+        print(f"Prefilter rejected {len(rejected_list)} of {len(jobs)} jobs for user {user_id}")
+        await asyncio.to_thread(reject_jobs, user_id, rejected_list)
+
+    return kept
@@ -1,175 +1,207 @@
 from typing import Dict
 import threading
-import time
 import os
-import json
-import requests
 import asyncio
 from dotenv import load_dotenv
 from data_types import User
 from uuid import uuid4
 from datetime import datetime
 import db.mongo_db as db
-from filelock import FileLock
 
-from websocker_handle import websocket_manager
+from notification_bus import notification_bus
+from http_client import portal_http
+from worker_pool import worker_pool
+from retry_policy import portal_retry , FatalError
+from job_store import job_store , job_key , APPLIED , PENDING , CLARIFY
+from checkpoints import checkpoints , SEARCHED , SCORED , DOCUMENTS , SUBMITTED
+from dashboard_stats import dashboard_stats
+from job_filters import prefilter_jobs
+from job_ranker import prerank_jobs , PRERANK_TOP_K
 from llm_handle import separate_and_rank_jobs , generate_clarification , generate_query_for_job_search , generate_resume , generate_cover_letter , generate_evidence_points
 
 load_dotenv()
 
-API_BASE_URL = os.environ["API_BASE_URL"]
-MAX_RETRIES = 3
-RETRY_DELAY = 10 # sec
+# changable variables
+CLARIFICATION_STREAMING = os.getenv("CLARIFICATION_STREAMING", "true").lower() == "true"
+CLARIFICATION_STREAM_INTERVAL = float(os.getenv("CLARIFICATION_STREAM_INTERVAL", 0.1))  # sec
+JOB_SEARCH_TOP_K = int(os.getenv("JOB_SEARCH_TOP_K", 20))  # jobs asked from the portal search per cycle
+
 
 async def submit_application(user:User , job:dict , user_data , resume:str , cover_letter:str , evidence_points:str):
+    """
+    Submit one application to the portal.
+    Raises FatalError for requests that cannot succeed and the httpx error of a failed call,
+    so the retry policy can tell them apart.
+    """
     job_id = job.get("job_id") or job.get("id")
     if not job_id:
-        print("Job id is required in function submit_application")
-        return
+        raise FatalError("Job id is required in function submit_application")
     if not user_data:
-        print("User data is required in function submit_application")
-        return
+        raise FatalError("User data is required in function submit_application")
     if not user.is_active:
-        print("User is not active in function submit_application")
-        return
-    
+        raise FatalError("User is not active in function submit_application")
+
+    # 3. Prepare Payload for the API
+    payload = {
+        "job_id": str(job_id),
+        "user_id": str(user.user_id),
+        "name": user_data.get("full_name"),
+        "phone": user_data.get("phone"),
+        "resume": resume,
+        "cover_letter": cover_letter,
+        "evidence_points": evidence_points
+    }
+
+    # 4. Call the portal apply endpoint through the pooled client
+    response = await portal_http.post("/apply", json=payload)
+    if response.status_code != 200:
+        print(f"API Error: {response.text}")
+    response.raise_for_status()
+
+    data = response.json()
+    print(f"Successfully applied! Status: {data.get('status')}")
+    print("Application result" , data)
+
+    # the application is in, a failed notification must not cause a second submission
     try:
-        # The LLM needs a string representation of the JSON
-        user_json = json.dumps(user_data)
-
-        # 3. Prepare Payload for the API
-        payload = {
-            "job_id": str(job_id),
-            "user_id": str(user.user_id),
-            "name": user_data.get("full_name"),
-            "phone": user_data.get("phone"),
-            "resume": resume,
-            "cover_letter": cover_letter,
-            "evidence_points": evidence_points
+        role = job.get("title") or job.get("role")
+        company = job.get("company")
+        data = {
+            "type": "applied",
+            "message": f"Application for {role} in {company} has been successfully applied.",
+            "job_id": f"{job_id}"
         }
-
-        # 4. Call the FastAPI endpoint
-        # Change URL to your actual deployment address
-        API_URL = f"{API_BASE_URL}/apply" 
-        response = requests.post(API_URL, json=payload)
-
-        if response.status_code == 200:
-            print(f"Successfully applied! Status: {response.json().get('status')}")
-            data = response.json()
-            print("Application result" , data)
-
-            role = job.get("title") or job.get("role")
-            company = job.get("company")
-            job_id = job.get("job_id") or job.get("id")
-            data = {
-                "type": "applied",
-                "message": f"Application for {role} in {company} has been successfully applied.",
-                "job_id": f"{job_id}"
-            }
-            await websocket_manager.send_personal_message(user.user_id , data)
-        else:
-            print(f"API Error: {response.text}")
-            return
-        
+        notification_bus.publish(user.user_id , data)
     except Exception as e:
-        print("Error while applying " , e)
-        return
-
+        print("Error while sending the applied message " , e)
 
-async def job_retry_worker(user:User , job:dict , user_data=None):
-    
-    if user_data is None  :
-        print("User data not present in job_retry_worker fuction")
-        return
-    
-    attempts = 0
-    # 2. Generate AI Documents
-    print(f"--- Generating Application for {job.get('company')} ---")
 
-    print("Generting resume")
+async def generate_application_documents(user:User , job:dict , user_data=None):
+    """
+    Generate the resume, cover letter and evidence points for a job at the same time.
+    Returns a dict with the three artifacts, or None if the user stopped or any artifact failed.
+    """
     if not user.is_active:
         print("User is not active")
-        return
-    resume = generate_resume(user , job , user_data=user_data)
+        return None
 
-    print("Generting cover letter")
-    if not user.is_active:
-        print("User is not active")
-        return
-    cover_letter = generate_cover_letter(user , job , user_data=user_data)
+    generators = {
+        "resume": generate_resume,
+        "cover_letter": generate_cover_letter,
+        "evidence_points": generate_evidence_points,
+    }
+
+    print("Generting resume, cover letter and evidence points")
+    # the generate_* functions are blocking LLM calls, so each runs in its own thread
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fn, user , job , user_data=user_data) for fn in generators.values()),
+        return_exceptions=True
+    )
 
-    print("Generting evidence points")
     if not user.is_active:
         print("User is not active")
-        return
-    evidence_points = generate_evidence_points(user , job , user_data=user_data)
-    
-    job_id = job.get("id")
+        return None
+
+    documents = {}
+    failed = []
+    for name, result in zip(generators, results):
+        if isinstance(result, Exception):
+            print(f"Failed to generate {name} for {job.get('id')}: {result}")
+            failed.append(name)
+        elif not result:
+            print(f"Empty {name} generated for {job.get('id')}")
+            failed.append(name)
+        else:
+            documents[name] = result
 
-    while attempts < MAX_RETRIES and user.is_active:
-        try:
-            if not user.is_active:
-                print("User is not active")
-                return
+    if failed:
+        print(f"Skip applying to {job.get('id')}, failed artifacts: {', '.join(failed)}")
+        return None
 
-            user_dir = f"./{user.user_id}"
-            os.makedirs(user_dir, exist_ok=True)
-
-            await submit_application(user, job , user_data=user_data , resume=resume , cover_letter=cover_letter , evidence_points=evidence_points)
-
-            print(f"User {user.user_id} applied to {job}")
-
-            # write to the applied.json file
-            print(f"--- Write the applied job for user : {user.user_id} ---")
-            payload = {
-                "job_id": str(job_id),
-                "name": user_data.get("full_name"),
-                "email": user_data.get("email"),
-                "phone": user_data.get("phone"),
-                "resume": resume,
-                "cover_letter": cover_letter,
-                "evidence_points": evidence_points
-            }
-        
-            # Path to applied_jobs.json
-            applied_file_path = os.path.join(user_dir, "applied_jobs.json")
-            # Load existing applied jobs (if file exists)
-            if os.path.exists(applied_file_path):
-                with open(applied_file_path, "r") as f:
-                    try:
-                        applied_jobs = json.load(f)
-                    except json.JSONDecodeError:
-                        applied_jobs = []
-            else:
-                applied_jobs = []
-
-            # Append new job
-            payload["job"] = job
-            applied_jobs.append(payload)
-
-            # Save back to applied.json
-            with open(applied_file_path, "w") as f:
-                json.dump(applied_jobs, f, indent=4)
-
-            return
+    return documents
 
-        except Exception as e:
-            attempts += 1
-            print(f"{job} retry {attempts}" , e)
-            time.sleep(RETRY_DELAY)
 
-    print(f"Apply to {job_id} failed or stopped after {attempts} attemps")
+async def job_retry_worker(user:User , job:dict , user_data=None , from_state:str = None):
+    """
+    Generate the documents for a job, submit the application and store it as applied.
+    If `from_state` is given the job is moved from that list to applied in one step.
+    Every finished stage is checkpointed, a job resumed after a restart skips the stages it already passed.
+    Returns True when the application was stored.
+    """
+    if user_data is None  :
+        print("User data not present in job_retry_worker fuction")
+        return False
+
+    job_id = job.get("id")
+    checkpoint = checkpoints.get(user.user_id, job_key(job))
+    if checkpoint is not None and from_state is None:
+        from_state = checkpoint["from_state"]
+
+    # 2. Generate AI Documents
+    if checkpoint is not None and checkpoint["documents"]:
+        print(f"--- Resuming Application for {job.get('company')} ---")
+        documents = checkpoint["documents"]
+    else:
+        print(f"--- Generating Application for {job.get('company')} ---")
+        documents = await generate_application_documents(user , job , user_data=user_data)
+        if documents is None:
+            # a stopped user resumes the job later, a failed one is dropped as before
+            if user.is_active:
+                checkpoints.clear(user.user_id, [job_key(job)])
+            return False
+        checkpoints.save(user.user_id, DOCUMENTS, [job], from_state=from_state, documents=documents)
+
+    resume = documents["resume"]
+    cover_letter = documents["cover_letter"]
+    evidence_points = documents["evidence_points"]
 
+    if not user.is_active:
+        print("User is not active")
+        return False
 
-def find_jobs(user , user_data=None):
+    # a job submitted before a restart must not be submitted twice
+    if checkpoint is None or checkpoint["stage"] < SUBMITTED:
+        try:
+            await portal_retry.run(
+                submit_application, user, job , user_data=user_data , resume=resume , cover_letter=cover_letter , evidence_points=evidence_points,
+                user_id=str(user.user_id), should_continue=lambda: user.is_active
+            )
+        except Exception as e:
+            print(f"Apply to {job_id} failed or stopped: {e}")
+            if user.is_active:
+                checkpoints.clear(user.user_id, [job_key(job)])
+            return False
+        checkpoints.advance(user.user_id, job_key(job), SUBMITTED)
+
+    print(f"User {user.user_id} applied to {job}")
+
+    # store the applied job
+    print(f"--- Write the applied job for user : {user.user_id} ---")
+    payload = {
+        "job_id": str(job_id),
+        "name": user_data.get("full_name"),
+        "email": user_data.get("email"),
+        "phone": user_data.get("phone"),
+        "resume": resume,
+        "cover_letter": cover_letter,
+        "evidence_points": evidence_points,
+        "job": job
+    }
+
+    if from_state is None or not job_store.move(user.user_id, job_id, from_state, APPLIED, data=payload):
+        job_store.append(user.user_id, APPLIED, [payload])
+    checkpoints.clear(user.user_id, [job_key(job)])
+
+    return True
+
+
+async def find_jobs(user , user_data=None):
     if user_data is None : 
         print("User data is required in ")
         return []
 
     jobs = []
     try:
-        url = f"{API_BASE_URL}/search"
-
         if not user.is_active:
             return []
 
@@ -180,22 +212,26 @@ def find_jobs(user , user_data=None):
         """
 
         payload = {
-            "query": query
+            "query": query,
+            "top_k": JOB_SEARCH_TOP_K
         }
 
         if not user.is_active:
             return []
 
-        response = requests.post(url, json=payload)
+        async def search():
+            response = await portal_http.post("/search", json=payload)
+            if response.status_code != 200:
+                print("Error:", response.status_code, response.text)
+            response.raise_for_status()
+            return response
 
-        if response.status_code == 200:
-            data = response.json()
-            jobs = data["results"]
+        response = await portal_retry.run(search, user_id=str(user.user_id), should_continue=lambda: user.is_active)
+        data = response.json()
+        jobs = data["results"]
+        dashboard_stats.record_search(user.user_id)
 
-            # print(data["results"])
-        else:
-            print("Error:", response.status_code, response.text)
-            return []
+        # print(data["results"])
 
     except Exception as e:
         print("jobs json not found" , e)
@@ -213,33 +249,9 @@ def find_jobs(user , user_data=None):
     if not user.is_active:
         return []
             
-    # 3. Handle the storage for the user-specific file
-    user_dir = str(user.user_id)
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
-
-    storage_path = os.path.join(user_dir, 'pending_jobs.json')
-    lock_path = storage_path + ".lock"
-
-    lock = FileLock(lock_path , timeout=10)
-
-    with lock:  # ⛔ blocks other processes until released
-        # 1. Read existing jobs (if file exists)
-        if os.path.exists(storage_path):
-            with open(storage_path, "r") as f:
-                try:
-                    existing_jobs = json.load(f)
-                except json.JSONDecodeError:
-                    existing_jobs = []
-        else:
-            existing_jobs = []
-
-        # 2. Merge jobs
-        updated_jobs = existing_jobs + next_fifteen
-
-        # 3. Write back to file
-        with open(storage_path, "w") as f:
-            json.dump(updated_jobs, f, indent=4)
+    # 3. Queue the rest as pending jobs of the user
+    job_store.append(user.user_id, PENDING, next_fifteen)
+    checkpoints.save(user.user_id, SEARCHED, first_five)
 
     # print(first_five)
 
@@ -247,12 +259,63 @@ def find_jobs(user , user_data=None):
     return first_five
 
 
+async def stream_clarification(user:User , job:dict , user_data):
+    """
+    Generate the clarification report and forward its tokens to the user's sockets while they arrive.
+    Frames: {"type": "clarify_stream", "job_id", "attempt", "index", "delta"}, the tokens of every
+    CLARIFICATION_STREAM_INTERVAL are merged into one frame. A new attempt (after a retry) replaces the text so far.
+    Returns the full report.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    job_id = f"{job.get('job_id') or job.get('id')}"
+
+    def on_token(text:str , attempt:int):
+        # runs in the LLM scheduler thread
+        loop.call_soon_threadsafe(queue.put_nowait, (text, attempt))
+
+    async def forward():
+        index = 0
+        done = False
+        while not done:
+            items = [await queue.get()]
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            if items[-1] is None:
+                items.pop()
+                done = True
+
+            # one frame per attempt present in the batch
+            while items:
+                attempt = items[0][1]
+                delta = "".join(text for text, a in items if a == attempt)
+                items = [item for item in items if item[1] != attempt]
+                if not delta:
+                    continue
+                frame = {"type": "clarify_stream", "job_id": job_id, "attempt": attempt, "index": index, "delta": delta}
+                # tokens are not replayed on reconnect, the stored report replaces them
+                notification_bus.publish(user.user_id , frame, replay=False)
+                index += 1
+
+            # gather the tokens of the next interval into one frame
+            if not done:
+                await asyncio.sleep(CLARIFICATION_STREAM_INTERVAL)
+
+    forwarder = asyncio.create_task(forward())
+    try:
+        return await asyncio.to_thread(generate_clarification, user, job, user_data, on_token=on_token)
+    finally:
+        # tokens queued by the thread run before this point, the marker ends the stream after them
+        queue.put_nowait(None)
+        await forwarder
+
+
 async def user_worker(user:User ):
 
     # 1. Prepare User Data 
     print("Getting user data" , user.user_id)
     # Prepare User data for LLM (removing password for safety)
-    user_data = db.get_user_profile(user.user_id)
+    user_data = await asyncio.to_thread(db.get_user_profile, user.user_id)
 
     if not user.is_active:
         return
@@ -260,13 +323,24 @@ async def user_worker(user:User ):
     PROCESS_INTERVAL = 4 * 3600
     READ_JOBS_INTERVAL = 20
 
-    jobs_file = f"./{user.user_id}/pending_jobs.json"
-    clarify_jobs_path = f"./{user.user_id}/clarify_jobs.json"
-
     print(f"Worker started for User {user.user_id}")
 
-    # 🔹 Call find_jobs ONLY ONCE
-    top_jobs = find_jobs(user , user_data=user_data)
+    # resume the jobs of a cycle cut short by a restart, scored jobs skip straight to applying
+    scored_jobs = []
+    saved = checkpoints.load(user.user_id)
+    if saved:
+        print(f"Resuming {len(saved)} checkpointed jobs of user {user.user_id}")
+        top_jobs = [c["job"] for c in saved if c["stage"] == SEARCHED]
+        scored_jobs = [c["job"] for c in saved if c["stage"] >= SCORED]
+    else:
+        # 🔹 Call find_jobs ONLY ONCE
+        top_jobs = await find_jobs(user , user_data=user_data)
+        # jobs the pre-ranker left pending in an earlier cycle compete again with the new results
+        parked = await asyncio.to_thread(job_store.pop, user.user_id, PENDING, PRERANK_TOP_K)
+        if parked:
+            checkpoints.save(user.user_id, SEARCHED, parked)
+            found = set(job_key(job) for job in top_jobs)
+            top_jobs = top_jobs + [job for job in parked if job_key(job) not in found]
     # top_jobs = [
     #     {
     #         "id": "job_101",
@@ -348,17 +422,34 @@ async def user_worker(user:User ):
     # Process jobs currently in memory
     while user.is_active :
 
-        while top_jobs and user.is_active:
+        while (top_jobs or scored_jobs) and user.is_active:
             if not user.is_active:
                 return
             
             try:
+                # every searched job leaves the SEARCHED stage in this step, also the ones dropped below
+                searched_ids = [job_key(job) for job in top_jobs]
+
+                # drop jobs that break hard preferences before spending LLM calls on them
+                top_jobs = await prefilter_jobs(user , top_jobs , user_data=user_data)
+
+                # only the jobs most similar to the profile reach the LLM scorer
+                top_jobs = await prerank_jobs(user , top_jobs , user_data=user_data)
+
                 print("Start separrating and scoring and rerank the jobs")
-                top_jobs = await separate_and_rank_jobs(user , top_jobs , user_data=user_data)
+                top_jobs = await separate_and_rank_jobs(user , top_jobs , user_data=user_data) if top_jobs else []
 
                 if not user.is_active:
                     return
 
+                # the scored jobs go on to applying, the others already sit in a job store list
+                checkpoints.save(user.user_id, SCORED, top_jobs)
+                kept = set(job_key(job) for job in top_jobs)
+                checkpoints.clear(user.user_id, [job_id for job_id in searched_ids if job_id not in kept])
+
+                top_jobs = scored_jobs + top_jobs
+                scored_jobs = []
+
                 for job in top_jobs:
 
                     if not user.is_active:
@@ -375,43 +466,26 @@ async def user_worker(user:User ):
                 
                 # process the jobs that need clarification
                 print("process the jobs that need clarification")
-                clarify_jobs = []
-                # Check if file exists
-                if not os.path.exists(clarify_jobs_path):
-                    print(f"No clarify jobs file found for user {user.user_id}")
-                    clarify_jobs = []
-                    with lock :
-                        with open(clarify_jobs_path, "w") as f:
-                            json.dump([], f)
-
-                lock_path = clarify_jobs_path + ".lock"
-                lock = FileLock(lock_path, timeout=10)
-
-                with lock:  # ensures no other process is reading/writing at the same time
-                    with open(clarify_jobs_path, "r") as f:
-                        try:
-                            jobs = json.load(f)
-                        except json.JSONDecodeError:
-                            print(f"File {clarify_jobs_path} is empty or corrupted")
-                            jobs = []
-
+                jobs = job_store.list(user.user_id, CLARIFY)
 
                 for job in jobs:
                     if not user.is_active:
                         return
 
                     if "clarification" in job:
-                        clarify_jobs.append(job)
                         continue
 
                     # Make a shallow copy without 'reason' to send to the function
                     job_for_clarification = {k: v for k, v in job.items() if k != "reason"}
                     
-                    # Call function
-                    clarification = generate_clarification(user, job_for_clarification, user_data)
+                    # Call function, off the loop since the LLM call blocks while it retries
+                    if CLARIFICATION_STREAMING:
+                        clarification = await stream_clarification(user, job_for_clarification, user_data)
+                    else:
+                        clarification = await asyncio.to_thread(generate_clarification, user, job_for_clarification, user_data)
 
                     job["clarification"] = clarification
-                    clarify_jobs.append(job)
+                    job_store.update(user.user_id, CLARIFY, job)
 
                     role = job.get("title") or job.get("role")
                     company = job.get("company")
@@ -421,73 +495,88 @@ async def user_worker(user:User ):
                         "message": f"Application for {role} in {company} need your clarification.",
                         "job_id": f"{job_id}"
                     }
-                    await websocket_manager.send_personal_message(user.user_id , data)
-
-                with lock:   
-                    # Write back the updated array to file
-                    with open(clarify_jobs_path, "w") as f:
-                        json.dump(clarify_jobs, f, indent=4)
+                    notification_bus.publish(user.user_id , data)
 
                 break # this line must be removed later
-                time.sleep(READ_JOBS_INTERVAL)
+                await asyncio.sleep(READ_JOBS_INTERVAL)
                 
                 if not user.is_active:
                     return
 
-                # search for other pending top jobs
-                if not os.path.exists(jobs_file):
-                    top_jobs = []
-                else:
-                    lock = FileLock(jobs_file + ".lock" , timeout=10)
-
-                    with lock:  # ⛔ other processes wait here
-                        with open(jobs_file, "r+") as file:
-                            try:
-                                jobs = json.load(file)
-                            except json.JSONDecodeError as e:
-                                print(e)
-                                jobs = []
-
-                            # Take next 5 jobs
-                            top_jobs = jobs[:5]
-                            remaining_jobs = jobs[5:]
-
-                            # Rewrite remaining jobs back to file
-                            file.seek(0)
-                            file.truncate()
-                            json.dump(remaining_jobs, file, indent=4)
+                # search for other pending top jobs, take next 5 jobs
+                top_jobs = job_store.pop(user.user_id, PENDING, 5)
+                checkpoints.save(user.user_id, SEARCHED, top_jobs)
             
             except Exception as e:
                 print("Error in User worker " ,e)
                 break
 
         break  # this line must be removed later
-        time.sleep(PROCESS_INTERVAL)  # wait before next cycle
-
+        await asyncio.sleep(PROCESS_INTERVAL)  # wait before next cycle
 
-class JobManager:
-    def __init__(self):
-        self.users: Dict[str, User] = {}
 
-    def add_user(self, user_id):
-        self.users[user_id] = User(user_id)
+async def run_user_worker(user:User):
+    """Pipeline of one user, runs as a task on one of the shared worker loops."""
+    print(f"Pipeline of {user.user_id} started")
+    try:
+        await user_worker(user)
+        # finished, a restart has nothing to resume (a cancelled or crashed pipeline stays active)
+        await asyncio.to_thread(checkpoints.set_active, user.user_id, False)
+    finally:
+        print(f"Pipeline of {user.user_id} ended")
 
-    
-    def start_user(self, user_id):
-        user = self.users[user_id]
-        user.is_active = True
 
-        def run_async_worker():
-            asyncio.run(user_worker(user))
+class JobManager:
+    """
+    Users and their pipelines. The pipelines run on the shared worker_pool,
+    a user has at most one, so starting a running user again does nothing.
+    """
 
-        thread = threading.Thread(
-            target=run_async_worker,
-            args=()
-        )
-        thread.start()
+    def __init__(self , pool = worker_pool):
+        self.users: Dict[str, User] = {}
+        self.pool = pool
+        self._lock = threading.Lock()
+
+    def add_user(self, user_id) -> User:
+        # keep the existing User, its running pipeline holds on to it
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                user = User(user_id)
+                self.users[user_id] = user
+            return user
+
+    def start_user(self, user_id) -> bool:
+        """Start the user's pipeline, False if it is already running or waiting for a slot."""
+        user = self.add_user(user_id)
+        was_active = user.is_active
+        user.is_active = True
+        checkpoints.set_active(user_id, True)
+        # a stopped pipeline that has not ended yet would miss the new start, so it runs once more
+        started = self.pool.submit(user_id, lambda: run_user_worker(user), rerun=not was_active)
+        if not started:
+            print(f"Pipeline of {user_id} is already running")
+        return started
 
     def stop_user(self, user_id):
         self.users[user_id].is_active = False
+        checkpoints.set_active(user_id, False)
+        # a user still waiting for a slot never starts
+        self.pool.cancel(user_id)
+
+    def resume_active_users(self , owns = None) -> list:
+        """Start the pipelines of the users that were active when the backend stopped, only those `owns(user_id)` accepts if given."""
+        user_ids = [user_id for user_id in checkpoints.active_users() if owns is None or owns(user_id)]
+        for user_id in user_ids:
+            self.start_user(user_id)
+        if user_ids:
+            print(f"Resumed {len(user_ids)} active users")
+        return user_ids
+
+    def shutdown(self):
+        for user in list(self.users.values()):
+            user.is_active = False
+        self.pool.shutdown()
 
     def get_user_status(self , user_id):
         return self.users[user_id].is_active
@@ -0,0 +1,134 @@
+import os
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+from data_types import User
+from job_filters import reject_jobs
+from job_store import job_store , PENDING
+
+load_dotenv()
+
+# changable variables
+PRERANK_TOP_K = int(os.getenv("PRERANK_TOP_K", os.getenv("JOB_SEARCH_TOP_K", 20)))  # as many as a search returns
+PRERANK_MIN_SIMILARITY = float(os.getenv("PRERANK_MIN_SIMILARITY", 0.2))
+
+# same model as the job portal index
+embeddings = HuggingFaceEndpointEmbeddings(
+    model="sentence-transformers/all-MiniLM-L6-v2",
+    huggingfacehub_api_token=os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACEHUB_API_TOKEN")
+)
+
+# user_id -> (profile hash, normalized profile vector)
+_profile_vectors = {}
+_profile_lock = threading.Lock()
+
+
+def job_to_text(job:dict) -> str:
+    return (
+        f"Job Title: {job.get('title')}\n"
+        f"Company: {job.get('company')}\n"
+        f"Location: {', '.join(job.get('cities', []))}, {', '.join(job.get('countries', []))}\n"
+        f"Work Type: {'Remote' if job.get('is_remote') else 'Hybrid' if job.get('is_hybride') else 'Onsite'}\n"
+        f"Skills: {', '.join(job.get('required_skills', []))}\n"
+        f"Description: {job.get('description')}"
+    )
+
+
+def profile_to_text(user_data:dict) -> str:
+    def names(items, *keys):
+        values = []
+        for item in items or []:
+            if isinstance(item, dict):
+                values.extend(str(item[k]) for k in keys if item.get(k))
+            elif item:
+                values.append(str(item))
+        return ", ".join(values)
+
+    return (
+        f"Summary: {user_data.get('summary') or ''}\n"
+        f"Roles: {names(user_data.get('roleExperience'), 'role', 'name', 'value')}, {names(user_data.get('experience'), 'role')}\n"
+        f"Skills: {names(user_data.get('skills'), 'name')}\n"
+        f"Work Type: {names(user_data.get('workMode'))}\n"
+        f"Location: {names(user_data.get('cityPreference'))}, {names(user_data.get('countryPreference'))}"
+    )
+
+
+def _normalize(vectors:np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _profile_vector(user_id:str , user_data:dict) -> np.ndarray:
+    """Embed the profile once per user, again only when the profile changes."""
+    text = profile_to_text(user_data)
+    profile_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    with _profile_lock:
+        cached = _profile_vectors.get(user_id)
+    if cached and cached[0] == profile_hash:
+        return cached[1]
+
+    vector = _normalize(np.asarray(embeddings.embed_query(text), dtype=np.float32))
+    with _profile_lock:
+        _profile_vectors[user_id] = (profile_hash, vector)
+    return vector
+
+
+def similarity_scores(user_id:str , jobs:list , user_data:dict) -> np.ndarray:
+    """Cosine similarity between the user profile and every job (one batched embedding call)."""
+    profile = _profile_vector(user_id, user_data)
+    job_vectors = _normalize(np.asarray(embeddings.embed_documents([job_to_text(job) for job in jobs]), dtype=np.float32))
+    return job_vectors @ profile
+
+
+async def prerank_jobs(user:User , jobs:list , user_data=None , top_k:int = PRERANK_TOP_K , min_similarity:float = PRERANK_MIN_SIMILARITY):
+    """
+    Cheap first stage ranking before the LLM scorer.
+    Jobs under `min_similarity` are rejected, the best `top_k` are returned (most similar first)
+    and the rest are queued as pending, the next cycle ranks them again together with its search results.
+    If embedding fails all jobs are passed through unchanged.
+    """
+    if not jobs or user_data is None:
+        return jobs or []
+
+    user_id = str(user.user_id)
+
+    try:
+        scores = await asyncio.to_thread(similarity_scores, user_id, jobs, user_data)
+    except Exception as e:
+        print(f"Error embedding jobs for pre-ranking, skip pre-ranking: {e}")
+        return jobs
+
+    if not user.is_active:
+        return []
+
+    order = np.argsort(-scores, kind="stable")
+    above_floor = [i for i in order if scores[i] >= min_similarity]
+    below_floor = [i for i in order if scores[i] < min_similarity]
+
+    for i in order:
+        jobs[i]["similarity_score"] = round(float(scores[i]), 4)
+
+    rejected_list = []
+    for i in below_floor:
+        job = jobs[i]
+        job["match_score"] = 0
+        job["match_reason"] = f"Rejected by pre-ranking: profile similarity {scores[i]:.2f} is below {min_similarity:.2f}."
+        rejected_list.append(job)
+
+    top_jobs = [jobs[i] for i in above_floor[:max(1, top_k)]]
+    overflow = [jobs[i] for i in above_floor[max(1, top_k):]]
+
+    print(f"Pre-ranking for user {user_id}: {len(top_jobs)} to score, {len(overflow)} pending, {len(rejected_list)} rejected")
+
+    if rejected_list:
+        await asyncio.to_thread(reject_jobs, user_id, rejected_list)
+    if overflow:
+        await asyncio.to_thread(job_store.append, user_id, PENDING, overflow)
+
+    return top_jobs
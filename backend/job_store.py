@@ -0,0 +1,1072 @@
+import os
+import json
+import time
+import re
+import sqlite3
+import threading
+import queue
+import bisect
+from collections import OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from filelock import FileLock
+
+load_dotenv()
+
+# job states
+APPLIED = "applied"
+REJECTED = "rejected"
+PENDING = "pending"
+CLARIFY = "clarify"
+
+STATES = (APPLIED, REJECTED, PENDING, CLARIFY)
+
+# large generated text bodies, left out wherever only a summary of a job is needed
+HEAVY_FIELDS = ("resume", "cover_letter", "evidence_points", "clarification")
+
+# legacy per-user json files, imported the first time a user is touched
+LEGACY_FILES = {
+    APPLIED: "applied_jobs.json",
+    REJECTED: "rejected_jobs.json",
+    PENDING: "pending_jobs.json",
+    CLARIFY: "clarify_jobs.json",
+}
+
+# changable variables
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "sqlite")  # sqlite | jsonl
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "./job_store.db")
+LEGACY_JOBS_DIR = os.getenv("LEGACY_JOBS_DIR", ".")
+JOB_LOG_DIR = os.getenv("JOB_LOG_DIR", LEGACY_JOBS_DIR)
+# a log is compacted once dead lines (replaced records and tombstones) pass this share
+JOB_LOG_COMPACT_RATIO = float(os.getenv("JOB_LOG_COMPACT_RATIO", 0.5))
+JOB_LOG_COMPACT_MIN_LINES = int(os.getenv("JOB_LOG_COMPACT_MIN_LINES", 100))
+# in-process cache of parsed lists in front of the backend
+JOB_CACHE_ENABLED = os.getenv("JOB_CACHE_ENABLED", "true").lower() == "true"
+JOB_CACHE_MAX_USERS = int(os.getenv("JOB_CACHE_MAX_USERS", 256))
+JOB_CACHE_WATCH_INTERVAL = float(os.getenv("JOB_CACHE_WATCH_INTERVAL", 2.0))  # sec
+JOB_CACHE_LOAD_ATTEMPTS = int(os.getenv("JOB_CACHE_LOAD_ATTEMPTS", 3))  # reads of a list that changes while it is loaded before it is served uncached
+
+# start of every log line, lets a reader find the op, id and sequence number without parsing the record
+_LOG_HEADER = re.compile(rb'^\{"op": "(put|del)", "id": ("(?:[^"\\]|\\.)*")(?:, "seq": (\d+))?')
+
+
+def job_key(job:dict) -> str:
+    """Job id of a record (applied records keep it in 'job_id', others in 'id')."""
+    job_id = job.get("id")
+    if job_id is None:
+        job_id = job.get("job_id")
+    if job_id is None and isinstance(job.get("job"), dict):
+        job_id = job["job"].get("id")
+    if job_id is None:
+        raise ValueError("Job record has no id")
+    return str(job_id)
+
+
+def _check_state(state:str):
+    if state not in STATES:
+        raise ValueError(f"Unknown job state {state}")
+
+
+def read_legacy_jobs(legacy_dir:str , user_id:str , state:str) -> list:
+    """Jobs of a legacy {user_id}/{state}_jobs.json file, [] if it is missing or unreadable."""
+    path = os.path.join(legacy_dir, user_id, LEGACY_FILES[state])
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            jobs = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Skip legacy file {path}: {e}")
+        return []
+    print(f"Imported {len(jobs)} {state} jobs of user {user_id} from {path}")
+    return jobs
+
+
+class JobStore:
+    """
+    Interface of the per-user job lists (applied, rejected, pending, clarify).
+    Every read and write of job state goes through one of its implementations.
+    A job appears at most once per (user, state); appending it again replaces the record.
+    """
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, fn):
+        """
+        Call fn(user_id, state, old_version, new_version, size, puts, deletes) after every write of a list.
+        `size` is the length of the list after the write, `puts` are (cursor, job) pairs now stored
+        at that cursor and `deletes` are job ids. A change made by another process is reported
+        with size None and no puts or deletes, the listener has to read the list again.
+        """
+        self._listeners.append(fn)
+
+    def _notify(self, user_id:str , state:str , old_version:str , new_version:str , size:int , puts=() , deletes=()):
+        for fn in self._listeners:
+            try:
+                fn(user_id, state, old_version, new_version, size, list(puts), list(deletes))
+            except Exception as e:
+                print(f"Error in job store listener: {e}")
+
+    def append(self, user_id:str , state:str , jobs:list) -> int:
+        """Add jobs to the end of a user's list, returns the number of records written."""
+        raise NotImplementedError
+
+    def update(self, user_id:str , state:str , job:dict) -> bool:
+        """Replace a stored record, returns False if the job is not in the list."""
+        raise NotImplementedError
+
+    def move(self, user_id:str , job_id:str , from_state:str , to_state:str , data:dict = None) -> bool:
+        """Move a job to another state, optionally replacing its record. False if it is not in `from_state`."""
+        raise NotImplementedError
+
+    def remove(self, user_id:str , state:str , job_id:str) -> bool:
+        raise NotImplementedError
+
+    def pop(self, user_id:str , state:str , n:int) -> list:
+        """Remove and return the first n jobs of a list."""
+        raise NotImplementedError
+
+    def iter_after(self, user_id:str , state:str , after:int = 0):
+        """
+        Yield (cursor, job) pairs of a list in order, starting after the job with cursor `after`.
+        Cursors are increasing integers that stay valid while the list changes.
+        """
+        raise NotImplementedError
+
+    def iter(self, user_id:str , state:str):
+        """Yield the jobs of a list in order without loading the whole list at once."""
+        for _, job in self.iter_after(user_id, state):
+            yield job
+
+    def page(self, user_id:str , state:str , after:int = 0 , limit:int = 50):
+        """One page of a list, returns (jobs, cursor of the next page or None on the last page)."""
+        jobs = []
+        last = None
+        for cursor, job in self.iter_after(user_id, state, after):
+            if len(jobs) >= limit:
+                return jobs, last
+            jobs.append(job)
+            last = cursor
+        return jobs, None
+
+    def get(self, user_id:str , state:str , job_id:str):
+        raise NotImplementedError
+
+    def count(self, user_id:str , state:str) -> int:
+        raise NotImplementedError
+
+    def latest(self, user_id:str , state:str , n:int) -> list:
+        """(cursor, job) pairs of the last n jobs of a list, newest first."""
+        records = []
+        for record in self.iter_after(user_id, state):
+            records.append(record)
+            if len(records) > n:
+                records.pop(0)
+        return records[::-1]
+
+    def version(self, user_id:str , state:str) -> str:
+        """Opaque token that changes whenever the list changes, cheap enough to read on every request."""
+        raise NotImplementedError
+
+    def list(self, user_id:str , state:str) -> list:
+        return list(self.iter(user_id, state))
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job lists of all users in one sqlite database.
+    WAL mode keeps readers from blocking writers; every write is a single short transaction,
+    so the cost does not grow with the size of a user's history.
+    """
+
+    def __init__(self, path:str = JOB_STORE_PATH, legacy_dir:str = LEGACY_JOBS_DIR):
+        super().__init__()
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self._local = threading.local()
+        self._migrated = set()
+        self._migrate_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " user_id TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " job_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (user_id, state, job_id));"
+                "CREATE INDEX IF NOT EXISTS jobs_user_state_seq ON jobs (user_id, state, seq);"
+                "CREATE INDEX IF NOT EXISTS jobs_seq ON jobs (seq);"
+                "CREATE TABLE IF NOT EXISTS migrated_users (user_id TEXT PRIMARY KEY);"
+                "CREATE TABLE IF NOT EXISTS list_versions ("
+                " user_id TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " size INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (user_id, state));"
+            )
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _next_seq(conn) -> int:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs").fetchone()[0]
+
+    @staticmethod
+    def _bump(conn, user_id:str , state:str , added:int) -> tuple:
+        """
+        Increase the version of a changed list and add `added` to its size inside the write transaction.
+        Returns (old version, new version, size).
+        """
+        row = conn.execute(
+            "SELECT version, size FROM list_versions WHERE user_id = ? AND state = ?",
+            (user_id, state)
+        ).fetchone()
+        old, size = row if row else (0, 0)
+        size = max(0, size + added)
+        conn.execute(
+            "INSERT INTO list_versions (user_id, state, version, size) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (user_id, state) DO UPDATE SET version = excluded.version, size = excluded.size",
+            (user_id, state, old + 1, size)
+        )
+        return str(old), str(old + 1), size
+
+    def _ensure_migrated(self, user_id:str):
+        """Import the user's legacy json files once."""
+        if user_id in self._migrated:
+            return
+        with self._migrate_lock:
+            if user_id in self._migrated:
+                return
+            with self._write() as conn:
+                done = conn.execute("SELECT 1 FROM migrated_users WHERE user_id = ?", (user_id,)).fetchone()
+                if not done:
+                    for state in STATES:
+                        jobs = read_legacy_jobs(self.legacy_dir, user_id, state)
+                        if jobs:
+                            puts, added = self._upsert(conn, user_id, state, jobs)
+                            if puts:
+                                self._bump(conn, user_id, state, added)
+                    conn.execute("INSERT INTO migrated_users (user_id) VALUES (?)", (user_id,))
+            self._migrated.add(user_id)
+
+    def _upsert(self, conn, user_id:str , state:str , jobs:list) -> tuple:
+        """Write the jobs at the end of the list, returns the (seq, job) pairs written and the number of new ids."""
+        seq = self._next_seq(conn)
+        now = time.time()
+        rows = []
+        puts = []
+        for job in jobs:
+            try:
+                rows.append((user_id, state, job_key(job), seq + len(puts), json.dumps(job), now))
+                puts.append((seq + len(puts), job))
+            except ValueError as e:
+                print(f"Skip job without id for user {user_id}: {e}")
+        job_ids = list({row[2] for row in rows})
+        existing = 0
+        for i in range(0, len(job_ids), 500):
+            chunk = job_ids[i:i + 500]
+            existing += conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE user_id = ? AND state = ? AND job_id IN ({', '.join('?' * len(chunk))})",
+                (user_id, state, *chunk)
+            ).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO jobs (user_id, state, job_id, seq, data, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (user_id, state, job_id) DO UPDATE SET seq = excluded.seq, data = excluded.data, updated_at = excluded.updated_at",
+            rows
+        )
+        return puts, len(job_ids) - existing
+
+    # ---- writes ----
+
+    def append(self, user_id:str , state:str , jobs:list) -> int:
+        """Add jobs to the end of a user's list, returns the number of records written."""
+        _check_state(state)
+        if not jobs:
+            return 0
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        with self._write() as conn:
+            puts, added = self._upsert(conn, user_id, state, jobs)
+            if not puts:
+                return 0
+            versions = self._bump(conn, user_id, state, added)
+        self._notify(user_id, state, *versions, puts=puts)
+        return len(puts)
+
+    def update(self, user_id:str , state:str , job:dict) -> bool:
+        """Replace a stored record in place (keeps its position in the list)."""
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        with self._write() as conn:
+            row = conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE user_id = ? AND state = ? AND job_id = ? RETURNING seq",
+                (json.dumps(job), time.time(), user_id, state, job_key(job))
+            ).fetchone()
+            if row is None:
+                return False
+            versions = self._bump(conn, user_id, state, 0)
+        self._notify(user_id, state, *versions, puts=[(row[0], job)])
+        return True
+
+    def move(self, user_id:str , job_id:str , from_state:str , to_state:str , data:dict = None) -> bool:
+        """
+        Move a job to another state in one transaction, optionally replacing its record.
+        Returns False if the job is not in `from_state`.
+        """
+        _check_state(from_state)
+        _check_state(to_state)
+        user_id = str(user_id)
+        job_id = str(job_id)
+        self._ensure_migrated(user_id)
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE user_id = ? AND state = ? AND job_id = ?",
+                (user_id, from_state, job_id)
+            ).fetchone()
+            if row is None:
+                return False
+
+            if data is None:
+                data = json.loads(row[0])
+            seq = self._next_seq(conn)
+            replaced = 0
+            if to_state != from_state:
+                # an older copy of the job in the target list is replaced
+                replaced = conn.execute(
+                    "DELETE FROM jobs WHERE user_id = ? AND state = ? AND job_id = ?",
+                    (user_id, to_state, job_id)
+                ).rowcount
+            conn.execute(
+                "UPDATE jobs SET state = ?, seq = ?, data = ?, updated_at = ? WHERE user_id = ? AND state = ? AND job_id = ?",
+                (to_state, seq, json.dumps(data), time.time(), user_id, from_state, job_id)
+            )
+            from_versions = self._bump(conn, user_id, from_state, -1)
+            to_versions = self._bump(conn, user_id, to_state, 1 - replaced)
+        self._notify(user_id, from_state, *from_versions, deletes=[job_id])
+        self._notify(user_id, to_state, *to_versions, puts=[(seq, data)])
+        return True
+
+    def remove(self, user_id:str , state:str , job_id:str) -> bool:
+        _check_state(state)
+        user_id = str(user_id)
+        job_id = str(job_id)
+        self._ensure_migrated(user_id)
+        with self._write() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE user_id = ? AND state = ? AND job_id = ?",
+                (user_id, state, job_id)
+            )
+            if cur.rowcount == 0:
+                return False
+            versions = self._bump(conn, user_id, state, -1)
+        self._notify(user_id, state, *versions, deletes=[job_id])
+        return True
+
+    def pop(self, user_id:str , state:str , n:int) -> list:
+        """Remove and return the first n jobs of a list."""
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        with self._write() as conn:
+            rows = conn.execute(
+                "SELECT job_id, data FROM jobs WHERE user_id = ? AND state = ? ORDER BY seq LIMIT ?",
+                (user_id, state, n)
+            ).fetchall()
+            if not rows:
+                return []
+            conn.executemany(
+                "DELETE FROM jobs WHERE user_id = ? AND state = ? AND job_id = ?",
+                [(user_id, state, job_id) for job_id, _ in rows]
+            )
+            versions = self._bump(conn, user_id, state, -len(rows))
+        self._notify(user_id, state, *versions, deletes=[job_id for job_id, _ in rows])
+        return [json.loads(data) for _, data in rows]
+
+    # ---- reads ----
+
+    def iter_after(self, user_id:str , state:str , after:int = 0 , chunk_size:int = 200):
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        # keyset pagination on seq (the cursor), each chunk is a fresh query so the generator may move between threads
+        last_seq = after or 0
+        while True:
+            rows = self._conn().execute(
+                "SELECT seq, data FROM jobs WHERE user_id = ? AND state = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (user_id, state, last_seq, chunk_size)
+            ).fetchall()
+            for seq, data in rows:
+                yield seq, json.loads(data)
+            if len(rows) < chunk_size:
+                return
+            last_seq = rows[-1][0]
+
+    def get(self, user_id:str , state:str , job_id:str):
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        row = self._conn().execute(
+            "SELECT data FROM jobs WHERE user_id = ? AND state = ? AND job_id = ?",
+            (user_id, state, str(job_id))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self, user_id:str , state:str) -> int:
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        row = self._conn().execute(
+            "SELECT size FROM list_versions WHERE user_id = ? AND state = ?",
+            (user_id, state)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def latest(self, user_id:str , state:str , n:int) -> list:
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        rows = self._conn().execute(
+            "SELECT seq, data FROM jobs WHERE user_id = ? AND state = ? ORDER BY seq DESC LIMIT ?",
+            (user_id, state, n)
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def version(self, user_id:str , state:str) -> str:
+        _check_state(state)
+        user_id = str(user_id)
+        self._ensure_migrated(user_id)
+        row = self._conn().execute(
+            "SELECT version FROM list_versions WHERE user_id = ? AND state = ?",
+            (user_id, state)
+        ).fetchone()
+        return str(row[0] if row else 0)
+
+
+
+class JsonlJobStore(JobStore):
+    """
+    One append-only json-lines log per user and state ({user_id}/{state}_jobs.jsonl).
+    Every change is a single write of whole lines: {"op": "put", "id", "seq", "data"} records and
+    {"op": "del", "id"} tombstones. `seq` grows with every put of a log and is kept by compaction,
+    so it serves as the list cursor (an update writes the record again with its old seq).
+    The live list is the last put of every id that was not deleted afterwards, in seq order.
+    A background compactor rewrites a log once the share of dead lines passes `compact_ratio`.
+    A move appends to the target log before the tombstone goes to the source log, so a crash in
+    between leaves the job in both lists instead of losing it.
+    """
+
+    def __init__(self, root:str = JOB_LOG_DIR, legacy_dir:str = LEGACY_JOBS_DIR,
+                 compact_ratio:float = JOB_LOG_COMPACT_RATIO, compact_min_lines:int = JOB_LOG_COMPACT_MIN_LINES):
+        super().__init__()
+        self.root = root
+        self.legacy_dir = legacy_dir
+        self.compact_ratio = compact_ratio
+        self.compact_min_lines = compact_min_lines
+
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        # path -> {"lines", "dead", "live": {id: seq}, "seq": last seq, "ino", "offset": bytes read}, see _stats_for
+        self._stats = {}
+        # path -> (user_id, state), to notify listeners about compactions
+        self._owners = {}
+        self._compact_queue = queue.Queue()
+        self._compactor = None
+
+    def _path(self, user_id:str , state:str) -> str:
+        return os.path.join(self.root, user_id, f"{state}_jobs.jsonl")
+
+    @contextmanager
+    def _locked(self, *paths):
+        """Thread and process lock of one or more logs (taken in a fixed order)."""
+        paths = sorted(set(paths))
+        with self._locks_lock:
+            thread_locks = [self._locks.setdefault(p, threading.Lock()) for p in paths]
+        for lock in thread_locks:
+            lock.acquire()
+        file_locks = [FileLock(p + ".lock", timeout=10) for p in paths]
+        try:
+            for lock in file_locks:
+                lock.acquire()
+            yield
+        finally:
+            for lock in reversed(file_locks):
+                if lock.is_locked:
+                    lock.release()
+            for lock in reversed(thread_locks):
+                lock.release()
+
+    @staticmethod
+    def _header(line:bytes):
+        match = _LOG_HEADER.match(line)
+        if not match:
+            return None, None, 0
+        return match.group(1).decode(), json.loads(match.group(2)), int(match.group(3) or 0)
+
+    @staticmethod
+    def _put_line(job_id:str , job:dict , seq:int) -> bytes:
+        return (json.dumps({"op": "put", "id": job_id, "seq": seq, "data": job}) + "\n").encode("utf-8")
+
+    def _put_lines(self, path:str , records:list) -> list:
+        """Put lines of (job_id, job) records with the next sequence numbers of the log."""
+        # caller holds the lock of the log
+        seq = self._stats_for(path)["seq"]
+        return [self._put_line(job_id, job, seq + i + 1) for i, (job_id, job) in enumerate(records)]
+
+    @staticmethod
+    def _del_line(job_id:str) -> bytes:
+        return (json.dumps({"op": "del", "id": job_id}) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _file_version(path:str) -> str:
+        # every write appends to the log and compaction replaces it, so mtime and size change with the list
+        stat = os.stat(path)
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def _open(self, user_id:str , state:str) -> str:
+        """Path of the log, created from the legacy json file the first time."""
+        path = self._path(user_id, state)
+        self._owners[path] = (user_id, state)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._locked(path):
+                if not os.path.exists(path):
+                    jobs = read_legacy_jobs(self.legacy_dir, user_id, state)
+                    self._write_lines(path, self._put_lines(path, [(job_key(job), job) for job in jobs]))
+        return path
+
+    def _write_lines(self, path:str , lines:list):
+        # caller holds the lock of the log
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if lines:
+                os.write(fd, b"".join(lines))
+        finally:
+            os.close(fd)
+
+        # reads back the lines just written
+        self._maybe_compact(path, self._stats_for(path))
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {"lines": 0, "dead": 0, "live": {}, "seq": 0, "ino": None, "offset": 0}
+
+    @staticmethod
+    def _apply(stats:dict , line:bytes):
+        op, job_id, seq = JsonlJobStore._header(line)
+        stats["lines"] += 1
+        stats["seq"] = max(stats["seq"], seq)
+        if op == "put":
+            if job_id in stats["live"]:
+                stats["dead"] += 1
+            stats["live"][job_id] = seq
+        elif op == "del":
+            stats["dead"] += 2 if job_id in stats["live"] else 1
+            stats["live"].pop(job_id, None)
+        else:
+            stats["dead"] += 1
+
+    def _stats_for(self, path:str) -> dict:
+        """
+        Line counts, live ids (id -> seq) and last seq of a log. Other processes append to the same log,
+        so every call catches up with the file under the caller's lock: a grown log is read from the last
+        offset, a replaced (compacted by another process) or shrunk one from the start.
+        """
+        stats = self._stats.get(path)
+        if stats is None:
+            stats = self._stats[path] = self._empty_stats()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if stats["ino"] is not None:
+                stats = self._stats[path] = self._empty_stats()
+            return stats
+
+        if st.st_ino != stats["ino"] or st.st_size < stats["offset"]:
+            stats = self._stats[path] = self._empty_stats()
+        if st.st_size > stats["offset"]:
+            with open(path, "rb") as f:
+                f.seek(stats["offset"])
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._apply(stats, line)
+                    stats["offset"] += len(line)
+        stats["ino"] = st.st_ino
+        return stats
+
+    # ---- compaction ----
+
+    def _maybe_compact(self, path:str , stats:dict):
+        if stats["lines"] >= self.compact_min_lines and stats["dead"] / stats["lines"] >= self.compact_ratio:
+            if self._compactor is None:
+                self._compactor = threading.Thread(target=self._compact_loop, name="job-log-compactor", daemon=True)
+                self._compactor.start()
+            self._compact_queue.put(path)
+
+    def _compact_loop(self):
+        while True:
+            path = self._compact_queue.get()
+            try:
+                self.compact(path)
+            except Exception as e:
+                print(f"Error compacting {path}: {e}")
+
+    def compact(self, path:str):
+        """Rewrite a log with only its live records."""
+        with self._locked(path):
+            stats = self._stats_for(path)
+            if stats["lines"] == 0 or stats["dead"] / stats["lines"] < self.compact_ratio:
+                return
+
+            live_lines = list(self._live_lines(path))
+            tmp_path = path + ".compact"
+            with open(tmp_path, "wb") as f:
+                f.writelines(live_lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+            old_version = self._file_version(path)
+            os.replace(tmp_path, path)
+            new_version = self._file_version(path)
+
+            before = stats["lines"]
+            self._stats.pop(path, None)
+            self._stats_for(path)
+            print(f"Compacted {path}: {before} -> {len(live_lines)} lines")
+
+            size = len(self._stats_for(path)["live"])
+
+        # same list, new version
+        if path in self._owners:
+            self._notify(*self._owners[path], old_version, new_version, size)
+
+    # ---- reads ----
+
+    def _live_lines(self, path:str):
+        """
+        Yield the put lines that are still live in seq order, an update keeps the seq of the record it
+        replaces but sits later in the log (one pass for the offsets, then one read per live line).
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            last = {}
+            offset = 0
+            for line in f:
+                # a torn last line of a crashed writer, like _stats_for
+                if not line.endswith(b"\n"):
+                    break
+                op, job_id, seq = self._header(line)
+                if op is not None:
+                    last[job_id] = (op, seq, offset)
+                offset += len(line)
+
+            for _, offset in sorted((seq, offset) for op, seq, offset in last.values() if op == "put"):
+                f.seek(offset)
+                yield f.readline()
+
+    def iter_after(self, user_id:str , state:str , after:int = 0):
+        _check_state(state)
+        path = self._open(str(user_id), state)
+        after = after or 0
+        for line in self._live_lines(path):
+            _, _, seq = self._header(line)
+            if seq > after:
+                yield seq, json.loads(line)["data"]
+
+    def get(self, user_id:str , state:str , job_id:str):
+        _check_state(state)
+        path = self._open(str(user_id), state)
+        job_id = str(job_id)
+        found = None
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                op, line_id, _ = self._header(line)
+                if line_id != job_id:
+                    continue
+                found = json.loads(line)["data"] if op == "put" else None
+        return found
+
+    def count(self, user_id:str , state:str) -> int:
+        _check_state(state)
+        path = self._open(str(user_id), state)
+        with self._locked(path):
+            return len(self._stats_for(path)["live"])
+
+    def version(self, user_id:str , state:str) -> str:
+        """mtime and size of the log."""
+        _check_state(state)
+        return self._file_version(self._open(str(user_id), state))
+
+    # ---- writes ----
+
+    def _commit(self, path:str , lines:list) -> tuple:
+        """Write lines to a log, returns the old and new version of the list and its size."""
+        # caller holds the lock of the log
+        old_version = self._file_version(path)
+        self._write_lines(path, lines)
+        return old_version, self._file_version(path), len(self._stats_for(path)["live"])
+
+    @staticmethod
+    def _seqs(lines:list) -> list:
+        return [JsonlJobStore._header(line)[2] for line in lines]
+
+    def append(self, user_id:str , state:str , jobs:list) -> int:
+        _check_state(state)
+        if not jobs:
+            return 0
+        user_id = str(user_id)
+        path = self._open(user_id, state)
+        records = []
+        for job in jobs:
+            try:
+                records.append((job_key(job), job))
+            except ValueError as e:
+                print(f"Skip job without id for user {user_id}: {e}")
+        if not records:
+            return 0
+        with self._locked(path):
+            lines = self._put_lines(path, records)
+            versions = self._commit(path, lines)
+        self._notify(user_id, state, *versions, puts=zip(self._seqs(lines), [job for _, job in records]))
+        return len(records)
+
+    def update(self, user_id:str , state:str , job:dict) -> bool:
+        _check_state(state)
+        user_id = str(user_id)
+        path = self._open(user_id, state)
+        job_id = job_key(job)
+        with self._locked(path):
+            seq = self._stats_for(path)["live"].get(job_id)
+            if seq is None:
+                return False
+            # same seq as the replaced record, the job keeps its place in the list
+            versions = self._commit(path, [self._put_line(job_id, job, seq)])
+        self._notify(user_id, state, *versions, puts=[(seq, job)])
+        return True
+
+    def move(self, user_id:str , job_id:str , from_state:str , to_state:str , data:dict = None) -> bool:
+        _check_state(from_state)
+        _check_state(to_state)
+        user_id = str(user_id)
+        job_id = str(job_id)
+        source = self._open(user_id, from_state)
+        target = self._open(user_id, to_state)
+        with self._locked(source, target):
+            if job_id not in self._stats_for(source)["live"]:
+                return False
+            if data is None:
+                data = self.get(user_id, from_state, job_id)
+            lines = self._put_lines(target, [(job_id, data)])
+            to_versions = self._commit(target, lines)
+            # within one list the new put line already replaces the job
+            if source != target:
+                from_versions = self._commit(source, [self._del_line(job_id)])
+        self._notify(user_id, to_state, *to_versions, puts=[(self._seqs(lines)[0], data)])
+        if source != target:
+            self._notify(user_id, from_state, *from_versions, deletes=[job_id])
+        return True
+
+    def remove(self, user_id:str , state:str , job_id:str) -> bool:
+        _check_state(state)
+        user_id = str(user_id)
+        path = self._open(user_id, state)
+        job_id = str(job_id)
+        with self._locked(path):
+            if job_id not in self._stats_for(path)["live"]:
+                return False
+            versions = self._commit(path, [self._del_line(job_id)])
+        self._notify(user_id, state, *versions, deletes=[job_id])
+        return True
+
+    def pop(self, user_id:str , state:str , n:int) -> list:
+        _check_state(state)
+        user_id = str(user_id)
+        path = self._open(user_id, state)
+        jobs = []
+        with self._locked(path):
+            for line in self._live_lines(path):
+                if len(jobs) >= n:
+                    break
+                jobs.append(json.loads(line)["data"])
+            if not jobs:
+                return []
+            job_ids = [job_key(job) for job in jobs]
+            versions = self._commit(path, [self._del_line(job_id) for job_id in job_ids])
+        self._notify(user_id, state, *versions, deletes=job_ids)
+        return jobs
+
+
+class _CachedList:
+    """Parsed records of one list ordered by cursor. Stored records are replaced, never changed in place."""
+
+    def __init__(self, version:str , records):
+        self.version = version
+        self.cursors = []
+        self.jobs = {}  # cursor -> job
+        self.ids = {}   # job id -> cursor
+        self.put(records)
+
+    def put(self, records):
+        for cursor, job in records:
+            self.delete([job_key(job)])
+            self.ids[job_key(job)] = cursor
+            self.jobs[cursor] = dict(job)
+            bisect.insort(self.cursors, cursor)
+
+    def delete(self, job_ids):
+        for job_id in job_ids:
+            cursor = self.ids.pop(str(job_id), None)
+            if cursor is not None:
+                del self.jobs[cursor]
+                del self.cursors[bisect.bisect_left(self.cursors, cursor)]
+
+
+class CachedJobStore(JobStore):
+    """
+    Read-through cache of parsed job lists in front of another store, bounded to the `max_users`
+    most recently used users. Writes go to the backend and its change events patch the cached lists
+    in place, so reads of active users never touch the disk. A watcher thread compares the backend
+    version of every cached list, and of the lists only counted or read through count() and latest(),
+    every `watch_interval` seconds. A list changed by another process is dropped and its change
+    is passed on to the listeners with size None.
+    Returned records are shallow copies.
+    """
+
+    def __init__(self, backend:JobStore , max_users:int = JOB_CACHE_MAX_USERS , watch_interval:float = JOB_CACHE_WATCH_INTERVAL):
+        super().__init__()
+        self.backend = backend
+        self.max_users = max(1, max_users)
+        self.watch_interval = watch_interval
+
+        # user_id -> {state: _CachedList}, least recently used first
+        self._users = OrderedDict()
+        # (user_id, state) -> backend version of lists answered by count() or latest() without loading them
+        self._versions = OrderedDict()
+        self._lock = threading.RLock()
+        # (user_id, state) -> Event set when the list's load ends, one load of a list at a time
+        self._loading = {}
+        self._watcher = None
+        self.hits = 0
+        self.misses = 0
+
+        backend.add_listener(self._on_change)
+
+    def _entry(self, user_id:str , state:str) -> _CachedList:
+        """The cached list, loaded from the backend on a miss without holding the lock while it reads."""
+        _check_state(state)
+        key = (user_id, state)
+        while True:
+            with self._lock:
+                lists = self._users.get(user_id)
+                if lists is not None:
+                    self._users.move_to_end(user_id)
+                    if state in lists:
+                        self.hits += 1
+                        return lists[state]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # another reader loads the list, use its result (or load it if that one failed)
+            loading.wait()
+
+        try:
+            return self._load(user_id, state)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _load(self, user_id:str , state:str) -> _CachedList:
+        for _ in range(JOB_CACHE_LOAD_ATTEMPTS):
+            version = self.backend.version(user_id, state)
+            entry = _CachedList(version, self.backend.iter_after(user_id, state))
+            with self._lock:
+                self.misses += 1
+                # a write committed during the read changed the version, its event found nothing to patch
+                if self.backend.version(user_id, state) != version:
+                    continue
+                # from here on the change events of later writes patch the entry
+                self._users.setdefault(user_id, {})[state] = entry
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                self._start_watcher()
+                return entry
+        # the list keeps changing, serve this read without caching it
+        return entry
+
+    def _start_watcher(self):
+        # called with self._lock held
+        if self._watcher is None and self.watch_interval > 0:
+            self._watcher = threading.Thread(target=self._watch_loop, name="job-cache-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self, user_id:str , state:str):
+        """Remember the version of a list that is read without being cached, so the watcher sees other processes change it."""
+        # called with self._lock held, before the backend read
+        key = (user_id, state)
+        if key not in self._versions:
+            self._versions[key] = self.backend.version(user_id, state)
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.max_users * len(STATES):
+            self._versions.popitem(last=False)
+        self._start_watcher()
+
+    def _on_change(self, user_id:str , state:str , old_version:str , new_version:str , size:int , puts:list , deletes:list):
+        with self._lock:
+            lists = self._users.get(user_id, {})
+            entry = lists.get(state)
+            if (user_id, state) in self._versions:
+                self._versions[(user_id, state)] = new_version
+            if entry is not None and entry.version != new_version:
+                if entry.version == old_version:
+                    entry.put(puts)
+                    entry.delete(deletes)
+                    entry.version = new_version
+                else:
+                    # missed a change in between, load again on the next read
+                    del lists[state]
+        self._notify(user_id, state, old_version, new_version, size, puts, deletes)
+
+    def check_versions(self):
+        """Drop the lists another process changed and report them to the listeners (size None)."""
+        with self._lock:
+            cached = [(user_id, state, entry) for user_id, lists in self._users.items() for state, entry in lists.items()]
+            watched = list(self._versions.items())
+
+        changed = {}
+        for user_id, state, entry in cached:
+            try:
+                version = self.backend.version(user_id, state)
+            except Exception as e:
+                print(f"Error checking job list version of user {user_id}: {e}")
+                continue
+            with self._lock:
+                lists = self._users.get(user_id, {})
+                if lists.get(state) is entry and entry.version != version:
+                    del lists[state]
+                    changed[(user_id, state)] = (entry.version, version)
+
+        for (user_id, state), seen in watched:
+            if (user_id, state) in changed:
+                continue
+            try:
+                version = self.backend.version(user_id, state)
+            except Exception as e:
+                print(f"Error checking job list version of user {user_id}: {e}")
+                continue
+            with self._lock:
+                if self._versions.get((user_id, state)) == seen and version != seen:
+                    self._versions[(user_id, state)] = version
+                    changed[(user_id, state)] = (seen, version)
+
+        for (user_id, state), (old_version, new_version) in changed.items():
+            with self._lock:
+                if (user_id, state) in self._versions:
+                    self._versions[(user_id, state)] = new_version
+            self._notify(user_id, state, old_version, new_version, None)
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self.watch_interval)
+            self.check_versions()
+
+    # ---- reads ----
+
+    def iter_after(self, user_id:str , state:str , after:int = 0):
+        entry = self._entry(str(user_id), state)
+        with self._lock:
+            start = bisect.bisect_right(entry.cursors, after or 0)
+            records = [(cursor, entry.jobs[cursor]) for cursor in entry.cursors[start:]]
+        for cursor, job in records:
+            yield cursor, dict(job)
+
+    def get(self, user_id:str , state:str , job_id:str):
+        entry = self._entry(str(user_id), state)
+        with self._lock:
+            cursor = entry.ids.get(str(job_id))
+            return dict(entry.jobs[cursor]) if cursor is not None else None
+
+    def _cached(self, user_id:str , state:str):
+        with self._lock:
+            return self._users.get(str(user_id), {}).get(state)
+
+    def count(self, user_id:str , state:str) -> int:
+        # lists that are not cached are counted by the backend instead of being loaded
+        with self._lock:
+            entry = self._cached(user_id, state)
+            if entry is not None:
+                return len(entry.cursors)
+            self._watch(str(user_id), state)
+        return self.backend.count(user_id, state)
+
+    def latest(self, user_id:str , state:str , n:int) -> list:
+        with self._lock:
+            entry = self._cached(user_id, state)
+            if entry is not None:
+                return [(cursor, dict(entry.jobs[cursor])) for cursor in reversed(entry.cursors[-n:])] if n > 0 else []
+            self._watch(str(user_id), state)
+        return self.backend.latest(user_id, state, n)
+
+    def version(self, user_id:str , state:str) -> str:
+        _check_state(state)
+        entry = self._cached(user_id, state)
+        if entry is not None:
+            return entry.version
+        # an ETag check of a list that is not cached must not load it
+        return self.backend.version(str(user_id), state)
+
+    # ---- writes (the backend's change events update the cache) ----
+
+    def append(self, user_id:str , state:str , jobs:list) -> int:
+        return self.backend.append(user_id, state, jobs)
+
+    def update(self, user_id:str , state:str , job:dict) -> bool:
+        return self.backend.update(user_id, state, job)
+
+    def move(self, user_id:str , job_id:str , from_state:str , to_state:str , data:dict = None) -> bool:
+        return self.backend.move(user_id, job_id, from_state, to_state, data=data)
+
+    def remove(self, user_id:str , state:str , job_id:str) -> bool:
+        return self.backend.remove(user_id, state, job_id)
+
+    def pop(self, user_id:str , state:str , n:int) -> list:
+        return self.backend.pop(user_id, state, n)
+
+
+def create_job_store(backend:str = JOB_STORE_BACKEND , cached:bool = JOB_CACHE_ENABLED) -> JobStore:
+    if backend == "sqlite":
+        store = SQLiteJobStore()
+    elif backend == "jsonl":
+        store = JsonlJobStore()
+    else:
+        raise ValueError(f"Unknown job store backend {backend}")
+    return CachedJobStore(store) if cached else store
+
+
+job_store = create_job_store()
@@ -0,0 +1,234 @@
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# changable variables
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 20000))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_MAX_AGE = int(os.getenv("LLM_CACHE_MAX_AGE", 7 * 24 * 3600))  # sec
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+
+# run eviction once every N writes
+EVICT_EVERY = 100
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def template_id(name: str, prompt) -> str:
+    """Stable id of a prompt template, changes whenever the prompt text changes."""
+    return f"{name}:{_sha256(prompt.pretty_repr())[:16]}"
+
+
+def make_key(template: str, *inputs: str) -> str:
+    """Cache key from the template id and the hashes of the serialized inputs."""
+    return _sha256(template + "\0" + "\0".join(_sha256(i) for i in inputs))
+
+
+class _LeaderGone(Exception):
+    """The call a follower waited for was interrupted, the follower takes the lead."""
+
+
+class LLMResponseCache:
+    """
+    Disk backed cache of LLM responses (sqlite, one connection per thread).
+    Identical requests in flight at the same time share a single call.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, max_age: int = LLM_CACHE_MAX_AGE, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        conn = self._conn()
+        row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, created_at = row
+        now = time.time()
+        if now - created_at > self.max_age:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now)
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            run_evict = self._writes % EVICT_EVERY == 0
+        if run_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until the size limits hold."""
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age,))
+
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            removed_count = 0
+            removed_bytes = 0
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+                if count - removed_count <= self.max_entries and total - removed_bytes <= self.max_bytes:
+                    break
+                victims.append((key,))
+                removed_count += 1
+                removed_bytes += size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            print(f"LLM cache evicted {removed_count} entries")
+        conn.commit()
+
+    def _join_or_lead(self, key: str):
+        """Returns (future, is_leader) for the in-flight call of this key."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def _finish(self, key: str, future: Future, value=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def get_or_call(self, key: str, fn, validate=None) -> str:
+        """Return the cached response for key, or call fn() once and cache it if validate(value) passes."""
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            future, leader = self._join_or_lead(key)
+            if not leader:
+                try:
+                    value = future.result()
+                except _LeaderGone:
+                    continue
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            try:
+                # another leader may have finished between the lookup and taking the lead
+                value = self.get(key)
+                if value is None:
+                    value = fn()
+                    if validate is None or validate(value):
+                        self.set(key, value)
+            except Exception as e:
+                self._finish(key, future, error=e)
+                raise
+            except BaseException:
+                # interrupted (KeyboardInterrupt, SystemExit), the followers elect a new leader
+                self._finish(key, future, error=_LeaderGone())
+                raise
+            self._finish(key, future, value=value)
+            return value
+
+    async def _alead(self, key: str, afn, validate, future: Future) -> str:
+        try:
+            value = await asyncio.to_thread(self.get, key)
+            if value is None:
+                value = await afn()
+                if validate is None or validate(value):
+                    await asyncio.to_thread(self.set, key, value)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=_LeaderGone())
+            raise
+        self._finish(key, future, value=value)
+        return value
+
+    async def aget_or_call(self, key: str, afn, validate=None) -> str:
+        """
+        Async version of get_or_call, afn is a coroutine function. The sqlite reads and writes run in
+        the loop's executor. The shared call is a task of its own, so cancelling the caller that
+        started it (or any follower) does not cancel it for the others.
+        """
+        while True:
+            value = await asyncio.to_thread(self.get, key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            future, leader = self._join_or_lead(key)
+            if not leader:
+                try:
+                    value = await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderGone:
+                    continue
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            task = asyncio.ensure_future(self._alead(key, afn, validate, future))
+            # the error of a call nobody waits for anymore is still retrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return await asyncio.shield(task)
+
+
+llm_cache = LLMResponseCache()
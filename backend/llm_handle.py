@@ -4,11 +4,16 @@ from dotenv import load_dotenv
 import db.mongo_db as db
 import os
 import json
-from filelock import FileLock
+import asyncio
+import itertools
 
 from data_types import User
-from document_loader.parser import _clean_model_response
-from websocker_handle import websocket_manager
+from document_loader.parser import _clean_model_response , _clean_model_array_response
+from notification_bus import notification_bus
+from llm_scheduler import llm_scheduler , PRIORITY_INTERACTIVE , PRIORITY_APPLICATION , PRIORITY_BACKGROUND
+from llm_cache import llm_cache , template_id , make_key
+from retry_policy import llm_retry
+from job_store import job_store , REJECTED , CLARIFY
 
 load_dotenv()
 
@@ -54,6 +59,29 @@ SCORING_PROMPT = ChatPromptTemplate.from_messages([
     ("user", "### CANDIDATE PROFILE:\n{user_json}\n\n### JOB DESCRIPTION:\n{job_json}")
 ])
 
+BATCH_SCORING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a Senior Talent Acquisition Lead. Evaluate job compatibility with extreme precision.\n\n"
+        
+        "You will receive ONE candidate profile and a JSON ARRAY of jobs. Score EVERY job independently "
+        "against the candidate.\n\n"
+
+        "STRICT SCORING CRITERIA (Total 100%):\n"
+        "1. Technical Skills & Roles (40%): Compare 'skills' and 'roleExperience' with the Job Description.\n"
+        "2. Educational & Achievement Tier (30%): Evaluate 'education' (e.g., IIT ISM), 'achievements' (JEE ranks, Hackathons), and 'projects'.\n"
+        "3. Preferences & Logistics (30%): Evaluate match against:\n"
+        "   - 'workMode' and 'cityPreference'/'countryPreference'.\n"
+        "   - 'minimumSalary' (Reject if job pay is clearly below user minimum).\n"
+        "   - 'noticePeriod' and 'relocationOpenness'.\n"
+        "   - 'companyPreference' (Google, Facebook, etc.).\n\n"
+        
+        "OUTPUT FORMAT:\n"
+        "Return ONLY a JSON array with exactly one object per job, using the job's 'id'. No conversational text.\n"
+        "[{{ \"id\": \"<job id>\", \"score\": <int give evaluation score out of 100>, \"reason\": \"<string summarizing specific pros/cons and the reason for the given score>\" }}]"
+    )),
+    ("user", "### CANDIDATE PROFILE:\n{user_json}\n\n### JOBS:\n{jobs_json}")
+])
+
 RESUME_PROMPT = ChatPromptTemplate.from_messages([
     ("system", (
         "You are a Professional Resume Writer and Career Coach. Your goal is to generate a "
@@ -143,6 +171,10 @@ CLARIFICATION_PROMPT = ChatPromptTemplate.from_messages([
 # changable variables
 REJECT_THRESHOLD_SCORE = 40
 CLARIFY_THRESHOLD_SCORE = 70
+# max number of scoring calls in flight at once for one ranking batch
+MAX_CONCURRENT_SCORING = int(os.getenv("MAX_CONCURRENT_SCORING", 5))
+# number of jobs scored by one BATCH_SCORING_PROMPT call (1 = one SCORING_PROMPT call per job)
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", 5))
 
 
 llm = HuggingFaceEndpoint(
@@ -151,6 +183,80 @@ llm = HuggingFaceEndpoint(
 )
 model = ChatHuggingFace(llm = llm)
 
+# cache namespaces, a prompt change gives a new id so stale responses are never reused
+JOB_QUERY_TEMPLATE_ID = template_id("job_query", JOB_QUERY_PROMPT)
+SCORING_TEMPLATE_ID = template_id("scoring", SCORING_PROMPT)
+BATCH_SCORING_TEMPLATE_ID = template_id("batch_scoring", BATCH_SCORING_PROMPT)
+RESUME_TEMPLATE_ID = template_id("resume", RESUME_PROMPT)
+COVER_LETTER_TEMPLATE_ID = template_id("cover_letter", COVER_LETTER_PROMPT)
+EVIDENCE_POINTS_TEMPLATE_ID = template_id("evidence_points", EVIDENCE_POINTS_PROMPT)
+CLARIFICATION_TEMPLATE_ID = template_id("clarification", CLARIFICATION_PROMPT)
+
+
+def _response_text(response) -> str:
+    # If result is a ChatMessage object (typical in LangChain), extract the content string
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+def _is_json_response(text: str) -> bool:
+    try:
+        _clean_model_response(text.strip())
+        return True
+    except Exception:
+        return False
+
+
+def cached_invoke(template:str , prompt , inputs:dict , priority:int , validate=None , user_id:str = None) -> str:
+    """
+    Run prompt | model through the scheduler, reusing a cached response for identical inputs.
+    Transient model errors are retried with backoff (blocking, so call it off the event loop).
+    """
+    key = make_key(template, *(inputs[k] for k in sorted(inputs)))
+    chain = prompt | model
+
+    def call():
+        return _response_text(llm_retry.call(llm_scheduler.invoke, chain, inputs, priority=priority, user_id=user_id))
+
+    return llm_cache.get_or_call(key, call, validate=validate)
+
+
+async def acached_invoke(template:str , prompt , inputs:dict , priority:int , validate=None , user_id:str = None) -> str:
+    """Async version of cached_invoke, retries wait without blocking the event loop."""
+    key = make_key(template, *(inputs[k] for k in sorted(inputs)))
+    chain = prompt | model
+
+    async def call():
+        return _response_text(await llm_retry.run(llm_scheduler.ainvoke, chain, inputs, priority=priority, user_id=user_id))
+
+    return await llm_cache.aget_or_call(key, call, validate=validate)
+
+
+def streamed_invoke(template:str , prompt , inputs:dict , priority:int , on_token , validate=None , user_id:str = None) -> str:
+    """
+    cached_invoke that hands every token to on_token(text, attempt) while the model produces it.
+    A cached response arrives as one token. A retried call starts over with the next attempt number,
+    so a listener drops the text of the failed attempt.
+    """
+    key = make_key(template, *(inputs[k] for k in sorted(inputs)))
+    chain = prompt | model
+    attempts = itertools.count(1)
+    streamed = []
+
+    def attempt():
+        number = next(attempts)
+        streamed.append(number)
+        chunks = llm_scheduler.stream(chain, inputs, lambda chunk: on_token(_response_text(chunk), number), priority=priority)
+        return "".join(_response_text(chunk) for chunk in chunks)
+
+    def call():
+        return llm_retry.call(attempt, user_id=user_id)
+
+    value = llm_cache.get_or_call(key, call, validate=validate)
+    if not streamed:
+        # served from the cache or by an identical call in flight
+        on_token(value, 1)
+    return value
+
 
 def generate_query_for_job_search(user_data = None):
     if user_data is None:
@@ -161,16 +267,16 @@ def generate_query_for_job_search(user_data = None):
 
     print("Invoke chain")
 
-    chain = JOB_QUERY_PROMPT | model
-    result = chain.invoke({"user_json": user_json_str})
-
-    # If result is a ChatMessage object (typical in LangChain), extract the content string
-    query_string = result.content if hasattr(result, 'content') else str(result)    
+    query_string = cached_invoke(JOB_QUERY_TEMPLATE_ID, JOB_QUERY_PROMPT, {"user_json": user_json_str}, PRIORITY_BACKGROUND)
 
     return query_string.strip()
 
 
-def generate_clarification(user:User , job:dict , user_data=None):
+def generate_clarification(user:User , job:dict , user_data=None , on_token=None):
+    """
+    Markdown clarification report of a job. With on_token(text, attempt) the report is streamed
+    token by token while it is generated (see streamed_invoke).
+    """
     if not user_data:
         raise Exception("user data is required")
 
@@ -182,20 +288,16 @@ def generate_clarification(user:User , job:dict , user_data=None):
     job_json = json.dumps(job)
 
     print("Calling chain")
-    # 2. Initialize the Chain
-    # Assuming 'model' is your ChatHuggingFace(llm=llm) instance
-    chain = CLARIFICATION_PROMPT | model
-
-    # 3. Invoke LLM
+    # 2. Invoke LLM (queued by the scheduler, identical requests are served from the cache)
     try:
-        response = chain.invoke({
+        inputs = {
             "user_json": user_json,
             "job_json": job_json
-        })
-        
-        # 4. Extract Content
-        # result.content contains the raw Markdown text
-        clarification_markdown = response.content if hasattr(response, 'content') else str(response)
+        }
+        if on_token is None:
+            clarification_markdown = cached_invoke(CLARIFICATION_TEMPLATE_ID, CLARIFICATION_PROMPT, inputs, PRIORITY_INTERACTIVE, user_id=str(user.user_id))
+        else:
+            clarification_markdown = streamed_invoke(CLARIFICATION_TEMPLATE_ID, CLARIFICATION_PROMPT, inputs, PRIORITY_INTERACTIVE, on_token, user_id=str(user.user_id))
         
         print("created clarification for ", job.get("company"))
 
@@ -206,7 +308,89 @@ def generate_clarification(user:User , job:dict , user_data=None):
         raise Exception("Failed to generate clarification points. Please check your LLM connection.")
 
 
-async def separate_and_rank_jobs(user:User , jobs:list , user_data = None):
+async def _score_job(semaphore, user:User , user_json:str , job:dict):
+    """Score a single job, holding one of the in-flight slots for the LLM call."""
+    async with semaphore:
+        if not user.is_active:
+            return None
+
+        job_json = json.dumps(job)
+        print("process job " , job["id"])
+        try:
+            response = await acached_invoke(
+                SCORING_TEMPLATE_ID, SCORING_PROMPT,
+                {"user_json": user_json, "job_json": job_json},
+                PRIORITY_BACKGROUND,
+                validate=_is_json_response,
+                user_id=str(user.user_id)
+            )
+            print("raw model repsonse " , response.strip())
+            # Parse the JSON response from LLM
+            # Note: Depending on output, you might need to clean markdown ```json ... ```
+            return _clean_model_response(response.strip())
+        except Exception as e:
+            print(f"Error scoring job: {e}")
+            return None
+
+
+def _parse_batch_scores(text:str , job_ids:list) -> dict:
+    """Map job id -> {score, reason} from a batch scoring response, raises if any job is missing."""
+    items = _clean_model_array_response(text.strip())
+    scores = {}
+    for item in items:
+        if isinstance(item, dict) and "id" in item and "score" in item:
+            scores[str(item["id"])] = item
+
+    missing = [job_id for job_id in job_ids if job_id not in scores]
+    if missing:
+        raise ValueError(f"Batch response is missing jobs {missing}")
+    return scores
+
+
+async def _score_batch(semaphore, user:User , user_json:str , batch:list):
+    """
+    Score several jobs with one BATCH_SCORING_PROMPT call (one copy of the profile).
+    Falls back to one SCORING_PROMPT call per job if the response can not be parsed.
+    """
+    if len(batch) == 1:
+        return [await _score_job(semaphore, user, user_json, batch[0])]
+
+    job_ids = [str(job["id"]) for job in batch]
+    jobs_json = json.dumps(batch)
+
+    async with semaphore:
+        if not user.is_active:
+            return [None] * len(batch)
+
+        print("process jobs " , job_ids)
+        try:
+            response = await acached_invoke(
+                BATCH_SCORING_TEMPLATE_ID, BATCH_SCORING_PROMPT,
+                {"user_json": user_json, "jobs_json": jobs_json},
+                PRIORITY_BACKGROUND,
+                validate=lambda text: _is_batch_response(text, job_ids),
+                user_id=str(user.user_id)
+            )
+            scores = _parse_batch_scores(response, job_ids)
+            return [scores[job_id] for job_id in job_ids]
+        except Exception as e:
+            print(f"Error batch scoring jobs, falling back to single job scoring: {e}")
+
+    # the semaphore is released here, so the per-job calls can take their own slots
+    return list(await asyncio.gather(*(
+        _score_job(semaphore, user, user_json, job) for job in batch
+    )))
+
+
+def _is_batch_response(text:str , job_ids:list) -> bool:
+    try:
+        _parse_batch_scores(text, job_ids)
+        return True
+    except Exception:
+        return False
+
+
+async def separate_and_rank_jobs(user:User , jobs:list , user_data = None , max_concurrency:int = MAX_CONCURRENT_SCORING , batch_size:int = SCORING_BATCH_SIZE):
     if len(jobs)==0 or user_data is None:
         return []
     
@@ -215,10 +399,6 @@ async def separate_and_rank_jobs(user:User , jobs:list , user_data = None):
         return
 
     user_id = str(user.user_id)
-    user_dir = f"./{user_id}"
-    
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
 
     applied_jobs = []
     rejected_list = []
@@ -227,32 +407,36 @@ async def separate_and_rank_jobs(user:User , jobs:list , user_data = None):
     # The LLM needs a string representation of the JSON
     user_json = json.dumps(user_data)
 
-    # 1. Initialize the Chain
-    chain = SCORING_PROMPT | model
+    # 2. Score all jobs concurrently in batches of `batch_size`, at most `max_concurrency` LLM calls in flight.
+    # gather keeps the results in the same order as `jobs`.
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    batch_size = max(1, batch_size)
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    batch_results = await asyncio.gather(*(
+        _score_batch(semaphore, user, user_json, batch) for batch in batches
+    ))
+    results = [data for batch in batch_results for data in batch]
 
-    for job in jobs:
-        if not user.is_active:
-            print("User is not active")
-            return
+    if not user.is_active:
+        print("User is not active")
+        return
 
-        # Generate Score using LLM
-        job_json = json.dumps(job)
-        print("process job " , job["id"])
+    for job, data in zip(jobs, results):
+        if data is None:
+            continue
+
+        score = data.get("score", 0)
+        job["match_score"] = score
+        job["match_reason"] = data.get("reason", "")
+
+        # 3. Logic for Ranking and Filing
         try:
-            response = chain.invoke({"user_json": user_json, "job_json": job_json})
-            print("raw model repsonse " , response.content.strip())
-            # Parse the JSON response from LLM
-            # Note: Depending on output, you might need to clean markdown ```json ... ```
-            data = _clean_model_response(response.content.strip())
-            score = data.get("score", 0)
-            job["match_score"] = score
-            job["match_reason"] = data.get("reason", "")
-        except Exception as e:
-            print(f"Error scoring job: {e}")
+            score = int(score)
+        except (TypeError, ValueError):
+            print(f"Invalid score for job {job['id']}: {score}")
             continue
 
-        # 2. Logic for Ranking and Filing
-        if int(score) <= REJECT_THRESHOLD_SCORE:
+        if score <= REJECT_THRESHOLD_SCORE:
             rejected_list.append(job)
             role = job["title"]
             company = job["company"]
@@ -262,36 +446,18 @@ async def separate_and_rank_jobs(user:User , jobs:list , user_data = None):
                 "message": f"Application for {role} in {company} has been discarded.",
                 "job_id": f"{job_id}"
             }
-            await websocket_manager.send_personal_message(user_id , data)
+            notification_bus.publish(user_id , data)
 
-        elif int(score) <= CLARIFY_THRESHOLD_SCORE:
+        elif score <= CLARIFY_THRESHOLD_SCORE:
             clarify_list.append(job)
         else:
             applied_jobs.append(job)
 
-    # 3. Append to files (Reading existing data first to avoid overwriting)
-    def append_to_file(filename, new_data):
-        path = os.path.join(user_dir, filename)
-        current_data = []
-        lock_path = path + ".lock"
-
-        lock = FileLock(lock_path , timeout=10)
-
-        with lock : 
-            # load current data from file 
-            if os.path.exists(path):
-                with open(path, 'r') as f:
-                    try: current_data = json.load(f)
-                    except: current_data = []
-            
-            current_data.extend(new_data)
-            with open(path, 'w') as f:
-                json.dump(current_data, f, indent=4)
-
-    if rejected_list: append_to_file('rejected_jobs.json', rejected_list)
-    if clarify_list: append_to_file('clarify_jobs.json', clarify_list)
-
-    # 4. Sort applied jobs by score descending
+    # 4. Store the results once per batch
+    if rejected_list: job_store.append(user_id, REJECTED, rejected_list)
+    if clarify_list: job_store.append(user_id, CLARIFY, clarify_list)
+
+    # 5. Sort applied jobs by score descending
     applied_jobs.sort(key=lambda x: x['match_score'], reverse=True)
 
     return applied_jobs
@@ -313,20 +479,12 @@ def generate_resume(user:User , job:dict , user_data=None):
     job_json = json.dumps(job)
 
     print("Calling chain")
-    # 2. Initialize the Chain
-    # Assuming 'model' is your ChatHuggingFace(llm=llm) instance
-    chain = RESUME_PROMPT | model
-
-    # 3. Invoke LLM
+    # 2. Invoke LLM (queued by the scheduler, identical requests are served from the cache)
     try:
-        response = chain.invoke({
+        resume_markdown = cached_invoke(RESUME_TEMPLATE_ID, RESUME_PROMPT, {
             "user_json": user_json,
             "job_json": job_json
-        })
-        
-        # 4. Extract Content
-        # result.content contains the raw Markdown text
-        resume_markdown = response.content if hasattr(response, 'content') else str(response)
+        }, PRIORITY_APPLICATION, user_id=str(user.user_id))
         
         print("created resume for ", job.get("company"))
         return resume_markdown.strip()
@@ -352,20 +510,12 @@ def generate_cover_letter(user:User , job:dict , user_data=None):
     job_json = json.dumps(job)
 
     print("Calling chain")
-    # 2. Initialize the Chain
-    # Assuming 'model' is your ChatHuggingFace(llm=llm) instance
-    chain = COVER_LETTER_PROMPT | model
-
-    # 3. Invoke LLM
+    # 2. Invoke LLM (queued by the scheduler, identical requests are served from the cache)
     try:
-        response = chain.invoke({
+        cover_letter_markdown = cached_invoke(COVER_LETTER_TEMPLATE_ID, COVER_LETTER_PROMPT, {
             "user_json": user_json,
             "job_json": job_json
-        })
-        
-        # 4. Extract Content
-        # result.content contains the raw Markdown text
-        cover_letter_markdown = response.content if hasattr(response, 'content') else str(response)
+        }, PRIORITY_APPLICATION, user_id=str(user.user_id))
         
         print("cover letter for ", job.get("company"))
 
@@ -392,20 +542,12 @@ def generate_evidence_points(user:User , job:dict , user_data=None):
     job_json = json.dumps(job)
 
     print("Calling chain")
-    # 2. Initialize the Chain
-    # Assuming 'model' is your ChatHuggingFace(llm=llm) instance
-    chain = EVIDENCE_POINTS_PROMPT | model
-
-    # 3. Invoke LLM
+    # 2. Invoke LLM (queued by the scheduler, identical requests are served from the cache)
     try:
-        response = chain.invoke({
+        evidence_points_markdown = cached_invoke(EVIDENCE_POINTS_TEMPLATE_ID, EVIDENCE_POINTS_PROMPT, {
             "user_json": user_json,
             "job_json": job_json
-        })
-        
-        # 4. Extract Content
-        # result.content contains the raw Markdown text
-        evidence_points_markdown = response.content if hasattr(response, 'content') else str(response)
+        }, PRIORITY_APPLICATION, user_id=str(user.user_id))
         
         print("created evidence for ", job.get("company"))
         return evidence_points_markdown.strip()
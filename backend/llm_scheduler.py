@@ -0,0 +1,207 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# priority classes (lower value runs first)
+PRIORITY_INTERACTIVE = 0   # user is waiting on the answer (clarification, resume parsing)
+PRIORITY_APPLICATION = 1   # documents for a job that is about to be submitted
+PRIORITY_BACKGROUND = 2    # scoring and search query generation
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_APPLICATION: "application",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# changable variables
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", 2.0))
+LLM_BURST = int(os.getenv("LLM_BURST", 5))
+
+WAIT_SAMPLES = 500
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def refund(self):
+        """Give back a token that was taken but not used."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _Request:
+    def __init__(self, priority: int, fn, args, kwargs):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Process wide gate in front of every LLM call.
+    Requests are queued by priority class, released through a token bucket rate limit
+    and executed by a fixed number of threads (the global concurrency cap).
+    It is thread safe, so user workers running on different event loops share it.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rate_per_sec: float = LLM_RATE_PER_SEC, burst: int = LLM_BURST):
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(rate_per_sec, burst)
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+        # metrics
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self._max_wait = {p: 0.0 for p in PRIORITY_NAMES}
+
+    def _start_workers(self):
+        # called with self._cond held
+        if self._threads:
+            return
+        for i in range(self.max_concurrency):
+            thread = threading.Thread(target=self._worker, name=f"llm-scheduler-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args, priority: int = PRIORITY_BACKGROUND, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) and return a concurrent Future with its result."""
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"Unknown priority class {priority}")
+
+        request = _Request(priority, fn, args, kwargs)
+        with self._cond:
+            self._start_workers()
+            heapq.heappush(self._queue, (priority, next(self._seq), request))
+            self._cond.notify()
+        return request.future
+
+    def invoke(self, chain, inputs: dict, priority: int = PRIORITY_BACKGROUND):
+        """Blocking chain.invoke through the scheduler."""
+        return self.submit(chain.invoke, inputs, priority=priority).result()
+
+    async def ainvoke(self, chain, inputs: dict, priority: int = PRIORITY_BACKGROUND):
+        """chain.invoke through the scheduler without blocking the calling event loop."""
+        return await asyncio.wrap_future(self.submit(chain.invoke, inputs, priority=priority))
+
+    def stream(self, chain, inputs: dict, on_chunk, priority: int = PRIORITY_BACKGROUND):
+        """
+        Blocking chain.stream through the scheduler, on_chunk(chunk) is called from the scheduler
+        thread for every chunk as it arrives. Returns the list of chunks.
+        """
+        def run():
+            chunks = []
+            for chunk in chain.stream(inputs):
+                chunks.append(chunk)
+                on_chunk(chunk)
+            return chunks
+
+        return self.submit(run, priority=priority).result()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+
+            # wait for the rate limit outside the lock, then take the best request queued by now
+            self.bucket.acquire()
+
+            with self._cond:
+                if not self._queue:
+                    # another worker took the request while this one waited for a token
+                    self.bucket.refund()
+                    continue
+                _, _, request = heapq.heappop(self._queue)
+
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+
+                waited = time.monotonic() - request.enqueued_at
+                self._waits[request.priority].append(waited)
+                self._max_wait[request.priority] = max(self._max_wait[request.priority], waited)
+                self._in_flight += 1
+
+            try:
+                result = request.fn(*request.args, **request.kwargs)
+            except BaseException as e:
+                # counted before the caller sees the outcome, so its metrics include this call
+                with self._cond:
+                    self._in_flight -= 1
+                    self._failed += 1
+                request.future.set_exception(e)
+            else:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._completed += 1
+                request.future.set_result(result)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._queue:
+                depth[PRIORITY_NAMES[priority]] += 1
+
+            wait_time = {}
+            for priority, name in PRIORITY_NAMES.items():
+                samples = sorted(self._waits[priority])
+                wait_time[name] = {
+                    "samples": len(samples),
+                    "avg_sec": round(sum(samples) / len(samples), 4) if samples else 0.0,
+                    "p95_sec": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4) if samples else 0.0,
+                    "max_sec": round(self._max_wait[priority], 4),
+                }
+
+            return {
+                "queue_depth": len(self._queue),
+                "queue_depth_by_priority": depth,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "max_concurrency": self.max_concurrency,
+                "rate_per_sec": self.bucket.rate,
+                "wait_time": wait_time,
+            }
+
+
+llm_scheduler = LLMScheduler()
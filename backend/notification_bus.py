@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import queue
+import socket
+import asyncio
+import threading
+from uuid import uuid4
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# changable variables
+# memory: producers and sockets share the process, unix: worker processes publish to the API process over a unix socket
+NOTIFY_TRANSPORT = os.getenv("NOTIFY_TRANSPORT", "unix" if int(os.getenv("WORKER_SHARDS", 0)) > 0 else "memory")
+NOTIFY_SOCKET_PATH = os.getenv("NOTIFY_SOCKET_PATH", "/tmp/job_apply_workers/notify.sock")
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", 64))  # events per write
+NOTIFY_BATCH_INTERVAL = float(os.getenv("NOTIFY_BATCH_INTERVAL", 0.02))  # sec to wait for more events of a batch
+NOTIFY_MAX_PENDING = int(os.getenv("NOTIFY_MAX_PENDING", 10000))  # events buffered while the gateway is down
+NOTIFY_RECONNECT_DELAY = float(os.getenv("NOTIFY_RECONNECT_DELAY", 1))  # sec
+NOTIFY_SENDER_TTL = float(os.getenv("NOTIFY_SENDER_TTL", 600))  # sec the gateway remembers a disconnected sender's last seq
+
+
+class NotificationBus:
+    """
+    Pub/sub between the event producers (pipelines, scoring, submissions) and the websocket gateway.
+    Producers call publish(user_id, event) from any thread, loop or process, it never waits on a socket.
+    The gateway subscribes with fn(user_id, event, replay) and gets the events of a user in publish order.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, fn):
+        self._subscribers.append(fn)
+
+    def _dispatch(self, user_id:str , event:dict , replay:bool):
+        for fn in self._subscribers:
+            try:
+                fn(user_id, event, replay)
+            except Exception as e:
+                print("Error in notification subscriber " , e)
+
+    def publish(self, user_id:str , event:dict , replay:bool = True):
+        raise NotImplementedError
+
+    async def start(self):
+        """Gateway side, start receiving events."""
+
+    async def close(self):
+        pass
+
+
+class InMemoryBus(NotificationBus):
+    """Producers in the gateway's process, events go straight to the subscribers."""
+
+    def publish(self, user_id:str , event:dict , replay:bool = True):
+        self._dispatch(str(user_id), event, replay)
+
+
+class UnixSocketBus(NotificationBus):
+    """
+    Producers in other processes. publish() queues the event for a sender thread that writes
+    batches of JSON lines (one event per line) to the gateway's unix socket. One FIFO queue and one
+    connection per process keep the order, and a user belongs to one worker process, so the events
+    of a user arrive in order. While the gateway is down events wait in the queue (NOTIFY_MAX_PENDING),
+    when that is full new events are dropped. A batch whose write failed is sent again, every event
+    carries its sender id and seq so the gateway drops the ones it already got. The gateway forgets
+    a sender NOTIFY_SENDER_TTL seconds after its last connection closed (a restarted shard is a new sender).
+    """
+
+    def __init__(self, path:str = NOTIFY_SOCKET_PATH , batch_size:int = NOTIFY_BATCH_SIZE ,
+                 batch_interval:float = NOTIFY_BATCH_INTERVAL , max_pending:int = NOTIFY_MAX_PENDING ,
+                 sender_ttl:float = NOTIFY_SENDER_TTL):
+        super().__init__()
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.sender_ttl = sender_ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._server = None
+        self.dropped = 0
+        self.sender = None
+        self._seq = 0
+        # gateway side: sender -> [last dispatched seq, open connections, time.monotonic() of the last close]
+        self._senders = {}
+
+    # ---------------- producer side ----------------
+
+    def publish(self, user_id:str , event:dict , replay:bool = True):
+        with self._lock:
+            if self._thread is None:
+                # set with the thread, a forked process does not inherit either
+                self.sender = uuid4().hex
+                self._thread = threading.Thread(target=self._send_loop, name="notification-bus", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((str(user_id), event, replay))
+        except queue.Full:
+            self.dropped += 1
+            print(f"Notification queue full, dropped an event of user {user_id}")
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_loop(self):
+        sock = None
+        while True:
+            batch = self._next_batch()
+            lines = []
+            for user_id, event, replay in batch:
+                self._seq += 1
+                message = {"sender": self.sender, "seq": self._seq, "user_id": user_id, "event": event, "replay": replay}
+                lines.append(json.dumps(message).encode("utf-8") + b"\n")
+            payload = b"".join(lines)
+            # the batch is sent before any later event, whatever it takes
+            while True:
+                try:
+                    if sock is None:
+                        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                        sock.connect(self.path)
+                    sock.sendall(payload)
+                    break
+                except OSError as e:
+                    print(f"Notification gateway at {self.path} not reachable: {e}")
+                    if sock is not None:
+                        sock.close()
+                        sock = None
+                    time.sleep(NOTIFY_RECONNECT_DELAY)
+
+    # ---------------- gateway side ----------------
+
+    async def _handle(self, reader, writer):
+        senders = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    print("Malformed notification " , e)
+                    continue
+                sender, seq = message.get("sender"), message.get("seq")
+                if sender is not None:
+                    entry = self._senders.setdefault(sender, [0, 0, None])
+                    if sender not in senders:
+                        senders.add(sender)
+                        entry[1] += 1
+                    # resent after a failed write, the gateway already has it
+                    if seq <= entry[0]:
+                        continue
+                    entry[0] = seq
+                self._dispatch(message["user_id"], message["event"], message.get("replay", True))
+        finally:
+            writer.close()
+            now = time.monotonic()
+            for sender in senders:
+                entry = self._senders[sender]
+                entry[1] -= 1
+                entry[2] = now
+            self._evict_senders(now)
+
+    def _evict_senders(self, now:float):
+        for sender, (_, connections, closed_at) in list(self._senders.items()):
+            if connections == 0 and now - closed_at >= self.sender_ttl:
+                del self._senders[sender]
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        print(f"Notification gateway listening on {self.path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def create_notification_bus(transport:str = NOTIFY_TRANSPORT) -> NotificationBus:
+    if transport == "unix":
+        return UnixSocketBus()
+    if transport != "memory":
+        print(f"Unknown NOTIFY_TRANSPORT {transport}, using memory")
+    return InMemoryBus()
+
+
+notification_bus = create_notification_bus()
@@ -0,0 +1,140 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+import httpx
+from dotenv import load_dotenv
+
+try:
+    import requests
+except ImportError:  # only needed to classify errors of clients built on requests
+    requests = None
+
+load_dotenv()
+
+# changable variables
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 2))  # sec
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 60))  # sec
+RETRY_BUDGET_PER_USER = int(os.getenv("RETRY_BUDGET_PER_USER", 20))  # retries per window
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", 600))  # sec
+
+# statuses worth another attempt, every other 4xx (e.g. 400 job does not exist) is final
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """Transient failure, the call may succeed when repeated."""
+
+
+class FatalError(Exception):
+    """Failure that repeating the call cannot fix."""
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error:BaseException) -> bool:
+    if isinstance(error, FatalError):
+        return False
+    if isinstance(error, RetryableError):
+        return True
+
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if requests is not None and isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return False
+
+
+class RetryBudget:
+    """At most `limit` retries per user in any `window` seconds, so one failing user cannot flood the portal or the LLM."""
+
+    def __init__(self, limit:int = RETRY_BUDGET_PER_USER , window:float = RETRY_BUDGET_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._spent = {}
+        self._lock = threading.Lock()
+
+    def spend(self, user_id:str) -> bool:
+        """Take one retry from the user's budget, False if it is used up."""
+        now = time.monotonic()
+        with self._lock:
+            spent = self._spent.setdefault(str(user_id), deque())
+            while spent and now - spent[0] > self.window:
+                spent.popleft()
+            if len(spent) >= self.limit:
+                return False
+            spent.append(now)
+            return True
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the wait before retry n is random in [0, min(max_delay, base_delay * 2^(n-1))].
+    Only errors accepted by `retry_on` are retried, and every retry of a known user is charged to `budget`.
+    """
+
+    def __init__(self, name:str , max_attempts:int = RETRY_MAX_ATTEMPTS , base_delay:float = RETRY_BASE_DELAY ,
+                 max_delay:float = RETRY_MAX_DELAY , budget:RetryBudget = None , retry_on = is_retryable):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retry_on = retry_on
+
+    def delay(self, attempt:int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _next_delay(self, error:BaseException , attempt:int , user_id , should_continue):
+        """Seconds to wait before the next attempt, None when the error has to be raised."""
+        if not self.retry_on(error) or attempt >= self.max_attempts:
+            return None
+        if should_continue is not None and not should_continue():
+            return None
+        if user_id is not None and self.budget is not None and not self.budget.spend(user_id):
+            print(f"{self.name}: retry budget of user {user_id} is used up")
+            return None
+        delay = self.delay(attempt)
+        print(f"{self.name}: attempt {attempt} failed ({error}), retry in {delay:.1f} sec")
+        return delay
+
+    async def run(self, fn, *args, user_id:str = None , should_continue = None , **kwargs):
+        """Await fn(*args, **kwargs) with retries, waiting with asyncio.sleep so the event loop keeps running."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, user_id, should_continue)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def call(self, fn, *args, user_id:str = None , should_continue = None , **kwargs):
+        """Blocking version of run, only for code that runs off the event loop (worker threads)."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, user_id, should_continue)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+
+retry_budget = RetryBudget()
+portal_retry = RetryPolicy("portal", budget=retry_budget)
+llm_retry = RetryPolicy("llm", budget=retry_budget)
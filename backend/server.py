@@ -1,21 +1,23 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request , Path, Query
 from fastapi import WebSocket , WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from typing import List, Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from filelock import FileLock
 from typing import Dict , Any
 
 import httpx
 import json
 import asyncio
+import hashlib
+import itertools
 import time
 import os
 import jwt
 import bcrypt
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from bson import ObjectId
 
 from document_loader import parser
@@ -24,7 +26,12 @@ from data_types import RegisterRequest , LoginRequest
 from jwt_token import create_token, verify_jwt_token
 from auth_handle import login_user , register_user
 from websocker_handle import websocket_manager
-from job_manager import job_manager
+from notification_bus import notification_bus
+from worker_runner import create_user_workers
+from dashboard_stats import dashboard_stats
+from job_store import job_store , APPLIED , REJECTED , PENDING , CLARIFY , HEAVY_FIELDS
+from llm_scheduler import llm_scheduler
+from http_client import portal_http
 
 # WebSocket manager for live job updates
 from fastapi import WebSocket, WebSocketDisconnect
@@ -34,7 +41,30 @@ from pydantic import BaseModel
 
 load_dotenv()
 
-app = FastAPI(title="Job Apply Agent API")
+# pipelines in this process, or the worker shards of worker_runner.py
+user_workers = create_user_workers()
+
+# this process is the websocket gateway, every published event goes to the user's sockets
+notification_bus.subscribe(lambda user_id, event, replay: websocket_manager.publish(user_id, event, replay=replay))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pooled portal connections of the server event loop live as long as the app
+    await portal_http.start()
+    # events of worker processes arrive over the bus (unix transport)
+    await notification_bus.start()
+    # in process: pick up the pipelines of users that were active before a restart, from their checkpoints.
+    # with worker shards (WORKER_SHARDS > 0) every shard resumes its own users
+    await user_workers.start()
+    yield
+    # stop the user pipelines and their worker loops
+    await user_workers.close()
+    await notification_bus.close()
+    await portal_http.close()
+
+
+app = FastAPI(title="Job Apply Agent API", lifespan=lifespan)
 
 # Allow CORS for frontend dev
 app.add_middleware(
@@ -52,6 +82,12 @@ def health():
     return {"status": "ok", "time": datetime.utcnow().isoformat()}
 
 
+@app.get("/llm/metrics")
+def llm_metrics():
+    """Queue depth, in-flight calls and wait times of the shared LLM scheduler."""
+    return llm_scheduler.metrics()
+
+
 @app.post("/parse-resumes")
 async def parse_resumes(files: List[UploadFile] = File(...)):
     """Accept multiple resume files (PDF), parse them via LLM and return extracted user data."""
@@ -121,110 +157,194 @@ async def verify_token(request: Request):
     return {"valid": True, "user_id": payload.get("user_id")}
     
 
-@app.get("/jobs/{user_id}/applied")
-def get_applied_jobs(user_id: str):
+MAX_PAGE_SIZE = 500
+
+# path names of the job states ("calrify" is the name the frontend uses)
+STATE_PATHS = {
+    "applied": APPLIED,
+    "rejected": REJECTED,
+    "pending": PENDING,
+    "clarify": CLARIFY,
+    "calrify": CLARIFY,
+}
+
+
+def parse_fields(fields: Optional[str]):
+    """None = default projection, "*" or "all" = full records, else the list of top level keys."""
+    if fields is None:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    if "*" in names or "all" in names:
+        return ["*"]
+    return names
+
+
+def project_job(job: dict, fields) -> dict:
+    if fields is None:
+        return {k: v for k, v in job.items() if k not in HEAVY_FIELDS}
+    if fields == ["*"]:
+        return job
+    return {k: job[k] for k in fields if k in job}
+
+
+def list_etag(user_id: str, state: str, version: str, *params) -> str:
+    """Weak ETag of one view of a job list: the list version plus the query parameters."""
+    digest = hashlib.sha1(json.dumps([user_id, state, version, *params]).encode("utf-8")).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def stream_job_list(request: Request, user_id: str, state: str, cursor: Optional[int] = None, limit: Optional[int] = None,
+                    fields: Optional[str] = None, format: str = "json") -> Response:
     """
-    Reads {user_id}/applied_jobs.json with a lock and returns the jobs.
+    Stream a job list record by record from the job store instead of building the whole array.
+    json:   {"jobs": [...], "next_cursor": N or null}
+    ndjson: one record per line, followed by a {"next_cursor": N} line when `limit` cut the list.
+    Without `limit` the whole list after `cursor` is returned.
+    The response carries an ETag from the list version; a matching If-None-Match gets a 304
+    without reading the list.
+    The first record is read up front so storage errors still become a 500.
     """
-    jobs_file = os.path.join(user_id, "applied_jobs.json")
-    lock_file = jobs_file + ".lock"  # create a lock file alongside the JSON
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+
+    etag = list_etag(user_id, state, job_store.version(user_id, state), cursor, limit, fields, format)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    projection = parse_fields(fields)
+    jobs = job_store.iter_after(user_id, state, cursor or 0)
+    first = next(jobs, None)
+
+    def records():
+        # (cursor, projected record) pairs, then (next cursor, None) if the page is full and more jobs follow
+        if first is None:
+            return
+        count = 0
+        last = None
+        for position, job in itertools.chain([first], jobs):
+            if limit is not None and count >= limit:
+                yield last, None
+                return
+            yield position, project_job(job, projection)
+            count += 1
+            last = position
+
+    def json_body():
+        next_cursor = None
+        yield b'{"jobs": ['
+        separator = b""
+        for position, job in records():
+            if job is None:
+                next_cursor = position
+                break
+            yield separator + json.dumps(job).encode("utf-8")
+            separator = b", "
+        yield b'], "next_cursor": ' + json.dumps(next_cursor).encode("utf-8") + b'}'
+
+    def ndjson_body():
+        for position, job in records():
+            line = {"next_cursor": position} if job is None else job
+            yield json.dumps(line).encode("utf-8") + b"\n"
+
+    if format == "ndjson":
+        return StreamingResponse(ndjson_body(), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(json_body(), media_type="application/json", headers=headers)
 
-    if not os.path.exists(jobs_file):
-        return {"jobs": []}
 
+@app.get("/jobs/{user_id}/applied")
+def get_applied_jobs(request: Request, user_id: str, cursor: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     fields: Optional[str] = None, format: str = "json"):
+    """
+    Streams the applied jobs of the user from the job store.
+    Resume, cover letter and evidence points are left out unless asked for with `fields`.
+    """
     try:
-        with FileLock(lock_file):
-            with open(jobs_file, "r") as f:
-                try:
-                    jobs = json.load(f)
-                except json.JSONDecodeError:
-                    jobs = []  # empty or invalid file -> treat as empty list
-
-        return {"jobs": jobs}
+        return stream_job_list(request, user_id, APPLIED, cursor, limit, fields, format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/jobs/{user_id}/rejected")
-def get_rejected_jobs(user_id: str):
+def get_rejected_jobs(request: Request, user_id: str, cursor: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                      fields: Optional[str] = None, format: str = "json"):
     """
-    Reads {user_id}/rejected_jobs.json with a lock and returns the jobs.
+    Streams the rejected jobs of the user from the job store.
     """
-    jobs_file = os.path.join(user_id, "rejected_jobs.json")
-    lock_file = jobs_file + ".lock"
-
-    if not os.path.exists(jobs_file):
-        return {"jobs": []}
-
     try:
-        with FileLock(lock_file):
-            with open(jobs_file, "r") as f:
-                try:
-                    jobs = json.load(f)
-                except json.JSONDecodeError:
-                    jobs = []  # empty or invalid file -> treat as empty list
-
-        return {"jobs": jobs}
+        return stream_job_list(request, user_id, REJECTED, cursor, limit, fields, format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/jobs/{user_id}/pending")
-def get_rejected_jobs(user_id: str):
+def get_pending_jobs(request: Request, user_id: str, cursor: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     fields: Optional[str] = None, format: str = "json"):
     """
-    Reads {user_id}/pending_jobs.json with a lock and returns the jobs.
+    Streams the pending jobs of the user from the job store.
     """
-    jobs_file = os.path.join(user_id, "pending_jobs.json")
-    lock_file = jobs_file + ".lock"
-
-    if not os.path.exists(jobs_file):
-        return {"jobs": []}
-
     try:
-        with FileLock(lock_file):
-            with open(jobs_file, "r") as f:
-                try:
-                    jobs = json.load(f)
-                except json.JSONDecodeError:
-                    jobs = []  # empty or invalid file -> treat as empty list
-
-        return {"jobs": jobs}
+        return stream_job_list(request, user_id, PENDING, cursor, limit, fields, format)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/jobs/{user_id}/calrify")
-def get_rejected_jobs(user_id: str):
+def get_clarify_jobs(request: Request, user_id: str, cursor: Optional[int] = Query(None, ge=0), limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     fields: Optional[str] = None, format: str = "json"):
     """
-    Reads {user_id}/clarify_jobs.json with a lock and returns the jobs.
+    Streams the jobs of the user that need clarification from the job store.
+    The clarification text is left out unless asked for with `fields`.
     """
-    jobs_file = os.path.join(user_id, "clarify_jobs.json")
-    lock_file = jobs_file + ".lock"
+    try:
+        return stream_job_list(request, user_id, CLARIFY, cursor, limit, fields, format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    if not os.path.exists(jobs_file):
-        return {"jobs": []}
 
+@app.get("/jobs/{user_id}/{state}/{job_id}")
+def get_job_detail(user_id: str, state: str, job_id: str):
+    """
+    Full record of one job, including the generated resume, cover letter, evidence points and clarification.
+    """
+    if state not in STATE_PATHS:
+        raise HTTPException(status_code=400, detail=f"Unknown job state {state}")
     try:
-        with FileLock(lock_file):
-            with open(jobs_file, "r") as f:
-                try:
-                    jobs = json.load(f)
-                except json.JSONDecodeError:
-                    jobs = []  # empty or invalid file -> treat as empty list
-
-        return {"jobs": jobs}
+        job = job_store.get(user_id, STATE_PATHS[state], job_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 @app.post("/user/{user_id}/start")
-def start_user(user_id: str):
+async def start_user(user_id: str):
     """
-    Start processing jobs for a user.
+    Start processing jobs for a user, on the worker shard that owns the user if shards are used.
+    Starting a user whose pipeline is already running does nothing.
     """
     try:
-        job_manager.add_user(user_id)
-        job_manager.start_user(user_id)
+        if not await user_workers.start_user(user_id):
+            return {"status": "success", "message": f"User {user_id} is already running."}
         return {"status": "success", "message": f"User {user_id} started."}
     except Exception as e:
         print("Error in user start api" , e)
@@ -232,12 +352,12 @@ def start_user(user_id: str):
 
 
 @app.post("/user/{user_id}/stop")
-def stop_user(user_id: str):
+async def stop_user(user_id: str):
     """
     Stop processing jobs for a user.
     """
     try:
-        job_manager.stop_user(user_id)
+        await user_workers.stop_user(user_id)
         return {"status": "success", "message": f"User {user_id} stopped."}
     except Exception as e:
         print("Error in user stop api" , e)
@@ -245,12 +365,12 @@ def stop_user(user_id: str):
 
 
 @app.get("/user/{user_id}/processing-status")
-def get_user_processing_status(user_id: str = Path(..., description="The user ID")):
+async def get_user_processing_status(user_id: str = Path(..., description="The user ID")):
     """
-    Get the processing status (is_active) for a user from job_manager.
+    Get the processing status (is_active) for a user from job_manager or its worker shard.
     """
     try:
-        is_active = job_manager.get_user_status(user_id)
+        is_active = await user_workers.get_user_status(user_id)
         return {
             "user_id": user_id,
             "is_active": is_active
@@ -266,6 +386,29 @@ def get_user_processing_status(user_id: str = Path(..., description="The user ID
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/dashboard-stats/{user_id}")
+async def get_dashboard_stats(user_id: str = Path(..., description="The user ID")):
+    """
+    Job counts per state, the latest jobs of every state, processing status and last search time
+    in one response, read from counters kept up to date by the job store.
+    """
+    try:
+        stats = await asyncio.to_thread(dashboard_stats.get, user_id)
+    except Exception as e:
+        print(f"Error getting dashboard stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        is_active = await user_workers.get_user_status(user_id)
+    except KeyError:
+        is_active = False
+    except Exception as e:
+        print(f"Error getting user processing status: {e}")
+        is_active = False
+
+    return {"user_id": user_id, "is_active": is_active, **stats}
+
+
 @app.get("/status/{user_id}")
 async def status_by_userid(user_id: str = Path(..., description="The user ID")) -> Dict[str, Any]:
     """
@@ -284,15 +427,13 @@ async def status_by_userid(user_id: str = Path(..., description="The user ID"))
 
     # Call remote /status API
     try:
-        STATUS_API_BASE_URL = os.getenv("API_BASE_URL")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{STATUS_API_BASE_URL}/status",
-                params={"user_id": user_id},
-                timeout=10.0
-            )
-            response.raise_for_status()  # raise exception if not 2xx
-            status_data = response.json()
+        response = await portal_http.get(
+            "/status",
+            params={"user_id": user_id},
+            timeout=10.0
+        )
+        response.raise_for_status()  # raise exception if not 2xx
+        status_data = response.json()
         return {
             "user_id": user_id,
             "status": status_data
@@ -310,7 +451,7 @@ async def status_by_userid(user_id: str = Path(..., description="The user ID"))
 async def submit_clarification(user_id: str, job_id: str = Query(...), decision: str = Query(...)):
     """
     Handle clarification decision: 'yes' (apply to job) or 'no' (move to rejected).
-    Remove job from clarify_jobs.json after processing.
+    The job leaves the clarify list in the same transaction that stores it as applied or rejected.
     Query params: job_id, decision (yes/no)
     """
     if decision not in ["yes", "no"]:
@@ -320,39 +461,9 @@ async def submit_clarification(user_id: str, job_id: str = Query(...), decision:
         from job_manager import job_retry_worker
         from data_types import User
         
-        user_dir = f"./{user_id}"
-        os.makedirs(user_dir, exist_ok=True)
-        
-        clarify_file = os.path.join(user_dir, "clarify_jobs.json")
-        rejected_file = os.path.join(user_dir, "rejected_jobs.json")
-        
-        clarify_lock_path = clarify_file + ".lock"
-        rejected_lock_path = rejected_file + ".lock"
-        
-        # Read clarify jobs with lock
-        clarify_lock = FileLock(clarify_lock_path, timeout=10)
-        job_to_process = None
-        clarify_jobs = []
-        
-        with clarify_lock:
-            if os.path.exists(clarify_file):
-                with open(clarify_file, "r") as f:
-                    try:
-                        clarify_jobs = json.load(f)
-                    except json.JSONDecodeError:
-                        clarify_jobs = []
-            
-            # Find and extract job by id
-            for job in clarify_jobs:
-                if str(job.get("id")) == str(job_id):
-                    job_to_process = job
-                    break
-            
-            if not job_to_process:
-                raise HTTPException(status_code=404, detail=f"Job {job_id} not found in clarify list")
-            
-            # Remove from clarify list (we'll update after processing)
-            clarify_jobs_updated = [j for j in clarify_jobs if str(j.get("id")) != str(job_id)]
+        job_to_process = job_store.get(user_id, CLARIFY, job_id)
+        if not job_to_process:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found in clarify list")
         
         # If decision is "yes", apply to the job using job_retry_worker
         if decision == "yes":
@@ -365,13 +476,11 @@ async def submit_clarification(user_id: str, job_id: str = Query(...), decision:
             user = User(user_id)
             user.is_active = True
             
-            # Call job_retry_worker to handle application with retry logic
-            await job_retry_worker(user, job_to_process, user_data=user_data)
-            
-            # After successful application, remove from clarify_jobs.json
-            with clarify_lock:
-                with open(clarify_file, "w") as f:
-                    json.dump(clarify_jobs_updated, f, indent=4)
+            # Call job_retry_worker to handle application with retry logic,
+            # on success it moves the job from clarify to applied
+            applied = await job_retry_worker(user, job_to_process, user_data=user_data, from_state=CLARIFY)
+            if not applied:
+                raise HTTPException(status_code=502, detail=f"Failed to apply to job {job_id}")
             
             return {
                 "status": "success",
@@ -383,30 +492,8 @@ async def submit_clarification(user_id: str, job_id: str = Query(...), decision:
         
         # If decision is "no", move to rejected
         else:
-            rejected_lock = FileLock(rejected_lock_path, timeout=10)
-            
-            with rejected_lock:
-                # Read existing rejected jobs
-                if os.path.exists(rejected_file):
-                    with open(rejected_file, "r") as f:
-                        try:
-                            rejected_jobs = json.load(f)
-                        except json.JSONDecodeError:
-                            rejected_jobs = []
-                else:
-                    rejected_jobs = []
-                
-                # Append the job
-                rejected_jobs.append(job_to_process)
-                
-                # Write back
-                with open(rejected_file, "w") as f:
-                    json.dump(rejected_jobs, f, indent=4)
-            
-            # Remove from clarify_jobs.json
-            with clarify_lock:
-                with open(clarify_file, "w") as f:
-                    json.dump(clarify_jobs_updated, f, indent=4)
+            if not job_store.move(user_id, job_id, CLARIFY, REJECTED):
+                raise HTTPException(status_code=404, detail=f"Job {job_id} not found in clarify list")
             
             return {
                 "status": "success",
@@ -424,8 +511,12 @@ async def submit_clarification(user_id: str, job_id: str = Query(...), decision:
 
 
 @app.websocket("/ws/{user_id}")
-async def websocket_connection(websocket: WebSocket, user_id: str):
-    await websocket_manager.connect(user_id, websocket)
+async def websocket_connection(websocket: WebSocket, user_id: str, last_event_id: Optional[int] = None):
+    """
+    Notification socket of a user, a user may have several (one per tab).
+    A client that reconnects passes the last event_id it received and gets the events it missed.
+    """
+    connection = await websocket_manager.connect(user_id, websocket, last_event_id=last_event_id)
     
     try:
         while True:
@@ -458,7 +549,8 @@ async def websocket_connection(websocket: WebSocket, user_id: str):
             
     except WebSocketDisconnect as e:
         print(e)
-        websocket_manager.disconnect(user_id)
+    finally:
+        websocket_manager.disconnect(user_id, connection)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# the backend modules read their settings and create their singletons on import
+TEST_DIR = tempfile.mkdtemp(prefix="job_apply_tests_")
+os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "test")
+os.environ.setdefault("API_BASE_URL", "http://127.0.0.1:5000")
+os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:1")
+os.environ["CHECKPOINT_PATH"] = os.path.join(TEST_DIR, "checkpoints.db")
+os.environ["JOB_STORE_PATH"] = os.path.join(TEST_DIR, "job_store.db")
+os.environ["JOB_LOG_DIR"] = os.path.join(TEST_DIR, "jobs")
+os.environ["LEGACY_JOBS_DIR"] = os.path.join(TEST_DIR, "legacy")
+os.environ["LLM_CACHE_PATH"] = os.path.join(TEST_DIR, "llm_cache.db")
+os.environ["NOTIFY_TRANSPORT"] = "memory"
+os.environ["WORKER_SHARDS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import job_manager
+from checkpoints import CheckpointStore, SEARCHED, SCORED, DOCUMENTS
+from data_types import User
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.db"))
+
+
+def test_checkpoints_only_move_forward(store):
+    store.save("u1", SCORED, [{"id": "a"}])
+    store.save("u1", SEARCHED, [{"id": "a", "title": "older"}])
+    assert store.get("u1", "a")["stage"] == SCORED
+
+    store.advance("u1", "a", DOCUMENTS)
+    store.advance("u1", "a", SCORED)
+    assert store.get("u1", "a")["stage"] == DOCUMENTS
+
+
+def test_load_returns_furthest_stage_first(store):
+    store.save("u1", SEARCHED, [{"id": "a"}, {"id": "b"}])
+    store.save("u1", SCORED, [{"id": "b"}])
+    store.save("u2", SCORED, [{"id": "c"}])
+    assert [(c["job_id"], c["stage"]) for c in store.load("u1")] == [("b", SCORED), ("a", SEARCHED)]
+
+    store.clear("u1", ["a", "b"])
+    assert store.load("u1") == []
+    assert len(store.load("u2")) == 1
+
+
+def test_checkpoints_survive_a_restart(store):
+    store.save("u1", DOCUMENTS, [{"id": "a"}], from_state="pending", documents={"resume": "r"})
+    store.set_active("u1", True)
+
+    reopened = CheckpointStore(store.path)
+    saved = reopened.get("u1", "a")
+    assert saved["documents"] == {"resume": "r"} and saved["from_state"] == "pending"
+    assert reopened.active_users() == ["u1"]
+
+
+def _run_worker(monkeypatch, store, searched, keep, parked=()):
+    """One cycle of user_worker, the portal and the LLM steps replaced. Returns whether it searched and what it prefiltered."""
+    calls = {"searched": False, "prefiltered": []}
+
+    async def find_jobs(user, user_data=None):
+        calls["searched"] = True
+        store.save(user.user_id, SEARCHED, searched)
+        return searched
+
+    async def prefilter_jobs(user, jobs, user_data=None):
+        calls["prefiltered"] = [job["id"] for job in jobs]
+        return [job for job in jobs if job["id"] != "cheap"]
+
+    async def prerank_jobs(user, jobs, user_data=None):
+        return jobs[:2]
+
+    async def separate_and_rank_jobs(user, jobs, user_data=None):
+        return [job for job in jobs if job["id"] in keep]
+
+    async def job_retry_worker(user, job, user_data):
+        store.clear(user.user_id, [job["id"]])
+
+    monkeypatch.setattr(job_manager, "checkpoints", store)
+    monkeypatch.setattr(job_manager.db, "get_user_profile", lambda user_id: {"full_name": "Test"})
+    monkeypatch.setattr(job_manager, "find_jobs", find_jobs)
+    monkeypatch.setattr(job_manager, "prefilter_jobs", prefilter_jobs)
+    monkeypatch.setattr(job_manager, "prerank_jobs", prerank_jobs)
+    monkeypatch.setattr(job_manager, "separate_and_rank_jobs", separate_and_rank_jobs)
+    monkeypatch.setattr(job_manager, "job_retry_worker", job_retry_worker)
+    monkeypatch.setattr(job_manager.job_store, "list", lambda user_id, state: [])
+    monkeypatch.setattr(job_manager.job_store, "pop", lambda user_id, state, n: [dict(job) for job in parked][:n])
+
+    user = User("u1")
+    user.is_active = True
+    asyncio.run(job_manager.user_worker(user))
+    return calls
+
+
+def test_dropped_jobs_do_not_stay_checkpointed(monkeypatch, store):
+    searched = [{"id": "cheap"}, {"id": "a"}, {"id": "b"}, {"id": "overflow"}]
+    assert _run_worker(monkeypatch, store, searched, keep={"a"})["searched"]
+    # rejected by the prefilter, cut by the prerank limit or by scoring: nothing is left to resume
+    assert store.load("u1") == []
+    # so the next start searches again
+    assert _run_worker(monkeypatch, store, searched, keep=set())["searched"]
+
+
+def test_pending_jobs_are_ranked_again(monkeypatch, store):
+    searched = [{"id": "a"}, {"id": "b"}]
+    calls = _run_worker(monkeypatch, store, searched, keep=set(), parked=[{"id": "b"}, {"id": "parked"}])
+    assert calls["prefiltered"] == ["a", "b", "parked"]
+    assert store.load("u1") == []
+
+
+def test_resume_skips_the_search(monkeypatch, store):
+    store.save("u1", SCORED, [{"id": "a"}])
+    assert not _run_worker(monkeypatch, store, [{"id": "b"}], keep=set())["searched"]
+    assert store.load("u1") == []
+
+
+def test_finished_pipeline_is_not_resumed(monkeypatch, store):
+    async def finished(user):
+        pass
+
+    async def stopped(user):
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(job_manager, "checkpoints", store)
+    store.set_active("u1", True)
+    store.set_active("u2", True)
+    monkeypatch.setattr(job_manager, "user_worker", finished)
+    asyncio.run(job_manager.run_user_worker(User("u1")))
+    # the process shuts down while u2's pipeline runs
+    monkeypatch.setattr(job_manager, "user_worker", stopped)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(job_manager.run_user_worker(User("u2")))
+    assert store.active_users() == ["u2"]
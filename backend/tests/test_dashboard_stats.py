@@ -0,0 +1,21 @@
+from checkpoints import CheckpointStore
+from dashboard_stats import DashboardStats
+from job_store import SQLiteJobStore, PENDING
+
+
+def test_users_are_bounded_and_read_again_after_eviction(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path))
+    stats = DashboardStats(store, progress=CheckpointStore(str(tmp_path / "checkpoints.db")), max_users=2)
+
+    store.append("u1", PENDING, [{"id": "a"}])
+    assert stats.get("u1")["counts"][PENDING] == 1
+    stats.get("u2")
+    stats.get("u1")
+    stats.get("u3")
+    assert list(stats._users) == ["u1", "u3"]
+
+    # u2 misses the events while evicted, its numbers come from the store
+    store.append("u2", PENDING, [{"id": "b"}, {"id": "c"}])
+    assert stats.get("u2")["counts"][PENDING] == 2
+    assert stats.get("u2")["recent"][PENDING] == [{"id": "c"}, {"id": "b"}]
+    assert len(stats._users) == 2
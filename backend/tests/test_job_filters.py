@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+import job_filters
+from data_types import User
+
+
+def test_hard_constraints_use_profile_fields():
+    jobs = [
+        {"id": "low", "salary_offered": 40000, "is_remote": True},
+        {"id": "onsite", "salary_offered": 90000, "is_onsite": True},
+        {"id": "no-visa", "is_remote": True, "visa_sponsorship_offered": False},
+        {"id": "ok", "company": "facebook", "is_remote": True},
+    ]
+    profile = {"minimumSalary": "50,000", "workMode": ["Remote"], "sponsorshipRequirement": "yes_now"}
+    reasons = job_filters.hard_constraint_mismatches(jobs, profile)
+    assert [bool(r) for r in reasons] == [True, True, True, False]
+
+
+def test_rejections_are_stored_off_the_event_loop(monkeypatch):
+    stored = []
+    monkeypatch.setattr(job_filters.job_store, "append", lambda user_id, state, jobs: stored.append(threading.current_thread()))
+    monkeypatch.setattr(job_filters.notification_bus, "publish", lambda user_id, data: None)
+
+    kept = asyncio.run(job_filters.prefilter_jobs(User("u1"), [{"id": "a", "salary_offered": 1}, {"id": "b"}],
+                                                  user_data={"minimumSalary": "10"}))
+    assert [job["id"] for job in kept] == ["b"]
+    assert stored and stored[0] is not threading.main_thread()
@@ -0,0 +1,222 @@
+import threading
+
+import pytest
+
+from job_store import SQLiteJobStore, JsonlJobStore, CachedJobStore, APPLIED, PENDING, CLARIFY
+
+
+def _sqlite(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path / "legacy"))
+
+
+def _jsonl(tmp_path):
+    return JsonlJobStore(str(tmp_path / "logs"), legacy_dir=str(tmp_path / "legacy"), compact_min_lines=4)
+
+
+def _cached(tmp_path):
+    return CachedJobStore(_sqlite(tmp_path), watch_interval=0)
+
+
+@pytest.fixture(params=[_sqlite, _jsonl, _cached], ids=["sqlite", "jsonl", "cached"])
+def store(request, tmp_path):
+    return request.param(tmp_path)
+
+
+def _ids(store, state):
+    return [job["id"] for job in store.list("u1", state)]
+
+
+def _ids_of(store, user_id):
+    return [job["id"] for job in store.list(user_id, PENDING)]
+
+
+def test_append_replaces_the_same_id(store):
+    assert store.append("u1", PENDING, [{"id": "a"}, {"id": "b"}]) == 2
+    store.append("u1", PENDING, [{"id": "a", "title": "again"}])
+    assert _ids(store, PENDING) == ["b", "a"]
+    assert store.get("u1", PENDING, "a")["title"] == "again"
+    assert store.count("u1", PENDING) == 2
+
+
+def test_update_keeps_the_position(store):
+    store.append("u1", CLARIFY, [{"id": "a"}, {"id": "b"}])
+    cursors = [cursor for cursor, _ in store.iter_after("u1", CLARIFY)]
+
+    assert store.update("u1", CLARIFY, {"id": "a", "clarification": "text"})
+    assert [cursor for cursor, _ in store.iter_after("u1", CLARIFY)] == cursors
+    assert _ids(store, CLARIFY) == ["a", "b"]
+    assert store.get("u1", CLARIFY, "a")["clarification"] == "text"
+    assert not store.update("u1", CLARIFY, {"id": "missing"})
+
+
+def test_move_pop_and_remove(store):
+    store.append("u1", PENDING, [{"id": "a"}, {"id": "b"}, {"id": "c"}])
+    version = store.version("u1", PENDING)
+
+    assert store.move("u1", "b", PENDING, APPLIED, data={"job_id": "b", "name": "x"})
+    assert not store.move("u1", "b", PENDING, APPLIED)
+    assert store.get("u1", APPLIED, "b")["name"] == "x"
+    assert store.version("u1", PENDING) != version
+
+    assert store.pop("u1", PENDING, 1) == [{"id": "a"}]
+    assert store.remove("u1", PENDING, "c")
+    assert not store.remove("u1", PENDING, "c")
+    assert store.count("u1", PENDING) == 0
+
+
+def test_move_within_a_list_goes_to_the_end(store):
+    store.append("u1", PENDING, [{"id": "a"}, {"id": "b"}])
+    assert store.move("u1", "a", PENDING, PENDING, data={"id": "a", "title": "new"})
+    assert _ids(store, PENDING) == ["b", "a"]
+    assert store.get("u1", PENDING, "a") == {"id": "a", "title": "new"}
+    assert store.count("u1", PENDING) == 2
+
+
+def test_pages_follow_the_cursor(store):
+    store.append("u1", PENDING, [{"id": str(i)} for i in range(5)])
+    page, cursor = store.page("u1", PENDING, limit=2)
+    assert [job["id"] for job in page] == ["0", "1"]
+
+    # a change before the cursor does not shift the next page
+    store.remove("u1", PENDING, "0")
+    page, cursor = store.page("u1", PENDING, after=cursor, limit=2)
+    assert [job["id"] for job in page] == ["2", "3"]
+    page, cursor = store.page("u1", PENDING, after=cursor, limit=2)
+    assert [job["id"] for job in page] == ["4"] and cursor is None
+
+
+def test_jsonl_compaction_keeps_cursors(tmp_path):
+    store = _jsonl(tmp_path)
+    store.append("u1", PENDING, [{"id": str(i)} for i in range(4)])
+    store.update("u1", PENDING, {"id": "0", "title": "new"})
+    for i in range(1, 4):
+        store.remove("u1", PENDING, str(i))
+    before = list(store.iter_after("u1", PENDING))
+
+    store.compact(store._path("u1", PENDING))
+    assert list(store.iter_after("u1", PENDING)) == before == [(1, {"id": "0", "title": "new"})]
+
+
+def test_jsonl_instances_share_a_log(tmp_path):
+    first = _jsonl(tmp_path)
+    second = _jsonl(tmp_path)
+    first.append("u1", PENDING, [{"id": "a"}])
+    assert first.count("u1", PENDING) == 1
+
+    # written by the other instance (another process)
+    second.append("u1", PENDING, [{"id": "b"}])
+    assert first.move("u1", "b", PENDING, APPLIED)
+
+    first.append("u1", PENDING, [{"id": "c"}])
+    second.append("u1", PENDING, [{"id": "d"}])
+    cursors = [cursor for cursor, _ in first.iter_after("u1", PENDING)]
+    assert len(set(cursors)) == len(cursors) == 3
+    assert [job["id"] for job in second.list("u1", PENDING)] == ["a", "c", "d"]
+
+    # a compaction by one instance replaces the file under the other
+    for job_id in ("a", "c"):
+        second.remove("u1", PENDING, job_id)
+    second.compact(second._path("u1", PENDING))
+    assert first.count("u1", PENDING) == 1
+    first.append("u1", PENDING, [{"id": "e"}])
+    assert [job["id"] for job in second.list("u1", PENDING)] == ["d", "e"]
+
+
+def test_jsonl_skips_a_torn_last_line(tmp_path):
+    store = _jsonl(tmp_path)
+    store.append("u1", PENDING, [{"id": "a"}])
+    # a writer crashed in the middle of a record, its header still parses
+    with open(store._path("u1", PENDING), "ab") as f:
+        f.write(store._put_line("b", {"id": "b", "title": "cut"}, 2)[:-12])
+
+    assert _ids(store, PENDING) == ["a"]
+    assert store.get("u1", PENDING, "b") is None
+
+
+def test_cache_follows_backend_writes(tmp_path):
+    store = _cached(tmp_path)
+    events = []
+    store.add_listener(lambda *event: events.append(event))
+
+    store.append("u1", PENDING, [{"id": "a"}])
+    assert _ids(store, PENDING) == ["a"]
+    store.append("u1", PENDING, [{"id": "b"}])
+    assert _ids(store, PENDING) == ["a", "b"]
+    assert store.hits >= 1
+    assert [event[1] for event in events] == [PENDING, PENDING]
+
+
+def test_cache_version_does_not_load_the_list(tmp_path):
+    backend = _sqlite(tmp_path)
+    store = CachedJobStore(backend, watch_interval=0)
+    backend.append("u1", PENDING, [{"id": "a"}])
+
+    version = store.version("u1", PENDING)
+    assert version == backend.version("u1", PENDING)
+    assert store.misses == 0 and not store._users
+
+    store.list("u1", PENDING)
+    store.append("u1", PENDING, [{"id": "b"}])
+    assert store.version("u1", PENDING) == backend.version("u1", PENDING) != version
+
+
+class _SlowBackend(SQLiteJobStore):
+    """Blocks the load of one user's lists until released, after an optional write."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slow_user = None
+        self.loading = threading.Event()
+        self.release = threading.Event()
+        self.during_load = None
+
+    def iter_after(self, user_id, state, after=0):
+        if user_id == self.slow_user:
+            self.loading.set()
+            records = list(super().iter_after(user_id, state, after))
+            if self.during_load:
+                self.during_load()
+                self.during_load = None
+            self.release.wait(5)
+            return iter(records)
+        return super().iter_after(user_id, state, after)
+
+
+def test_cold_load_does_not_block_other_users(tmp_path):
+    backend = _SlowBackend(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path))
+    store = CachedJobStore(backend, watch_interval=0)
+    backend.append("slow", PENDING, [{"id": "a"}])
+    backend.append("u2", PENDING, [{"id": "b"}])
+    backend.slow_user = "slow"
+
+    results = {}
+    readers = [threading.Thread(target=lambda i=i: results.setdefault(i, store.list("slow", PENDING))) for i in range(2)]
+    for reader in readers:
+        reader.start()
+    assert backend.loading.wait(5)
+    # the other user's reads and writes go on while the slow list loads
+    other = threading.Thread(target=lambda: (store.list("u2", PENDING), store.append("u2", PENDING, [{"id": "c"}])))
+    other.start()
+    other.join(2)
+    finished = not other.is_alive()
+    backend.release.set()
+    assert finished
+    assert _ids_of(store, "u2") == ["b", "c"]
+    for reader in readers:
+        reader.join(5)
+    assert results == {0: [{"id": "a"}], 1: [{"id": "a"}]}
+    assert store.misses == 2
+
+
+def test_write_during_a_load_is_not_lost(tmp_path):
+    backend = _SlowBackend(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path))
+    store = CachedJobStore(backend, watch_interval=0)
+    backend.append("u1", PENDING, [{"id": "a"}])
+    backend.slow_user = "u1"
+    backend.release.set()
+    # committed after the list was read, before it is cached
+    backend.during_load = lambda: backend.append("u1", PENDING, [{"id": "b"}])
+
+    store.list("u1", PENDING)
+    assert _ids(store, PENDING) == ["a", "b"]
+    assert store.version("u1", PENDING) == backend.version("u1", PENDING)
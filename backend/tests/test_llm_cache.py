@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_cache import LLMResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(str(tmp_path / "llm_cache.db"))
+
+
+def test_cached_response_skips_the_call(cache):
+    calls = []
+    assert cache.get_or_call("k", lambda: calls.append(1) or "answer") == "answer"
+    assert cache.get_or_call("k", lambda: calls.append(1) or "other") == "answer"
+    assert calls == [1]
+
+
+def test_invalid_response_is_not_cached(cache):
+    cache.get_or_call("k", lambda: "", validate=bool)
+    assert cache.get("k") is None
+
+
+def test_concurrent_callers_share_one_call(cache):
+    calls = []
+    started = threading.Event()
+
+    def call():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_call("k", call))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == ["answer"] * 5
+    assert calls == [1]
+
+
+def test_interrupted_leader_does_not_hang_followers(cache):
+    leading = threading.Event()
+    joined = threading.Event()
+
+    def interrupted():
+        leading.set()
+        joined.wait(5)
+        raise KeyboardInterrupt
+
+    def leader():
+        with pytest.raises(KeyboardInterrupt):
+            cache.get_or_call("k", interrupted)
+
+    result = []
+    t = threading.Thread(target=leader, daemon=True)
+    t.start()
+    leading.wait(5)
+    follower = threading.Thread(target=lambda: result.append(cache.get_or_call("k", lambda: "answer")), daemon=True)
+    follower.start()
+    # let the follower join the in-flight call
+    time.sleep(0.1)
+    joined.set()
+    t.join(5)
+    follower.join(5)
+    assert not follower.is_alive()
+    assert result == ["answer"]
+
+
+def test_cancelled_async_leader_does_not_cancel_followers(cache):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.aget_or_call("k", call))
+        while "k" not in cache._inflight:
+            await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.aget_or_call("k", call))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        assert await follower == "answer"
+        assert leader.cancelled()
+
+    asyncio.run(main())
+    assert calls == [1]
+    assert cache.get("k") == "answer"
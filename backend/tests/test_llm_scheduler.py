@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, PRIORITY_APPLICATION, PRIORITY_BACKGROUND
+
+
+def test_queued_requests_run_by_priority():
+    scheduler = LLMScheduler(max_concurrency=1, rate_per_sec=0)
+    gate = threading.Event()
+    order = []
+
+    blocker = scheduler.submit(gate.wait, 5)
+    while not scheduler.metrics()["in_flight"]:
+        time.sleep(0.01)
+    futures = [scheduler.submit(order.append, name, priority=priority) for name, priority in
+               [("background", PRIORITY_BACKGROUND), ("application", PRIORITY_APPLICATION),
+                ("interactive", PRIORITY_INTERACTIVE), ("background-2", PRIORITY_BACKGROUND)]]
+    gate.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    assert order == ["interactive", "application", "background", "background-2"]
+
+
+def test_concurrency_cap_and_errors():
+    scheduler = LLMScheduler(max_concurrency=2, rate_per_sec=0)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    for future in [scheduler.submit(call) for _ in range(8)]:
+        future.result(5)
+    assert max(peak) == 2
+
+    with pytest.raises(ZeroDivisionError):
+        scheduler.submit(lambda: 1 / 0).result(5)
+    metrics = scheduler.metrics()
+    assert metrics["failed"] == 1
+    assert metrics["completed"] == 8
+    assert metrics["in_flight"] == 0
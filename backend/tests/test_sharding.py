@@ -0,0 +1,119 @@
+import asyncio
+import json
+import socket
+
+import notification_bus
+import worker_runner
+from checkpoints import CheckpointStore
+from dashboard_stats import DashboardStats
+from job_store import SQLiteJobStore, CachedJobStore, PENDING, APPLIED
+from worker_runner import HashRing
+
+
+def test_ring_is_stable_and_balanced():
+    ring = HashRing(4)
+    users = [f"user-{i}" for i in range(4000)]
+    owners = [ring.owner(user) for user in users]
+    again = HashRing(4)
+    assert owners == [again.owner(user) for user in users]
+
+    counts = [owners.count(shard) for shard in range(4)]
+    assert min(counts) > 0.7 * len(users) / 4
+
+    # a fifth shard only takes users over, nobody moves between the old shards
+    grown = HashRing(5)
+    moved = [user for user, owner in zip(users, owners) if grown.owner(user) != owner]
+    assert all(grown.owner(user) == 4 for user in moved)
+    assert len(moved) < 0.35 * len(users)
+
+
+def test_shards_publish_over_the_unix_bus(monkeypatch):
+    monkeypatch.setattr(notification_bus, "notification_bus", notification_bus.InMemoryBus())
+    assert isinstance(worker_runner._use_unix_bus(), notification_bus.UnixSocketBus)
+    assert isinstance(notification_bus.notification_bus, notification_bus.UnixSocketBus)
+
+
+def test_gateway_drops_events_resent_after_a_failed_write(tmp_path):
+    gateway = notification_bus.UnixSocketBus(str(tmp_path / "notify.sock"))
+    received = []
+    gateway.subscribe(lambda user_id, event, replay: received.append(event["n"]))
+
+    def line(seq):
+        return json.dumps({"sender": "shard-1", "seq": seq, "user_id": "u1", "event": {"n": seq}}).encode() + b"\n"
+
+    def send(payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(gateway.path)
+            sock.sendall(payload)
+
+    async def main():
+        await gateway.start()
+        # the connection breaks in the middle of the third event, the sender writes the batch again
+        await asyncio.to_thread(send, line(1) + line(2) + line(3)[:10])
+        await asyncio.to_thread(send, line(1) + line(2) + line(3))
+        producer = notification_bus.UnixSocketBus(gateway.path)
+        producer.publish("u1", {"n": 4})
+        for _ in range(200):
+            if len(received) >= 4:
+                break
+            await asyncio.sleep(0.01)
+        await gateway.close()
+
+    asyncio.run(main())
+    assert received == [1, 2, 3, 4]
+
+
+def test_gateway_forgets_disconnected_senders(tmp_path):
+    gateway = notification_bus.UnixSocketBus(str(tmp_path / "notify.sock"), sender_ttl=0.05)
+    gateway.subscribe(lambda user_id, event, replay: None)
+
+    def send(sender):
+        message = {"sender": sender, "seq": 1, "user_id": "u1", "event": {}}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(gateway.path)
+            sock.sendall(json.dumps(message).encode() + b"\n")
+
+    async def wait_for(condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await gateway.start()
+        await asyncio.to_thread(send, "old-shard")
+        await wait_for(lambda: "old-shard" in gateway._senders and gateway._senders["old-shard"][1] == 0)
+        # still known right after the close, a resend is dropped
+        assert "old-shard" in gateway._senders
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(send, "new-shard")
+        await wait_for(lambda: "old-shard" not in gateway._senders)
+        await gateway.close()
+
+    asyncio.run(main())
+    assert list(gateway._senders) == ["new-shard"]
+
+
+def test_dashboard_sees_writes_of_other_processes(tmp_path):
+    progress = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    api_store = CachedJobStore(SQLiteJobStore(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path)), watch_interval=0)
+    shard_store = SQLiteJobStore(str(tmp_path / "jobs.db"), legacy_dir=str(tmp_path))
+    stats = DashboardStats(api_store, recent=2, progress=progress)
+
+    assert stats.get("u1")["counts"]["total"] == 0
+    assert stats.get("u1")["last_search_at"] is None
+
+    # the shard process writes and searches
+    shard_store.append("u1", PENDING, [{"id": "a"}, {"id": "b"}])
+    shard_store.move("u1", "a", PENDING, APPLIED)
+    DashboardStats(shard_store, progress=progress).record_search("u1")
+
+    api_store.check_versions()
+    result = stats.get("u1")
+    assert result["counts"][PENDING] == 1 and result["counts"][APPLIED] == 1
+    assert [job["id"] for job in result["recent"][PENDING]] == ["b"]
+    assert result["last_search_at"] is not None
+
+    # the API's own writes still patch the numbers through the change events
+    api_store.append("u1", PENDING, [{"id": "c"}])
+    assert stats.get("u1")["counts"][PENDING] == 2
@@ -0,0 +1,24 @@
+import time
+
+from websocker_handle import WebSocket_Connection_Manager
+
+
+def test_idle_buffers_of_disconnected_users_are_dropped():
+    manager = WebSocket_Connection_Manager(replay_idle=0.05)
+    manager.publish("gone", {"type": "status"})
+    manager.publish("connected", {"type": "status"})
+    # a user with an open socket keeps its buffer (no connection object needed, nothing is sent to it)
+    manager.active_connections["connected"] = []
+    time.sleep(0.1)
+
+    manager.publish("new", {"type": "status"})
+    assert set(manager._recent) == {"connected", "new"}
+    assert set(manager._active_at) == {"connected", "new"}
+
+
+def test_buffers_are_capped_least_recently_active_first():
+    manager = WebSocket_Connection_Manager(replay_max_users=2)
+    for user_id in ("a", "b", "a", "c"):
+        manager.publish(user_id, {"type": "status"})
+    assert list(manager._recent) == ["a", "c"]
+    assert len(manager._recent["a"]) == 2
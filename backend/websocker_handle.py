@@ -1,30 +1,183 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque, OrderedDict
 from fastapi import WebSocket
-from typing import Dict
+from typing import Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# changable variables
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))  # frames waiting per connection
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", 100))  # recent events kept per user for reconnects
+WS_REPLAY_IDLE = float(os.getenv("WS_REPLAY_IDLE", 600))  # sec, the buffer of a user without sockets and events is dropped
+WS_REPLAY_MAX_USERS = int(os.getenv("WS_REPLAY_MAX_USERS", 10000))  # users with a buffer, the least recently active go first
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 10))  # sec, a single send taking longer drops the connection
+
+# close code for a client that does not keep up (1013: try again later), it reconnects with its last_event_id
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class _Connection:
+    """One socket with its bounded send queue, drained by a task on the socket's event loop."""
+
+    def __init__(self, user_id: str, websocket: WebSocket, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self.task = None
+
+    def offer(self, frame: dict) -> bool:
+        """Queue a frame, False when the queue is full (runs on the connection's loop)."""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
 
 class WebSocket_Connection_Manager:
-    def __init__(self):
-        # Map user_id (str) -> WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
+    """
+    Every socket of a user (one per browser tab) receives the user's events.
+    Sending never waits on a socket: frames go to a bounded queue per connection that its own task drains.
+    A connection whose queue is full is a slow consumer and gets closed (SLOW_CONSUMER_CLOSE_CODE),
+    the client reconnects with the last event id it saw and the missed events are replayed
+    from the user's ring buffer of recent events. The buffer of a user without sockets is dropped
+    after WS_REPLAY_IDLE seconds without events, and at most WS_REPLAY_MAX_USERS buffers are kept.
+    """
 
-    async def connect(self, user_id: str, websocket: WebSocket):
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, replay_size: int = WS_REPLAY_BUFFER,
+                 replay_idle: float = WS_REPLAY_IDLE, replay_max_users: int = WS_REPLAY_MAX_USERS):
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self.replay_idle = replay_idle
+        self.replay_max_users = max(1, replay_max_users)
+        # Map user_id (str) -> connections of the user
+        self.active_connections: Dict[str, List[_Connection]] = {}
+        # user_id -> recent events (newest last), least recently active user first
+        self._recent: "OrderedDict[str, deque]" = OrderedDict()
+        # user_id -> time.monotonic() of the last event or connection of a user with a buffer
+        self._active_at: Dict[str, float] = {}
+        # ids keep growing across restarts, so a client's last_event_id never skips new events
+        self._event_ids = itertools.count(int(time.time() * 1000))
+        self._lock = threading.Lock()
+
+    async def connect(self, user_id: str, websocket: WebSocket, last_event_id: int = None):
         await websocket.accept()
         print(f"Websocket from user {user_id} is accepted")
-        self.active_connections[user_id] = websocket
+        connection = _Connection(user_id, websocket, self.queue_size)
+
+        with self._lock:
+            # replay before new events can reach the queue, so the order holds
+            if last_event_id is not None:
+                for event in self._recent.get(user_id, ()):
+                    if event["event_id"] > last_event_id:
+                        connection.offer(event)
+            self.active_connections.setdefault(user_id, []).append(connection)
+            self._touch(user_id)
 
-    def disconnect(self, user_id: str):
+        connection.task = asyncio.create_task(self._drain(connection))
+        return connection
+
+    def disconnect(self, user_id: str, connection: _Connection = None):
+        """Drop one connection of the user, or all of them without `connection`."""
         print(f"user {user_id} is disconnected")
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+        with self._lock:
+            connections = self.active_connections.get(user_id, [])
+            removed = [c for c in connections if connection is None or c is connection]
+            remaining = [c for c in connections if not (connection is None or c is connection)]
+            if remaining:
+                self.active_connections[user_id] = remaining
+            else:
+                self.active_connections.pop(user_id, None)
+                # the replay window of the user starts now
+                self._touch(user_id)
+            self._evict_recent()
+
+        for c in removed:
+            c.closed = True
+            if c.task is not None and c.task is not asyncio.current_task():
+                c.loop.call_soon_threadsafe(c.task.cancel)
+
+    def _touch(self, user_id: str):
+        # under the lock, only users with a buffer are tracked
+        if user_id in self._recent:
+            self._active_at[user_id] = time.monotonic()
+            self._recent.move_to_end(user_id)
+
+    def _evict_recent(self):
+        """Drop the buffers of idle users without sockets, and the least recently active ones over the cap (under the lock)."""
+        now = time.monotonic()
+        # every user is looked at once at most, connected ones move to the back
+        for _ in range(len(self._recent)):
+            user_id = next(iter(self._recent))
+            if now - self._active_at.get(user_id, 0) < self.replay_idle:
+                break
+            if user_id in self.active_connections:
+                # still connected, it keeps its buffer for a reconnect
+                self._touch(user_id)
+                continue
+            self._recent.pop(user_id)
+            self._active_at.pop(user_id, None)
+        while len(self._recent) > self.replay_max_users:
+            user_id, _ = self._recent.popitem(last=False)
+            self._active_at.pop(user_id, None)
+
+    async def _drain(self, connection: _Connection):
+        try:
+            while True:
+                frame = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_json(frame), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # If the socket is closed or stuck, remove it from active connections
+            self.disconnect(connection.user_id, connection)
 
-    async def send_personal_message(self, user_id: str, data: dict):
+    def _deliver(self, connection: _Connection, frame: dict):
+        # runs on the connection's loop
+        if not connection.offer(frame):
+            print(f"Slow websocket consumer of user {connection.user_id}, closing it")
+            self.disconnect(connection.user_id, connection)
+            asyncio.ensure_future(self._close(connection))
+
+    async def _close(self, connection: _Connection):
+        try:
+            await connection.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def publish(self, user_id: str, data: dict, replay: bool = True) -> dict:
+        """
+        Hand an event to every connection of the user without waiting for any of them, from any thread or loop.
+        Events with `replay` get an event_id and are kept for reconnects, transient frames
+        (e.g. streamed tokens) are only sent to the sockets open right now.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            if replay:
+                data = {**data, "event_id": next(self._event_ids)}
+                recent = self._recent.get(user_id)
+                if recent is None:
+                    recent = self._recent[user_id] = deque(maxlen=self.replay_size)
+                recent.append(data)
+                self._touch(user_id)
+                self._evict_recent()
+            # scheduled under the lock, so every connection gets the events in event_id order
+            for connection in self.active_connections.get(user_id, ()):
+                connection.loop.call_soon_threadsafe(self._deliver, connection, data)
+        return data
+
+    async def send_personal_message(self, user_id: str, data: dict, replay: bool = True):
         print("Sending data to user" , user_id)
-        websocket = self.active_connections.get(user_id)
-        if websocket:
-            try:
-                await websocket.send_json(data)
-            except Exception:
-                # If the socket is closed, remove it from active connections
-                self.disconnect(user_id)
-        
-        
-websocket_manager = WebSocket_Connection_Manager()
\ No newline at end of file
+        self.publish(user_id, data, replay=replay)
+
+
+websocket_manager = WebSocket_Connection_Manager()
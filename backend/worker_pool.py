@@ -0,0 +1,172 @@
+import os
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from http_client import portal_http
+
+load_dotenv()
+
+# changable variables
+WORKER_LOOPS = int(os.getenv("WORKER_LOOPS", 4))  # event loop threads shared by all user pipelines
+WORKER_MAX_ACTIVE_USERS = int(os.getenv("WORKER_MAX_ACTIVE_USERS", 200))  # pipelines running at once, the rest wait
+WORKER_BLOCKING_THREADS = int(os.getenv("WORKER_BLOCKING_THREADS", 32))  # threads for blocking calls (asyncio.to_thread) of all loops
+
+
+class _Loop:
+    def __init__(self, index:int , executor:ThreadPoolExecutor):
+        self.loop = asyncio.new_event_loop()
+        # every to_thread / run_in_executor of every loop shares one bounded executor
+        self.loop.set_default_executor(executor)
+        self.running = 0
+        self.thread = threading.Thread(target=self._run, name=f"worker-loop-{index}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+class WorkerPool:
+    """
+    Runs every user pipeline as a task on a small fixed set of event loops instead of one thread and loop per user.
+    At most `max_active` pipelines run at once, later ones wait in FIFO order.
+    A key (user id) has at most one pipeline, submitting a running or waiting key again is a no-op.
+    """
+
+    def __init__(self, loops:int = WORKER_LOOPS , max_active:int = WORKER_MAX_ACTIVE_USERS , blocking_threads:int = WORKER_BLOCKING_THREADS):
+        self.n_loops = max(1, loops)
+        self.max_active = max(1, max_active)
+        self.blocking_threads = max(1, blocking_threads)
+
+        self._loops = []
+        self._executor = None
+        # key -> (loop, concurrent future) of running pipelines
+        self._running = {}
+        # waiting (key, factory) in submit order
+        self._waiting = deque()
+        self._waiting_keys = set()
+        # running keys to start again when they end
+        self._rerun = {}
+        # reentrant: a pipeline that ends at once runs its done callback inside submit
+        self._lock = threading.RLock()
+
+    def _start_loops(self):
+        # called with self._lock held
+        if not self._loops:
+            self._executor = ThreadPoolExecutor(max_workers=self.blocking_threads, thread_name_prefix="worker-blocking")
+            self._loops = [_Loop(i, self._executor) for i in range(self.n_loops)]
+
+    def submit(self, key:str , factory , rerun:bool = False) -> bool:
+        """
+        Run `factory()` (returns a coroutine) for `key`.
+        Returns False if the key is already running or waiting. With `rerun` a running key
+        is started once more after its pipeline ends (e.g. a stopped user started again before it wound down).
+        """
+        key = str(key)
+        with self._lock:
+            if key in self._waiting_keys:
+                return False
+            if key in self._running:
+                if rerun:
+                    self._rerun[key] = factory
+                return False
+
+            self._start_loops()
+            if len(self._running) >= self.max_active:
+                self._waiting.append((key, factory))
+                self._waiting_keys.add(key)
+                print(f"Worker pool full ({self.max_active} running), {key} is waiting")
+                return True
+            self._launch(key, factory)
+            return True
+
+    def cancel(self, key:str , stop_running:bool = False):
+        """Drop a waiting key, and with `stop_running` also cancel its running task."""
+        key = str(key)
+        with self._lock:
+            self._rerun.pop(key, None)
+            if key in self._waiting_keys:
+                self._waiting = deque(item for item in self._waiting if item[0] != key)
+                self._waiting_keys.discard(key)
+            running = self._running.get(key)
+        if stop_running and running is not None:
+            running[1].cancel()
+
+    def is_running(self, key:str) -> bool:
+        with self._lock:
+            return str(key) in self._running
+
+    def is_waiting(self, key:str) -> bool:
+        with self._lock:
+            return str(key) in self._waiting_keys
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loops": len(self._loops),
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+                "max_active": self.max_active,
+                "per_loop": [l.running for l in self._loops],
+            }
+
+    def _launch(self, key:str , factory):
+        # called with self._lock held, the least busy loop takes the pipeline
+        target = min(self._loops, key=lambda l: l.running)
+        target.running += 1
+        future = asyncio.run_coroutine_threadsafe(self._guard(key, factory), target.loop)
+        self._running[key] = (target, future)
+        future.add_done_callback(lambda f, key=key: self._done(key))
+
+    async def _guard(self, key:str , factory):
+        try:
+            await factory()
+        except asyncio.CancelledError:
+            print(f"Pipeline of {key} cancelled")
+        except Exception as e:
+            print(f"Pipeline of {key} failed: {e}")
+
+    def _done(self, key:str):
+        with self._lock:
+            target, _ = self._running.pop(key, (None, None))
+            if target is None:
+                return
+            target.running -= 1
+
+            rerun = self._rerun.pop(key, None)
+            if rerun is not None:
+                self._launch(key, rerun)
+            while self._waiting and len(self._running) < self.max_active:
+                next_key, factory = self._waiting.popleft()
+                self._waiting_keys.discard(next_key)
+                self._launch(next_key, factory)
+
+    def shutdown(self, timeout:float = 10.0):
+        """Cancel every pipeline, close the portal clients of the loops and stop them."""
+        with self._lock:
+            self._waiting.clear()
+            self._waiting_keys.clear()
+            self._rerun.clear()
+            running = [future for _, future in self._running.values()]
+            loops, self._loops = self._loops, []
+            executor, self._executor = self._executor, None
+
+        for future in running:
+            future.cancel()
+        for l in loops:
+            try:
+                asyncio.run_coroutine_threadsafe(portal_http.close(), l.loop).result(timeout)
+            except Exception as e:
+                print("Error while closing the portal client of a worker loop " , e)
+            l.loop.call_soon_threadsafe(l.loop.stop)
+            l.thread.join(timeout)
+            if not l.thread.is_alive():
+                l.loop.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+worker_pool = WorkerPool()
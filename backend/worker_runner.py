@@ -0,0 +1,224 @@
+# Runs the user pipelines outside the API process: `python worker_runner.py --processes 4` starts 4 shard processes.
+# Every user belongs to one shard, picked by a consistent hash ring, and the API reaches the owning shard
+# over its unix socket (one JSON line per request and reply). The API uses the shards when WORKER_SHARDS > 0
+# (must match --processes), otherwise the pipelines keep running inside the API process.
+import os
+import sys
+import json
+import signal
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from bisect import bisect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# changable variables
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", 0))  # 0 runs the pipelines inside the API process
+WORKER_SOCKET_DIR = os.getenv("WORKER_SOCKET_DIR", "/tmp/job_apply_workers")
+WORKER_RING_REPLICAS = int(os.getenv("WORKER_RING_REPLICAS", 160))  # virtual nodes per shard
+WORKER_IPC_TIMEOUT = float(os.getenv("WORKER_IPC_TIMEOUT", 5))  # sec
+
+
+def _hash(value:str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring, adding a shard only moves about 1/n of the users."""
+
+    def __init__(self, shards:int , replicas:int = WORKER_RING_REPLICAS):
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}#{i}"), shard) for shard in range(shards) for i in range(replicas))
+        self._keys = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def owner(self, user_id:str) -> int:
+        index = bisect(self._keys, _hash(str(user_id))) % len(self._keys)
+        return self._owners[index]
+
+
+def shard_socket(shard:int) -> str:
+    return os.path.join(WORKER_SOCKET_DIR, f"shard-{shard}.sock")
+
+
+# ---------------- shard process ----------------
+
+async def _handle(reader, writer, shard:int , ring:HashRing):
+    from job_manager import job_manager
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                op = request["op"]
+                user_id = str(request["user_id"])
+                if ring.owner(user_id) != shard:
+                    reply = {"error": f"user {user_id} is not owned by shard {shard}"}
+                elif op == "start":
+                    reply = {"started": job_manager.start_user(user_id)}
+                elif op == "stop":
+                    job_manager.stop_user(user_id)
+                    reply = {"stopped": True}
+                elif op == "status":
+                    try:
+                        reply = {"is_active": job_manager.get_user_status(user_id)}
+                    except KeyError:
+                        reply = {"is_active": False}
+                else:
+                    reply = {"error": f"unknown op {op}"}
+            except KeyError as e:
+                reply = {"error": f"user not found: {e}"}
+            except Exception as e:
+                reply = {"error": str(e)}
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _serve_shard(shard:int , shards:int):
+    from job_manager import job_manager
+
+    ring = HashRing(shards)
+    path = shard_socket(shard)
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(lambda r, w: _handle(r, w, shard, ring), path=path)
+
+    resumed = await asyncio.to_thread(job_manager.resume_active_users, lambda user_id: ring.owner(user_id) == shard)
+    print(f"Shard {shard}/{shards} listening on {path}, resumed {len(resumed)} users")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+
+    await asyncio.to_thread(job_manager.shutdown)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _use_unix_bus():
+    """Shards always publish to the gateway of the API process, whatever WORKER_SHARDS says in their environment."""
+    import notification_bus as bus_module
+
+    # before job_manager and the other producers import the bus
+    if not isinstance(bus_module.notification_bus, bus_module.UnixSocketBus):
+        bus_module.notification_bus = bus_module.UnixSocketBus()
+    return bus_module.notification_bus
+
+
+def run_shard(shard:int , shards:int):
+    _use_unix_bus()
+    asyncio.run(_serve_shard(shard, shards))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the user pipelines in N shard processes")
+    parser.add_argument("--processes", "-n", type=int, default=WORKER_SHARDS or os.cpu_count())
+    args = parser.parse_args()
+
+    os.makedirs(WORKER_SOCKET_DIR, exist_ok=True)
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_shard, args=(shard, args.processes), name=f"shard-{shard}") for shard in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def stop(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop()
+        for process in processes:
+            process.join()
+    sys.exit(0)
+
+
+# ---------------- API side ----------------
+
+class LocalWorkers:
+    """Pipelines inside the API process (WORKER_SHARDS = 0)."""
+
+    def __init__(self):
+        from job_manager import job_manager
+        self.job_manager = job_manager
+
+    async def start(self):
+        await asyncio.to_thread(self.job_manager.resume_active_users)
+
+    async def close(self):
+        await asyncio.to_thread(self.job_manager.shutdown)
+
+    async def start_user(self, user_id:str) -> bool:
+        return self.job_manager.start_user(user_id)
+
+    async def stop_user(self, user_id:str):
+        self.job_manager.stop_user(user_id)
+
+    async def get_user_status(self, user_id:str) -> bool:
+        return self.job_manager.get_user_status(user_id)
+
+
+class ShardClient:
+    """Sends start / stop / status of a user to the shard process that owns it."""
+
+    def __init__(self, shards:int = WORKER_SHARDS , timeout:float = WORKER_IPC_TIMEOUT):
+        self.ring = HashRing(shards)
+        self.timeout = timeout
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def _call(self, op:str , user_id:str) -> dict:
+        path = shard_socket(self.ring.owner(user_id))
+
+        async def call():
+            reader, writer = await asyncio.open_unix_connection(path)
+            try:
+                writer.write(json.dumps({"op": op, "user_id": str(user_id)}).encode("utf-8") + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+            finally:
+                writer.close()
+            if not line:
+                raise ConnectionError(f"shard at {path} closed the connection")
+            return json.loads(line)
+
+        reply = await asyncio.wait_for(call(), self.timeout)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    async def start_user(self, user_id:str) -> bool:
+        return (await self._call("start", user_id))["started"]
+
+    async def stop_user(self, user_id:str):
+        await self._call("stop", user_id)
+
+    async def get_user_status(self, user_id:str) -> bool:
+        return (await self._call("status", user_id))["is_active"]
+
+
+def create_user_workers(shards:int = WORKER_SHARDS):
+    return ShardClient(shards) if shards > 0 else LocalWorkers()
+
+
+if __name__ == "__main__":
+    main()
@@ -43,14 +43,37 @@ export interface AppliedJob {
   name: string;
   email: string;
   phone: string;
-  resume: string;
-  cover_letter: string;
-  evidence_points: string;
+  // left out of the job list, loaded from the detail endpoint on expand
+  resume?: string;
+  cover_letter?: string;
+  evidence_points?: string;
   job: Job;
 }
 
-const AppliedJobCard = ({ application }: { application: AppliedJob }) => {
+const AppliedJobCard = ({
+  application,
+  userId,
+}: {
+  application: AppliedJob;
+  userId: string | null;
+}) => {
   const [isExpanded, setIsExpanded] = useState(false);
+  const [details, setDetails] = useState<AppliedJob>(application);
+
+  const toggleExpanded = async () => {
+    setIsExpanded(!isExpanded);
+    if (isExpanded || !userId || details.resume !== undefined) return;
+
+    try {
+      const res = await fetch(
+        `${process.env.NEXT_PUBLIC_BACKEND_URL}/jobs/${userId}/applied/${application.job_id}`,
+      );
+      if (!res.ok) throw new Error("Failed to fetch application details");
+      setDetails(await res.json());
+    } catch (err) {
+      console.error(err);
+    }
+  };
 
   return (
     <section id={application.job.id} className="bg-white dark:bg-zinc-950 border border-slate-200 dark:border-zinc-800 rounded-md shadow-sm transition-all duration-200 hover:border-slate-400 dark:hover:border-zinc-600">
@@ -134,7 +157,7 @@ const AppliedJobCard = ({ application }: { application: AppliedJob }) => {
             ))}
           </div>
           <button
-            onClick={() => setIsExpanded(!isExpanded)}
+            onClick={toggleExpanded}
             className="group flex items-center gap-1 cursor-pointer text-[13px] font-bold tracking-normal text-slate-500 dark:text-zinc-400 hover:text-slate-900 dark:hover:text-white transition-colors"
           >
             {isExpanded ? "Collapse" : "Details"}
@@ -161,7 +184,7 @@ const AppliedJobCard = ({ application }: { application: AppliedJob }) => {
                       remarkPlugins={[remarkGfm]}
                       rehypePlugins={[rehypeRaw]}
                     >
-                      {application.cover_letter}
+                      {details.cover_letter ?? "Loading..."}
                     </ReactMarkdown>
                   </div>
                 </div>
@@ -191,7 +214,7 @@ const AppliedJobCard = ({ application }: { application: AppliedJob }) => {
                       remarkPlugins={[remarkGfm]}
                       rehypePlugins={[rehypeRaw]}
                     >
-                      {application.evidence_points}
+                      {details.evidence_points ?? "Loading..."}
                     </ReactMarkdown>
                   </div>
                 </div>
@@ -237,7 +260,7 @@ const AppliedJobCard = ({ application }: { application: AppliedJob }) => {
                         remarkPlugins={[remarkGfm]}
                         rehypePlugins={[rehypeRaw]}
                       >
-                        {application.resume}
+                        {details.resume ?? "Loading..."}
                       </ReactMarkdown>
                     </div>
                   </div>
@@ -216,7 +216,11 @@ const AppliedJobsPage = () => {
               </p>
             ) : applications.length > 0 ? (
               applications.map((app) => (
-                <AppliedJobCard key={app.job_id} application={app} />
+                <AppliedJobCard
+                  key={app.job_id}
+                  application={app}
+                  userId={getCookie("user_id")}
+                />
               ))
             ) : (
               <div className="py-20 text-center border-2 border-dashed border-slate-200 dark:border-zinc-800 rounded-xl">
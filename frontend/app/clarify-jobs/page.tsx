@@ -71,6 +71,10 @@ const JobClarificationPage: React.FC = () => {
   const [loading, setLoading] = useState<boolean>(true);
   const [clarifyJobs, setClarifyJobs] = useState<Job[]>([]);
   const [isSubmitting, setIsSubmitting] = useState(false);
+  // clarification reports still being generated, job_id -> text so far
+  const [streamingReports, setStreamingReports] = useState<
+    Record<string, { attempt: number; text: string }>
+  >({});
 
   const currentJob = clarifyJobs[activeJobIndex];
 
@@ -148,7 +152,7 @@ const JobClarificationPage: React.FC = () => {
         }
 
         const response = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL}/jobs/${userId}/calrify`,
+          `${process.env.NEXT_PUBLIC_BACKEND_URL}/jobs/${userId}/calrify?fields=all`,
         );
 
         if (!response.ok) {
@@ -180,6 +184,22 @@ const JobClarificationPage: React.FC = () => {
     fetchClarifyJobs();
   }, []);
 
+  // tokens of reports being generated arrive over the notification socket
+  useEffect(() => {
+    const onStream = (event: Event) => {
+      const { job_id, attempt, delta } = (event as CustomEvent).detail;
+      setStreamingReports((prev) => {
+        const current = prev[job_id];
+        // a retried generation starts the report over
+        const text =
+          current && current.attempt === attempt ? current.text + delta : delta;
+        return { ...prev, [job_id]: { attempt, text } };
+      });
+    };
+    window.addEventListener("clarify-stream", onStream);
+    return () => window.removeEventListener("clarify-stream", onStream);
+  }, []);
+
   if (loading) {
     return (
       <div className="flex flex-col h-screen pt-[60px] items-center justify-center  bg-zinc-100  dark:bg-zinc-950 rounded-xl px-6 py-8">
@@ -320,7 +340,8 @@ const JobClarificationPage: React.FC = () => {
                         remarkPlugins={[remarkGfm]}
                         rehypePlugins={[rehypeRaw]}
                       >
-                        {currentJob.clarification}
+                        {currentJob.clarification ??
+                          streamingReports[String(currentJob.id)]?.text}
                       </ReactMarkdown>
                     </div>
                   </div>
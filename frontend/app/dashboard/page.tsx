@@ -56,73 +56,37 @@ const DashboardPage = () => {
 
   const userId = getCookie("user_id");
 
-  // Fetch job stats and recent jobs
-  const fetchJobStats = async () => {
+  // Fetch job stats, recent jobs and processing status in one request
+  const fetchDashboardStats = async () => {
     if (!userId) return;
 
     try {
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL;
 
-      const [appliedRes, pendingRes, clarifyRes, rejectedRes] =
-        await Promise.all([
-          fetch(`${backendUrl}/jobs/${userId}/applied`),
-          fetch(`${backendUrl}/jobs/${userId}/pending`),
-          fetch(`${backendUrl}/jobs/${userId}/calrify`),
-          fetch(`${backendUrl}/jobs/${userId}/rejected`),
-        ]);
-
-      const appliedData = await appliedRes.json();
-      const pendingData = await pendingRes.json();
-      const clarifyData = await clarifyRes.json();
-      const rejectedData = await rejectedRes.json();
-
-      const appliedJobs = appliedData.jobs || [];
-      const pendingJobs = pendingData.jobs || [];
-      const clarifyJobs = clarifyData.jobs || [];
-      const rejectedJobs = rejectedData.jobs || [];
-
-      const applied = appliedJobs.length;
-      const pending = pendingJobs.length;
-      const clarify = clarifyJobs.length;
-      const rejected = rejectedJobs.length;
-      const total = applied + pending + clarify + rejected;
+      const response = await fetch(`${backendUrl}/dashboard-stats/${userId}`);
+      if (!response.ok) {
+        throw new Error("Failed to fetch dashboard stats");
+      }
+      const data = await response.json();
 
+      const { applied, pending, clarify, rejected, total } = data.counts;
       setStats({ applied, pending, clarify, rejected, total });
 
-      // Get recent 5 jobs from each category
+      // latest 5 jobs of each category, newest first
       setRecentJobs({
-        applied: appliedJobs.slice(-5).reverse(),
-        pending: pendingJobs.slice(-5).reverse(),
-        clarify: clarifyJobs.slice(-5).reverse(),
-        rejected: rejectedJobs.slice(-5).reverse(),
+        applied: data.recent.applied || [],
+        pending: data.recent.pending || [],
+        clarify: data.recent.clarify || [],
+        rejected: data.recent.rejected || [],
       });
+
+      setIsProcessing(data.is_active || false);
     } catch (error) {
       console.error("Error fetching job stats:", error);
       showToast("Failed to load job statistics", 0);
     }
   };
 
-  // Fetch user status
-  const fetchUserStatus = async () => {
-    if (!userId) return;
-
-    try {
-      const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL;
-
-      // Fetch processing status from job_manager
-      const processingStatusResponse = await fetch(
-        `${backendUrl}/user/${userId}/processing-status`,
-      );
-      if (processingStatusResponse.ok) {
-        const processingData = await processingStatusResponse.json();
-        setIsProcessing(processingData.is_active || false);
-      }
-    } catch (error) {
-      console.error("Error fetching user status:", error);
-      showToast("Failed to load user status", 0);
-    }
-  };
-
   // Fetch application status
   const fetchApplicationStatus = async () => {
     if (!userId) return;
@@ -159,9 +123,8 @@ const DashboardPage = () => {
     const loadData = async () => {
       setLoading(true);
       await Promise.all([
-        fetchJobStats(),
+        fetchDashboardStats(),
         fetchApplicationStatus(),
-        fetchUserStatus(),
       ]);
       setLoading(false);
     };
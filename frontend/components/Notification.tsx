@@ -43,6 +43,7 @@ export function NotificationMenu({ userId }: { userId: string | null }) {
   const menuRef = useRef<HTMLDivElement>(null);
   const router = useRouter();
   const socketRef = useRef<WebSocket | null>(null);
+  const lastEventIdRef = useRef<number | null>(null);
   const audioCtxRef = useRef<AudioContext | null>(null);
 
   const playNotificationSound = () => {
@@ -91,34 +92,74 @@ export function NotificationMenu({ userId }: { userId: string | null }) {
       ? backendUrl.replace("https", "wss")
       : backendUrl.replace("http", "ws");
 
-    const socket = new WebSocket(`${wsUrl}/ws/${userId}`);
-
-    console.log("socket connected", socket);
-    socketRef.current = socket;
-
-    socket.onopen = () => console.log("WebSocket connected");
-
-    socket.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      setNotifications((prev) => [
-        {
-          id: Date.now(),
-          type: data.type,
-          message: data.message,
-          job_id: data.job_id,
-        },
-        ...prev,
-      ]);
-      setHasUnread(true);
-      playNotificationSound();
-    };
+    let socket: WebSocket | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let retries = 0;
+    let closedByUs = false;
+
+    // reconnects resume after the last event seen, the backend replays the missed ones
+    const connect = () => {
+      const resume =
+        lastEventIdRef.current !== null
+          ? `?last_event_id=${lastEventIdRef.current}`
+          : "";
+      socket = new WebSocket(`${wsUrl}/ws/${userId}${resume}`);
+      socketRef.current = socket;
+
+      socket.onopen = () => {
+        retries = 0;
+        console.log("WebSocket connected");
+      };
+
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+
+        // live tokens of a clarification report, shown by the clarify page, not a notification
+        if (data.type === "clarify_stream") {
+          window.dispatchEvent(new CustomEvent("clarify-stream", { detail: data }));
+          return;
+        }
 
-    socket.onerror = () => {
-      console.log("Socket connection failed");
-      showToast("Socket connection failed. Please refresh once", 0);
+        if (typeof data.event_id === "number") {
+          lastEventIdRef.current = data.event_id;
+        }
+
+        setNotifications((prev) => [
+          {
+            id: data.event_id ?? Date.now(),
+            type: data.type,
+            message: data.message,
+            job_id: data.job_id,
+          },
+          ...prev,
+        ]);
+        setHasUnread(true);
+        playNotificationSound();
+      };
+
+      socket.onerror = () => {
+        console.log("Socket connection failed");
+        if (retries >= 3) {
+          showToast("Socket connection failed. Please refresh once", 0);
+        }
+      };
+
+      // closed by the backend (e.g. 1013 when this tab fell behind) or the network: reconnect with backoff
+      socket.onclose = () => {
+        if (closedByUs) return;
+        const delay = Math.min(30000, 1000 * 2 ** retries);
+        retries += 1;
+        retryTimer = setTimeout(connect, delay);
+      };
     };
 
-    return () => socket.close();
+    connect();
+
+    return () => {
+      closedByUs = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+    };
   }, [userId]);
 
   // 2. Clear badge when menu opens
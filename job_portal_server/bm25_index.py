@@ -0,0 +1,425 @@
+import os
+import re
+import json
+import math
+import shutil
+import hashlib
+import threading
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# changable variables
+BM25_K1 = float(os.getenv("BM25_K1", 1.5))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+BM25_BLOCK_SIZE = int(os.getenv("BM25_BLOCK_SIZE", 128))  # postings per skip entry
+BM25_MERGE_MIN_DOCS = int(os.getenv("BM25_MERGE_MIN_DOCS", 1000))  # changes kept in the delta before a merge is considered
+BM25_MERGE_RATIO = float(os.getenv("BM25_MERGE_RATIO", 0.1))  # merge when the changes reach this share of the base docs
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TF = np.iinfo(np.uint16).max
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _id_hash(doc_id):
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _map(path, dtype):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class _Segment:
+    """
+    Immutable on-disk part of the index, one directory written by a merge and memory-mapped on load:
+      lexicon.json         term -> [start, df, skip_start, max_tf, min_len] and the segment stats
+      deltas.u32           doc ids of every posting list, delta encoded (the first one is absolute)
+      skips.u32            absolute doc id at the start of every block of BM25_BLOCK_SIZE postings
+      tfs.u16              term frequency of every posting
+      doc_lens.u32         tokens per doc
+      doc_ids.bin / .u64   job ids (utf-8, back to back) and their offsets, decoded only for results
+      id_hashes.u64        64 bit hash of every job id, sorted, to find a doc by job id
+      id_order.u32         doc id of every entry of id_hashes.u64
+    """
+
+    def __init__(self, directory=None):
+        self.terms = {}
+        self.size = 0
+        self.total_len = 0
+        self.block_size = BM25_BLOCK_SIZE
+        if directory is None:
+            self.deltas = self.skips = self.doc_lens = np.zeros(0, dtype=np.uint32)
+            self.tfs = np.zeros(0, dtype=np.uint16)
+            self.id_offsets = np.zeros(1, dtype=np.uint64)
+            self.id_bytes = b""
+            self.id_hashes = np.zeros(0, dtype=np.uint64)
+            self.id_order = np.zeros(0, dtype=np.uint32)
+            return
+
+        with open(os.path.join(directory, "lexicon.json"), "r", encoding="utf-8") as f:
+            lexicon = json.load(f)
+        self.terms = lexicon["terms"]
+        self.size = lexicon["docs"]
+        self.total_len = lexicon["total_len"]
+        self.block_size = lexicon["block_size"]
+        self.deltas = _map(os.path.join(directory, "deltas.u32"), np.uint32)
+        self.skips = _map(os.path.join(directory, "skips.u32"), np.uint32)
+        self.tfs = _map(os.path.join(directory, "tfs.u16"), np.uint16)
+        self.doc_lens = _map(os.path.join(directory, "doc_lens.u32"), np.uint32)
+        self.id_offsets = _map(os.path.join(directory, "doc_ids.u64"), np.uint64)
+        self.id_bytes = _map(os.path.join(directory, "doc_ids.bin"), np.uint8)
+        self.id_hashes = _map(os.path.join(directory, "id_hashes.u64"), np.uint64)
+        self.id_order = _map(os.path.join(directory, "id_order.u32"), np.uint32)
+
+    @staticmethod
+    def hash_ids(doc_ids):
+        """(sorted hashes, doc id of each) of the job ids, in doc id order."""
+        hashes = np.fromiter((_id_hash(i) for i in doc_ids), dtype=np.uint64, count=len(doc_ids))
+        order = np.argsort(hashes, kind="stable").astype(np.uint32)
+        return hashes[order], order
+
+    def doc_id(self, i):
+        return bytes(self.id_bytes[int(self.id_offsets[i]):int(self.id_offsets[i + 1])]).decode("utf-8")
+
+    def find(self, doc_id):
+        """Doc id of a job id, None when the segment does not hold it."""
+        h = np.uint64(_id_hash(doc_id))
+        j = int(np.searchsorted(self.id_hashes, h))
+        while j < len(self.id_hashes) and self.id_hashes[j] == h:
+            i = int(self.id_order[j])
+            if self.doc_id(i) == doc_id:
+                return i
+            j += 1
+        return None
+
+    def postings(self, term):
+        """(doc ids, tfs) of the whole list."""
+        start, df = self.terms[term][:2]
+        ids = np.cumsum(self.deltas[start:start + df], dtype=np.int64)
+        return ids, np.asarray(self.tfs[start:start + df], dtype=np.float64)
+
+    def lookup(self, term, docs):
+        """tf of the term for every doc of the sorted `docs` (0 when absent), decoding only the blocks they fall in."""
+        start, df, skip_start = self.terms[term][:3]
+        skips = self.skips[skip_start:skip_start + -(-df // self.block_size)]
+        blocks = np.searchsorted(skips, docs, side="right") - 1
+        found = np.zeros(len(docs), dtype=np.float64)
+        for block in np.unique(blocks[blocks >= 0]):
+            s = start + block * self.block_size
+            e = min(start + df, s + self.block_size)
+            ids = int(skips[block]) + np.concatenate(([0], np.cumsum(self.deltas[s + 1:e], dtype=np.int64)))
+            rows = np.flatnonzero(blocks == block)
+            pos = np.minimum(np.searchsorted(ids, docs[rows]), len(ids) - 1)
+            hit = ids[pos] == docs[rows]
+            found[rows[hit]] = self.tfs[s:e][pos[hit]]
+        return found
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index of the job documents, in <directory>/.
+    The base segment is memory-mapped, so opening the index reads only the lexicon. Adds and deletes go
+    to an in-memory delta (new docs, tombstones) that is logged to the segment's delta.log, and
+    a merge folds it into a new base segment once it is big enough.
+    search() scores top-k with MaxScore early termination: query terms run in order of their
+    score upper bound, once the terms left cannot lift an unseen doc into the top k they only
+    re-score the current candidates, reading the posting blocks those fall in through the skip entries.
+    """
+
+    def __init__(self, directory, k1=BM25_K1, b=BM25_B):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ---------------- state ----------------
+
+    def _current(self):
+        path = os.path.join(self.directory, "CURRENT")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return f.read().strip() or None
+
+    def _load(self):
+        generation = self._current()
+        self.generation = generation
+        self.base = _Segment(os.path.join(self.directory, generation) if generation else None)
+
+        self._size = self.base.size
+        self._live = np.ones(max(16, self._size * 2), dtype=bool)
+        self.live_docs = self.base.size
+        self.total_len = self.base.total_len
+        self.deleted = 0
+
+        # delta: docs added since the last merge
+        self.delta_ids = []
+        self.delta_lens = []
+        self.delta_postings = {}
+        # job id -> internal doc id of the live delta docs, base docs are found through the segment
+        self._delta_index = {}
+
+        log_path = os.path.join(self.directory, generation or "", "delta.log")
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self._replay(log_path)
+        self._log = open(log_path, "a", encoding="utf-8")
+
+    def _replay(self, log_path):
+        if not os.path.exists(log_path):
+            return
+        good = 0
+        with open(log_path, "rb") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                if op["op"] == "add":
+                    self._add(op["id"], op["terms"])
+                else:
+                    self._delete(op["id"])
+                good += len(line)
+        # drop a torn last line
+        if os.path.getsize(log_path) != good:
+            os.truncate(log_path, good)
+
+    def _doc_lens(self, ids):
+        lens = np.empty(len(ids), dtype=np.float64)
+        in_base = ids < self.base.size
+        lens[in_base] = self.base.doc_lens[ids[in_base]]
+        if not in_base.all():
+            lens[~in_base] = np.asarray(self.delta_lens, dtype=np.float64)[ids[~in_base] - self.base.size]
+        return lens
+
+    def _doc_id(self, i):
+        return self.base.doc_id(i) if i < self.base.size else self.delta_ids[i - self.base.size]
+
+    def __len__(self):
+        return self.live_docs
+
+    # ---------------- writes ----------------
+
+    def _add(self, doc_id, terms):
+        self._delete(doc_id)
+        internal = self._size
+        if internal == len(self._live):
+            self._live = np.concatenate((self._live, np.ones(len(self._live), dtype=bool)))
+        self._live[internal] = True
+        self._size += 1
+
+        length = sum(terms.values())
+        self.delta_ids.append(doc_id)
+        self.delta_lens.append(length)
+        for term, tf in terms.items():
+            ids, tfs = self.delta_postings.setdefault(term, ([], []))
+            ids.append(internal)
+            tfs.append(min(tf, MAX_TF))
+        self._delta_index[doc_id] = internal
+        self.live_docs += 1
+        self.total_len += length
+
+    def _delete(self, doc_id):
+        internal = self._delta_index.pop(doc_id, None)
+        if internal is None:
+            internal = self.base.find(doc_id)
+            if internal is None or not self._live[internal]:
+                return False
+        self._live[internal] = False
+        self.live_docs -= 1
+        self.total_len -= int(self._doc_lens(np.array([internal]))[0])
+        self.deleted += 1
+        return True
+
+    def add(self, doc_id, text):
+        """Index (or re-index) a doc, replacing an older version with the same id."""
+        terms = dict(Counter(tokenize(text)))
+        with self._lock:
+            self._add(str(doc_id), terms)
+            self._log.write(json.dumps({"op": "add", "id": str(doc_id), "terms": terms}) + "\n")
+
+    def delete(self, doc_id):
+        with self._lock:
+            if self._delete(str(doc_id)):
+                self._log.write(json.dumps({"op": "del", "id": str(doc_id)}) + "\n")
+
+    def flush(self):
+        """Make the logged adds and deletes durable, without merging."""
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    def commit(self):
+        """Make the changes durable, merging the delta into a new base segment when it is big enough."""
+        with self._lock:
+            self.flush()
+            changes = len(self.delta_ids) + self.deleted
+            if changes >= max(BM25_MERGE_MIN_DOCS, BM25_MERGE_RATIO * self.base.size):
+                self.merge()
+
+    def merge(self):
+        """Write the live docs to a new base segment (doc ids renumbered densely) and switch to it."""
+        with self._lock:
+            live = self._live[:self._size]
+            remap = np.full(self._size, -1, dtype=np.int64)
+            remap[live] = np.arange(int(live.sum()))
+            all_lens = self._doc_lens(np.arange(self._size))[live]
+
+            number = int(self.generation.split("-")[1]) + 1 if self.generation else 1
+            generation = f"gen-{number}"
+            target = os.path.join(self.directory, generation)
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(target)
+
+            lexicon = {}
+            start = skip_start = 0
+            with open(os.path.join(target, "deltas.u32"), "wb") as deltas, \
+                    open(os.path.join(target, "skips.u32"), "wb") as skips, \
+                    open(os.path.join(target, "tfs.u16"), "wb") as tfs:
+                for term in sorted(set(self.base.terms) | set(self.delta_postings)):
+                    ids, term_tfs = self._postings(term)
+                    keep = remap[ids] >= 0
+                    ids = remap[ids[keep]]
+                    if not len(ids):
+                        continue
+                    term_tfs = term_tfs[keep]
+                    np.diff(ids, prepend=0).astype(np.uint32).tofile(deltas)
+                    ids[::BM25_BLOCK_SIZE].astype(np.uint32).tofile(skips)
+                    term_tfs.astype(np.uint16).tofile(tfs)
+                    lexicon[term] = [start, len(ids), skip_start, int(term_tfs.max()), int(all_lens[ids].min())]
+                    start += len(ids)
+                    skip_start += -(-len(ids) // BM25_BLOCK_SIZE)
+
+            all_lens.astype(np.uint32).tofile(os.path.join(target, "doc_lens.u32"))
+            doc_ids = [self._doc_id(i) for i in np.flatnonzero(live)]
+            encoded = [i.encode("utf-8") for i in doc_ids]
+            np.cumsum([0] + [len(e) for e in encoded], dtype=np.uint64).tofile(os.path.join(target, "doc_ids.u64"))
+            with open(os.path.join(target, "doc_ids.bin"), "wb") as f:
+                f.write(b"".join(encoded))
+            id_hashes, id_order = _Segment.hash_ids(doc_ids)
+            id_hashes.tofile(os.path.join(target, "id_hashes.u64"))
+            id_order.tofile(os.path.join(target, "id_order.u32"))
+            with open(os.path.join(target, "lexicon.json"), "w", encoding="utf-8") as f:
+                json.dump({"docs": len(encoded), "total_len": int(all_lens.sum()), "block_size": BM25_BLOCK_SIZE, "terms": lexicon}, f)
+
+            # the new segment becomes visible with CURRENT, the old one is dropped after
+            current_tmp = os.path.join(self.directory, "CURRENT.tmp")
+            with open(current_tmp, "w") as f:
+                f.write(generation)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(current_tmp, os.path.join(self.directory, "CURRENT"))
+
+            self._log.close()
+            old = self.generation
+            self._load()
+            if old:
+                shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+            elif os.path.exists(os.path.join(self.directory, "delta.log")):
+                os.remove(os.path.join(self.directory, "delta.log"))
+            print(f"Merged BM25 index into {generation}: {len(encoded)} docs, {len(lexicon)} terms")
+
+    # ---------------- search ----------------
+
+    def _postings(self, term):
+        ids, tfs = (self.base.postings(term) if term in self.base.terms
+                    else (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)))
+        if term in self.delta_postings:
+            delta_ids, delta_tfs = self.delta_postings[term]
+            ids = np.concatenate((ids, np.asarray(delta_ids, dtype=np.int64)))
+            tfs = np.concatenate((tfs, np.asarray(delta_tfs, dtype=np.float64)))
+        return ids, tfs
+
+    def _lookup(self, term, docs):
+        found = self.base.lookup(term, docs) if term in self.base.terms else np.zeros(len(docs))
+        if term in self.delta_postings:
+            delta_ids, delta_tfs = (np.asarray(a) for a in self.delta_postings[term])
+            pos = np.minimum(np.searchsorted(delta_ids, docs), len(delta_ids) - 1)
+            hit = delta_ids[pos] == docs
+            found[hit] = delta_tfs[pos[hit]]
+        return found
+
+    def _term_plan(self, term, avgdl):
+        df = 0
+        max_tf = 0
+        min_len = math.inf
+        if term in self.base.terms:
+            _, base_df, _, base_max_tf, base_min_len = self.base.terms[term]
+            df, max_tf, min_len = base_df, base_max_tf, base_min_len
+        if term in self.delta_postings:
+            delta_ids, delta_tfs = self.delta_postings[term]
+            df += len(delta_ids)
+            max_tf = max(max_tf, max(delta_tfs))
+            min_len = min(min_len, min(self.delta_lens[i - self.base.size] for i in delta_ids))
+        if not df:
+            return None
+        # df counts tombstoned docs until the next merge
+        df = min(df, self.live_docs)
+        idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+        bound = idf * max_tf * (self.k1 + 1) / (max_tf + self.k1 * (1 - self.b + self.b * min_len / avgdl))
+        return bound, idf
+
+    def _score(self, idf, tfs, ids, avgdl):
+        norm = self.k1 * (1 - self.b + self.b * self._doc_lens(ids) / avgdl)
+        return idf * tfs * (self.k1 + 1) / (tfs + norm) * self._live[ids]
+
+    @staticmethod
+    def _threshold(scores, k):
+        hits = scores[scores > 0]
+        return float(np.partition(hits, len(hits) - k)[len(hits) - k]) if len(hits) >= k else 0.0
+
+    def search(self, query, k):
+        """Best k (doc id, score), highest score first."""
+        with self._lock:
+            if not self.live_docs or k <= 0:
+                return []
+            avgdl = max(self.total_len / self.live_docs, 1e-9)
+            plan = []
+            for term in set(tokenize(query)):
+                term_plan = self._term_plan(term, avgdl)
+                if term_plan:
+                    plan.append((term_plan[0], term_plan[1], term))
+            plan.sort(reverse=True)
+
+            scores = np.zeros(self._size, dtype=np.float64)
+            remaining = sum(bound for bound, _, _ in plan)
+            threshold = 0.0
+            i = 0
+            # terms that can still bring a new doc into the top k read their whole list
+            while i < len(plan) and (remaining > threshold or threshold == 0):
+                bound, idf, term = plan[i]
+                ids, tfs = self._postings(term)
+                scores[ids] += self._score(idf, tfs, ids, avgdl)
+                remaining -= bound
+                threshold = self._threshold(scores, k)
+                i += 1
+
+            # the others only complete the docs that can still reach the top k
+            candidates = np.flatnonzero((scores > 0) & (scores + remaining >= threshold)) if i < len(plan) else None
+            while i < len(plan) and len(candidates):
+                bound, idf, term = plan[i]
+                tfs = self._lookup(term, candidates)
+                hit = tfs > 0
+                scores[candidates[hit]] += self._score(idf, tfs[hit], candidates[hit], avgdl)
+                remaining -= bound
+                threshold = self._threshold(scores, k)
+                candidates = candidates[scores[candidates] + remaining >= threshold]
+                i += 1
+
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > k:
+                hits = hits[np.argpartition(scores[hits], len(hits) - k)[len(hits) - k:]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [(self._doc_id(int(d)), float(scores[d])) for d in hits]
+
+    def close(self):
+        with self._lock:
+            self._log.close()
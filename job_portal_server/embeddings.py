@@ -0,0 +1,266 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from filelock import FileLock
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+# changable variables
+# local: sentence-transformers on CPU, onnx: onnxruntime with an exported model, remote: Hugging Face inference API
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./models/all-MiniLM-L6-v2-onnx")  # model.onnx (or onnx/model.onnx) and tokenizer.json
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", 256))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")  # empty disables the disk cache
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", 1024))
+
+KEY_BYTES = 32  # sha256 digest
+
+
+class SentenceTransformerBackend:
+    """all-MiniLM-L6-v2 (or any sentence-transformers model) on the local CPU."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"st:{model_name}"
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.max_seq_length = EMBEDDING_MAX_TOKENS
+
+    def encode(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+class OnnxBackend:
+    """Exported sentence-transformers model run by onnxruntime: mean pooling over the tokens, L2 normalized."""
+
+    def __init__(self, model_dir=EMBEDDING_ONNX_DIR):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "onnx", "model.onnx")
+
+        self.name = f"onnx:{os.path.basename(os.path.normpath(model_dir))}"
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_TOKENS)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts):
+        encoded = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype(np.float32)
+
+
+class RemoteBackend:
+    """Hugging Face inference API, one network call per batch."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from langchain_huggingface import HuggingFaceEndpointEmbeddings
+
+        self.name = f"hf:{model_name}"
+        self.client = HuggingFaceEndpointEmbeddings(model=model_name, huggingfacehub_api_token=os.getenv('HF_TOKEN'))
+
+    def encode(self, texts):
+        return np.array(self.client.embed_documents(list(texts)), dtype=np.float32)
+
+
+class EmbeddingDiskCache:
+    """
+    Embeddings keyed by the sha256 of the text, stored in <dir>/<backend>/:
+    vectors.f32 holds the float32 rows back to back (memory-mapped for reads), keys.bin the 32 byte
+    digest of every row in the same order. Rows are only appended, a torn append is cut off.
+    The portal and the ingest CLI share the files: appends hold append.lock and first read the rows
+    other processes added, so the row of a key always comes from the files, never from a stale count.
+    """
+
+    def __init__(self, directory, backend_name):
+        slug = hashlib.sha256(backend_name.encode("utf-8")).hexdigest()[:12]
+        self.directory = os.path.join(directory, slug)
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.bin")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.file_lock = FileLock(os.path.join(self.directory, "append.lock"), timeout=60)
+
+        self.dim = None
+        self.rows = {}
+        self._count = 0  # rows in the files, a key appended twice by racing processes keeps its first row
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        with self._lock, self.file_lock:
+            if not os.path.exists(self.meta_path):
+                with open(self.meta_path, "w") as f:
+                    json.dump({"backend": backend_name, "dim": None}, f)
+            self._sync()
+
+    def _sync(self):
+        """Read the rows appended since the last sync and cut off a torn append."""
+        # called with self._lock and the file lock held
+        if self.dim is None:
+            with open(self.meta_path, "r") as f:
+                self.dim = json.load(f)["dim"]
+            if self.dim is None:
+                return
+
+        key_size = os.path.getsize(self.keys_path) if os.path.exists(self.keys_path) else 0
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        count = min(key_size // KEY_BYTES, vector_rows)
+        known = self._count
+        if count < known:
+            # files replaced under us, start over
+            self.rows = {}
+            known = 0
+        if count > known:
+            with open(self.keys_path, "rb") as f:
+                f.seek(known * KEY_BYTES)
+                key_bytes = f.read((count - known) * KEY_BYTES)
+            for i in range(count - known):
+                self.rows.setdefault(key_bytes[i * KEY_BYTES:(i + 1) * KEY_BYTES], known + i)
+            self._mmap = None
+
+        # drop a partly written last row, no other append runs while the file lock is held
+        for path, size in ((self.keys_path, count * KEY_BYTES), (self.vectors_path, count * self.dim * 4)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self._count = count
+
+    def _vectors(self):
+        # called with self._lock held, re-mapped after every sync that found new rows
+        if self._mmap is None and self.rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+        return self._mmap
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _changed(self):
+        # called with self._lock held, another process appended rows since the last sync
+        return os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) > self._count * KEY_BYTES
+
+    def get_many(self, keys):
+        """Vectors of the cached keys, None for the others."""
+        with self._lock:
+            if any(k not in self.rows for k in keys) and self._changed():
+                with self.file_lock:
+                    self._sync()
+            vectors = self._vectors()
+            return [np.array(vectors[self.rows[k]]) if k in self.rows else None for k in keys]
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self.file_lock:
+            self._sync()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "r") as f:
+                    meta = json.load(f)
+                meta["dim"] = self.dim
+                with open(self.meta_path, "w") as f:
+                    json.dump(meta, f)
+
+            new = {}
+            for k, v in zip(keys, vectors):
+                if k not in self.rows:
+                    new.setdefault(k, v)
+            if not new:
+                return
+            # vectors first, the keys make the rows visible
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(list(new.values())).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(new))
+            for k in new:
+                self.rows[k] = self._count
+                self._count += 1
+            self._mmap = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings over a pluggable backend: texts are encoded in batches of `batch_size`,
+    document embeddings are cached on disk by content hash so re-indexing never re-embeds known text,
+    query embeddings are kept in a small in-memory LRU.
+    """
+
+    def __init__(self, backend, batch_size=EMBEDDING_BATCH_SIZE, cache_dir=EMBEDDING_CACHE_DIR, query_cache_size=EMBEDDING_QUERY_CACHE_SIZE):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.cache = EmbeddingDiskCache(cache_dir, backend.name) if cache_dir else None
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.backend.encode(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if self.cache is None:
+            return [v.tolist() for v in self._encode(texts)]
+
+        keys = [self.cache.key(t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        # every distinct missing text is encoded once
+        missing = {}
+        for i, (k, v) in enumerate(zip(keys, vectors)):
+            if v is None:
+                missing.setdefault(k, []).append(i)
+        if missing:
+            order = list(missing)
+            encoded = self._encode([texts[missing[k][0]] for k in order])
+            self.cache.put_many(order, encoded)
+            for k, v in zip(order, encoded):
+                for i in missing[k]:
+                    vectors[i] = v
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text):
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                return vector
+
+        vector = self._encode([text])[0].tolist()
+        with self._lock:
+            self._queries[text] = vector
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+
+def create_embeddings(backend=EMBEDDING_BACKEND):
+    if backend == "onnx":
+        return CachedEmbeddings(OnnxBackend())
+    if backend == "local":
+        try:
+            return CachedEmbeddings(SentenceTransformerBackend())
+        except ImportError:
+            print("sentence-transformers is not installed, using the remote embedding API")
+    elif backend != "remote":
+        print(f"Unknown EMBEDDING_BACKEND {backend}, using the remote embedding API")
+    return CachedEmbeddings(RemoteBackend())
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import argparse
+import threading
+from dotenv import load_dotenv
+from filelock import FileLock, Timeout
+
+load_dotenv()
+
+# changable variables
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+CATALOG_FILE = "job_catalog.db"  # inside the chroma persist directory
+STORE_LOCK_FILE = "store.lock"  # inside the chroma persist directory
+STORE_LOCK_TIMEOUT = float(os.getenv("STORE_LOCK_TIMEOUT", 30))  # sec the portal waits at start for a running ingest.py
+
+
+def job_hash(job):
+    return hashlib.sha256(json.dumps(job, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def iter_jobs(path):
+    """Jobs of a JSON array file, or of an NDJSON file (one job per line) read as a stream."""
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter_ndjson(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def iter_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            print(f"Skip malformed NDJSON line {number}: {e}")
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class StoreInUseError(RuntimeError):
+    """The store directory is held by another process, a running portal or ingest.py."""
+
+
+def lock_store(persist_directory="./job_chroma_db", timeout=0):
+    """
+    Take the exclusive lock of a store directory and return it, the caller holds it while it uses the store.
+    Chroma, the catalog and the BM25 index each keep state in memory, so one process writes them at a time:
+    the portal for as long as it runs (ingesting through POST /ingest), or ingest.py while the portal is down.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    lock = FileLock(os.path.join(persist_directory, STORE_LOCK_FILE))
+    try:
+        lock.acquire(timeout=timeout)
+    except Timeout:
+        raise StoreInUseError(
+            f"{persist_directory} is in use by another process. "
+            "While the portal runs, ingest jobs through its POST /ingest endpoint."
+        )
+    return lock
+
+
+class EmptySnapshotError(ValueError):
+    """A full snapshot without a single job, ingesting it would delete the whole catalog."""
+
+
+class JobCatalog:
+    """
+    Every ingested job by id with the hash of its content (sqlite). It decides what ingestion has
+    to embed, and serves the original job records for search results and job lookups.
+    """
+
+    def __init__(self, persist_directory="./job_chroma_db"):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, CATALOG_FILE)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " job TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM jobs WHERE id = ?", (str(job_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE id = ?", (str(job_id),)).fetchone() is not None
+
+    def hashes(self, job_ids):
+        with self._lock:
+            found = {}
+            ids = [str(i) for i in job_ids]
+            # stay under sqlite's bound parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(f"SELECT id, hash FROM jobs WHERE id IN ({marks})", chunk).fetchall())
+            return found
+
+    def put(self, rows):
+        """rows: (id, hash, job)"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (id, hash, job) VALUES (?, ?, ?)",
+                [(str(i), h, json.dumps(job, default=str)) for i, h, job in rows]
+            )
+            self._conn.commit()
+
+    def delete(self, job_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(str(i),) for i in job_ids])
+            self._conn.commit()
+
+    def ids_not_in(self, seen):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM jobs") if row[0] not in seen]
+
+
+class JobIngestor:
+    """
+    Incremental ingestion keyed by job id and content hash: only new or changed jobs are embedded
+    and upserted into Chroma and the keyword index, unchanged ones cost a hash. A full snapshot
+    (`full=True`) also removes the jobs it does not contain from Chroma, the keyword index and the catalog.
+    """
+
+    def __init__(self, vector_db, catalog, batch_size=INGEST_BATCH_SIZE):
+        self.vector_db = vector_db
+        self.catalog = catalog
+        self.batch_size = max(1, batch_size)
+
+    def begin(self, full=True):
+        self.full = full
+        self.seen = set()
+        self.stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "skipped": 0}
+        # a store built before the catalog existed holds vectors under random ids
+        self.legacy = full and self.catalog.count() == 0
+
+    def ingest_batch(self, jobs):
+        from search_jobs import job_document, update_bm25
+
+        # the last version of an id in the batch wins
+        latest = {}
+        for job in jobs:
+            if not isinstance(job, dict) or job.get("id") is None:
+                self.stats["skipped"] += 1
+                continue
+            latest[str(job["id"])] = job
+        self.seen.update(latest)
+
+        known = self.catalog.hashes(latest)
+        changed = []
+        for job_id, job in latest.items():
+            h = job_hash(job)
+            if known.get(job_id) == h:
+                self.stats["unchanged"] += 1
+                continue
+            self.stats["updated" if job_id in known else "added"] += 1
+            changed.append((job_id, h, job))
+
+        if not changed:
+            return
+        documents = [job_document(job) for _, _, job in changed]
+        ids = [job_id for job_id, _, _ in changed]
+        # chroma upserts by id, a changed job replaces its old vector
+        self.vector_db.add_documents(documents, ids=ids)
+        update_bm25(upserts=dict(zip(ids, documents)))
+        self.catalog.put(changed)
+
+    def finish(self):
+        if self.full and not self.seen:
+            # an empty or truncated body is far more likely than a catalog without jobs
+            raise EmptySnapshotError("full snapshot holds no job, refusing to delete every job")
+        from search_jobs import update_bm25
+
+        if self.full:
+            removed = self.catalog.ids_not_in(self.seen)
+            for batch in batched(removed, self.batch_size):
+                self.vector_db.delete(ids=batch)
+                update_bm25(deletes=batch)
+                self.catalog.delete(batch)
+            self.stats["deleted"] = len(removed)
+        if self.legacy:
+            stale = [i for i in self.vector_db.get(include=[])["ids"] if i not in self.seen]
+            for batch in batched(stale, self.batch_size):
+                self.vector_db.delete(ids=batch)
+                update_bm25(deletes=batch)
+        update_bm25(commit=True)
+        print(f"Ingested jobs: {self.stats}")
+        return self.stats
+
+    def ingest(self, jobs, full=True):
+        """Ingest an iterable of jobs (e.g. iter_jobs) in batches, returns the counts of the diff."""
+        self.begin(full)
+        for batch in batched(jobs, self.batch_size):
+            self.ingest_batch(batch)
+        return self.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest jobs (JSON array or NDJSON) into the job search index")
+    parser.add_argument("path", help="jobs.json, jobs.ndjson or - for NDJSON on stdin")
+    parser.add_argument("--persist-directory", default="./job_chroma_db")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--partial", action="store_true", help="only add and update, keep jobs missing from the input")
+    args = parser.parse_args()
+
+    try:
+        lock = lock_store(args.persist_directory)
+    except StoreInUseError as e:
+        sys.exit(str(e))
+    # loads the embedding model, only once the store is ours
+    from search_jobs import get_vector_db, init_bm25
+
+    vector_db = get_vector_db(args.persist_directory)
+    init_bm25(vector_db, args.persist_directory)
+    ingestor = JobIngestor(vector_db, JobCatalog(args.persist_directory), batch_size=args.batch_size)
+    jobs = iter_ndjson(sys.stdin) if args.path == "-" else iter_jobs(args.path)
+    try:
+        ingestor.ingest(jobs, full=not args.partial)
+    finally:
+        lock.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,98 @@
-import json
 import os
+import asyncio
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from langchain_community.retrievers import BM25Retriever
+
+from embeddings import create_embeddings
+from bm25_index import BM25Index
 
 load_dotenv()
 
-# Initialize Hugging Face Embeddings
-# 'all-MiniLM-L6-v2' is fast and effective for job matching
-embeddings = HuggingFaceEndpointEmbeddings(
-    model="sentence-transformers/all-MiniLM-L6-v2",
-    huggingfacehub_api_token= os.getenv('HF_TOKEN')
-)
+# changable variables
+SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", 60))  # rank damping of Reciprocal Rank Fusion
+SEARCH_CANDIDATE_FACTOR = int(os.getenv("SEARCH_CANDIDATE_FACTOR", 3))  # each retriever returns top_k * factor candidates
 
-bm25_retriever = None
+# Initialize Embeddings
+# 'all-MiniLM-L6-v2' is fast and effective for job matching, run locally by default (EMBEDDING_BACKEND)
+# with a disk cache, so re-indexing does not embed known text again
+embeddings = create_embeddings()
 
-def init_bm25(vector_db):
-    global bm25_retriever
-    data = vector_db.get()
-    docs = [
-        Document(page_content=d, metadata=m)
-        for d, m in zip(data["documents"], data["metadatas"])
-    ]
-    bm25_retriever = BM25Retriever.from_documents(docs)
-    bm25_retriever.k = 20
+# persistent keyword index (bm25_index.py), None until init_bm25
+bm25_index = None
 
 
-def initialize_job_store(json_file_path, persist_directory="./job_chroma_db"):
-    # 1. Load JSON data
-    with open(json_file_path, 'r') as f:
-        jobs_data = json.load(f)
-    
-    # 2. Convert JSON objects to LangChain Documents
-    # We combine key fields into 'page_content' for the embedding model to read
-    documents = []
-    for job in jobs_data:
-        # Create a string representation for embedding
-        # The ideal structure for your specific job data
-        content = (
-            f"Job Title: {job.get('title')}\n"
-            f"Company: {job.get('company')}\n"
-            f"Location: {', '.join(job.get('cities', []))}, {', '.join(job.get('countries', []))}\n"
-            f"Work Type: {'Remote' if job.get('is_remote') else 'Hybrid' if job.get('is_hybride') else 'Onsite'}\n"
-            f"Skills: {', '.join(job.get('required_skills', []))}\n"
-            f"Description: {job.get('description')}"
-        )
-        
-        clean_metadata = job.copy()
-        
-        # Convert any list values into strings
-        for key, value in clean_metadata.items():
-            if isinstance(value, list):
-                clean_metadata[key] = ", ".join(map(str, value))
-        
-        # Keep the original data in metadata so you can retrieve it later
-        doc = Document(page_content=content, metadata=clean_metadata)
-        documents.append(doc)
-    
-    print(f"Storing documents")
-    # 4. Create and persist the Vector Store
-    vector_db = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=persist_directory
+def init_bm25(vector_db, persist_directory="./job_chroma_db"):
+    """Open the BM25 index stored next to the vector store, built from the stored documents only once."""
+    global bm25_index
+    bm25_index = BM25Index(os.path.join(persist_directory, "bm25"))
+    if len(bm25_index) == 0:
+        data = vector_db.get()
+        if data["ids"]:
+            print(f"Building the BM25 index of {len(data['ids'])} stored jobs")
+            for d, m in zip(data["documents"], data["metadatas"]):
+                bm25_index.add(_doc_key(Document(page_content=d, metadata=m)), d)
+            bm25_index.merge()
+
+
+def update_bm25(upserts=None, deletes=None, commit=False):
+    """
+    Index added or changed documents ({job id: Document}) and drop deleted job ids from the keyword index.
+    The changes are durable on return, so the catalog written after them never holds jobs the index lost,
+    `commit` also merges them into the base segment when they add up.
+    """
+    if bm25_index is None:
+        raise RuntimeError("BM25 index not initialized")
+    for job_id, doc in (upserts or {}).items():
+        bm25_index.add(job_id, doc.page_content)
+    for job_id in deletes or ():
+        bm25_index.delete(job_id)
+    if commit:
+        bm25_index.commit()
+    elif upserts or deletes:
+        bm25_index.flush()
+
+
+def job_document(job):
+    """The Document indexed for a job: key fields in 'page_content' for the embedding model, the job as metadata."""
+    # Create a string representation for embedding
+    # The ideal structure for your specific job data
+    content = (
+        f"Job Title: {job.get('title')}\n"
+        f"Company: {job.get('company')}\n"
+        f"Location: {', '.join(job.get('cities', []))}, {', '.join(job.get('countries', []))}\n"
+        f"Work Type: {'Remote' if job.get('is_remote') else 'Hybrid' if job.get('is_hybride') else 'Onsite'}\n"
+        f"Skills: {', '.join(job.get('required_skills', []))}\n"
+        f"Description: {job.get('description')}"
     )
-    print(f"Stored {len(jobs_data)} jobs in {persist_directory}")
+
+    clean_metadata = job.copy()
+
+    # Convert any list values into strings
+    for key, value in clean_metadata.items():
+        if isinstance(value, list):
+            clean_metadata[key] = ", ".join(map(str, value))
+
+    # Keep the original data in metadata so you can retrieve it later
+    return Document(page_content=content, metadata=clean_metadata)
+
+
+def initialize_job_store(json_file_path, persist_directory="./job_chroma_db"):
+    """
+    Sync the store with a jobs file (JSON array or NDJSON) as a full snapshot: only new or changed
+    jobs are embedded, jobs missing from the file are removed.
+    """
+    from ingest import JobCatalog, JobIngestor, iter_jobs, lock_store
+
+    lock = lock_store(persist_directory)
+    try:
+        vector_db = get_vector_db(persist_directory)
+        if bm25_index is None:
+            init_bm25(vector_db, persist_directory)
+        JobIngestor(vector_db, JobCatalog(persist_directory)).ingest(iter_jobs(json_file_path), full=True)
+    finally:
+        lock.release()
+    print(f"Stored jobs of {json_file_path} in {persist_directory}")
     return vector_db
 
 
@@ -80,35 +106,89 @@ def get_vector_db(persist_directory="./job_chroma_db"):
     return vector_db
 
 
+def _doc_key(doc):
+    return str(doc.metadata.get("id") or doc.page_content)
+
+
+def _semantic_search(query, vector_db, k):
+    return vector_db.similarity_search(query, k=k)
+
+
+def _bm25_search(query, k):
+    # the index holds no text, the job records come from the catalog (_results)
+    return [Document(page_content="", metadata={"id": job_id}) for job_id, _ in bm25_index.search(query, k)]
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=SEARCH_RRF_K):
+    """
+    Merge ranked doc lists: score(doc) = sum over lists of 1 / (rrf_k + rank), rank starting at 1.
+    Returns (doc, score) best first.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [(docs[key], scores[key]) for key in ordered]
+
+
+def _results(fused, top_k, catalog):
+    results = []
+    for doc, score in fused[:top_k]:
+        job = catalog.get(_doc_key(doc)) if catalog else None
+        results.append({**(job or doc.metadata), "search_score": round(score, 6)})
+    return results
+
+
+def _candidate_k(top_k, candidate_k):
+    if bm25_index is None:
+        raise RuntimeError("BM25 index not initialized")
+    return candidate_k or top_k * SEARCH_CANDIDATE_FACTOR
+
+
+def _rank(vector_results, bm25_results, top_k, catalog):
+    """Fuse the two candidate lists with RRF and return the best top_k jobs with their "search_score"."""
+    return _results(reciprocal_rank_fusion([vector_results, bm25_results]), top_k, catalog)
+
+
 def search_top_jobs(
     query,
     vector_db,
     top_k=15,
-    bm25_k=15
+    candidate_k=None,
+    catalog=None
 ):
-    if bm25_retriever is None:
-        raise RuntimeError("BM25 retriever not initialized")
-     
-    # ---- Semantic search ----
-    vector_results = vector_db.similarity_search(query, k=top_k)
-
-    # ---- Keyword (BM25) search ----
-    bm25_results = bm25_retriever.invoke(query)
-
-    # ---- Merge & dedupe ----
-    seen = set()
-    combined = []
+    """
+    Hybrid search: semantic and BM25 candidates merged with Reciprocal Rank Fusion.
+    Returns the best top_k jobs, each with its fused "search_score".
+    """
+    candidate_k = _candidate_k(top_k, candidate_k)
+    return _rank(_semantic_search(query, vector_db, candidate_k), _bm25_search(query, candidate_k), top_k, catalog)
 
-    for doc in vector_results + bm25_results:
-        doc_id = doc.metadata.get("id") or doc.page_content
-        if doc_id not in seen:
-            seen.add(doc_id)
-            combined.append(doc)
 
-    return [doc.metadata for doc in combined[:top_k]]
+async def asearch_top_jobs(
+    query,
+    vector_db,
+    top_k=15,
+    candidate_k=None,
+    catalog=None
+):
+    """search_top_jobs with the semantic and BM25 retrievals running at the same time, off the event loop."""
+    candidate_k = _candidate_k(top_k, candidate_k)
+    vector_results, bm25_results = await asyncio.gather(
+        asyncio.to_thread(_semantic_search, query, vector_db, candidate_k),
+        asyncio.to_thread(_bm25_search, query, candidate_k),
+    )
+    # catalog reads stay off the loop as well
+    return await asyncio.to_thread(_rank, vector_results, bm25_results, top_k, catalog)
 
 # --- Usage Example ---
 if __name__ == "__main__":
+    from ingest import JobCatalog
+
     # Path to your JSON file
     JSON_PATH = r"./jobs.json" 
     
@@ -120,7 +200,7 @@ if __name__ == "__main__":
     
     # Search function
     user_query = "Looking for a remote Python backend developer role"
-    top_jobs = search_top_jobs(query=user_query , vector_db=vector_db)
+    top_jobs = search_top_jobs(query=user_query , vector_db=vector_db , catalog=JobCatalog())
     
     # Print results
     for i, job in enumerate(top_jobs, 1):
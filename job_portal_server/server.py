@@ -1,16 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from uuid import uuid4
 from datetime import datetime
 import random
+import asyncio
 import json
 import os
 import threading
 import uvicorn
 
-from search_jobs import search_top_jobs , get_vector_db , init_bm25
+from search_jobs import asearch_top_jobs , get_vector_db , init_bm25
+from ingest import JobCatalog , JobIngestor , EmptySnapshotError , iter_jobs , iter_ndjson , lock_store , INGEST_BATCH_SIZE , STORE_LOCK_TIMEOUT
 
 app = FastAPI(title="Job Portal Server")
 
@@ -71,25 +73,38 @@ class ApplyResponse(BaseModel):
     application_id: str
     status: str
 
+MAX_TOP_K = 100
+
 class SearchRequest(BaseModel):
     query: str
-    top_k: Optional[int] = 20
+    top_k: Optional[int] = Field(20, ge=1, le=MAX_TOP_K)
     
+# the portal is the only writer of the store while it runs, ingest.py refuses to run meanwhile
+store_lock = lock_store(timeout=STORE_LOCK_TIMEOUT)
+
 # Initialize vector store (do this once)
 vector_db = get_vector_db()
 
 # Initialize BM25 (do this once)
 init_bm25(vector_db)
 
-def job_exists(job_id: str, jobs_file: str = "./jobs.json") -> bool:
-    try:
-        with open(jobs_file, "r") as f:
-            jobs = json.load(f)
+# ingested job records by id with their content hash, results keep the catalog's shape
+catalog = JobCatalog()
+
+# first start: index the bundled jobs file, later changes go through /ingest or ingest.py
+JOB_PATH = os.path.join(BASE_DIR, "jobs.json")
+if catalog.count() == 0 and os.path.exists(JOB_PATH):
+    JobIngestor(vector_db, catalog).ingest(iter_jobs(JOB_PATH), full=True)
+
+# one ingestion at a time, a full snapshot must not race with another one
+_ingest_lock = asyncio.Lock()
 
-        return any(str(job.get("id")) == str(job_id) for job in jobs)
+def job_exists(job_id: str) -> bool:
+    try:
+        return catalog.exists(job_id)
 
     except Exception:
-        # If jobs file is unreadable, fail safe
+        # If the catalog is unreadable, fail safe
         return False
 
 
@@ -110,19 +125,21 @@ def already_applied(applied_file: str, job_id: str, user_id: str) -> bool:
 
 @app.post("/search")
 async def search_jobs(request: SearchRequest):
-    """Return top matching jobs for a user query."""
+    """
+    Return the top_k jobs matching a user query: semantic and BM25 retrieval run concurrently
+    and are merged with Reciprocal Rank Fusion, every job carries its fused "search_score".
+    """
     try:
-        # results = search_top_jobs(
-        #     query=request.query,
-        #     vector_db=vector_db,
-        # )
-        results = []
-        JOB_PATH = r"./jobs.json" 
-        with open(JOB_PATH, 'r') as f:
-            results = json.load(f)
+        results = await asearch_top_jobs(
+            query=request.query,
+            vector_db=vector_db,
+            top_k=request.top_k or 20,
+            catalog=catalog,
+        )
 
         return {
             "query": request.query,
+            "top_k": request.top_k,
             "results": results
         }
     except Exception as e:
@@ -130,6 +147,43 @@ async def search_jobs(request: SearchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/ingest")
+async def ingest_jobs(request: Request, full: bool = False, batch_size: int = INGEST_BATCH_SIZE):
+    """
+    Ingest jobs streamed as NDJSON (one job per line) in batches: only new or changed jobs are embedded.
+    With full=true the body is the whole catalog and jobs missing from it are deleted, a body
+    without any job is rejected (400) instead of wiping the catalog.
+    """
+    async def lines():
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+        if buffer:
+            yield buffer
+
+    async with _ingest_lock:
+        ingestor = JobIngestor(vector_db, catalog, batch_size=batch_size)
+        ingestor.begin(full)
+        try:
+            batch = []
+            async for line in lines():
+                batch.extend(iter_ndjson([line]))
+                if len(batch) >= ingestor.batch_size:
+                    await asyncio.to_thread(ingestor.ingest_batch, batch)
+                    batch = []
+            if batch:
+                await asyncio.to_thread(ingestor.ingest_batch, batch)
+            return await asyncio.to_thread(ingestor.finish)
+        except EmptySnapshotError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail=f"Failed to ingest jobs: {e}")
+
+
 @app.post("/apply", response_model=ApplyResponse)
 async def apply_job(payload: ApplyRequest):
     """Apply for a job and store application; randomly accept or reject immediately."""
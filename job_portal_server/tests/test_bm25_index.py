@@ -0,0 +1,142 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import bm25_index
+from bm25_index import BM25Index, tokenize
+
+WORDS = ["python", "backend", "remote", "java", "react", "senior", "data", "cloud", "django", "sql",
+         "golang", "devops", "berlin", "paris", "junior", "api", "docker", "kafka", "lead", "mobile"]
+
+
+def _docs(n, seed=7):
+    rng = random.Random(seed)
+    return {f"job-{i}": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30))) for i in range(n)}
+
+
+def _brute_force(docs, query, k, k1=bm25_index.BM25_K1, b=bm25_index.BM25_B):
+    counts = {doc_id: Counter(tokenize(text)) for doc_id, text in docs.items()}
+    avgdl = sum(sum(c.values()) for c in counts.values()) / len(counts)
+    scores = Counter()
+    for term in set(tokenize(query)):
+        df = sum(1 for c in counts.values() if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        for doc_id, c in counts.items():
+            tf = c[term]
+            if tf:
+                dl = sum(c.values())
+                scores[doc_id] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    return scores
+
+
+def _assert_top_k(index, docs, query, k):
+    expected = _brute_force(docs, query, k)
+    got = index.search(query, k)
+    assert len(got) == min(k, len(expected))
+    for doc_id, score in got:
+        assert score == pytest.approx(expected[doc_id])
+    # ties may come in any order, the scores of the top k must match
+    assert [s for _, s in got] == pytest.approx(sorted(expected.values(), reverse=True)[:k])
+
+
+QUERIES = ["python backend remote", "senior java kafka lead", "docker", "paris berlin junior data api", "unknown words"]
+
+
+def test_top_k_matches_brute_force_in_delta_and_merged_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "BM25_BLOCK_SIZE", 8)
+    docs = _docs(300)
+    index = BM25Index(str(tmp_path))
+    for doc_id, text in docs.items():
+        index.add(doc_id, text)
+    for query in QUERIES:
+        _assert_top_k(index, docs, query, 10)
+
+    index.merge()
+    for query in QUERIES:
+        for k in (1, 10, 50):
+            _assert_top_k(index, docs, query, k)
+
+    # a delta on top of the base segment, then a reload from disk
+    more = _docs(40, seed=8)
+    more = {f"new-{doc_id}": text for doc_id, text in more.items()}
+    for doc_id, text in more.items():
+        index.add(doc_id, text)
+    index.commit()
+    index.close()
+    reopened = BM25Index(str(tmp_path))
+    for query in QUERIES:
+        _assert_top_k(reopened, {**docs, **more}, query, 10)
+
+
+def test_updates_and_deletes_after_a_merge(tmp_path):
+    index = BM25Index(str(tmp_path))
+    for doc_id, text in _docs(50).items():
+        index.add(doc_id, text)
+    index.merge()
+
+    index.add("job-3", "zookeeper zookeeper")
+    index.delete("job-4")
+    index.delete("job-4")
+    index.delete("missing")
+    assert len(index) == 49
+    assert [doc_id for doc_id, _ in index.search("zookeeper", 5)] == ["job-3"]
+
+    index.commit()
+    index.close()
+    reopened = BM25Index(str(tmp_path))
+    assert len(reopened) == 49
+    assert [doc_id for doc_id, _ in reopened.search("zookeeper", 5)] == ["job-3"]
+    reopened.merge()
+    assert len(reopened) == 49
+    assert "job-4" not in {doc_id for doc_id, _ in reopened.search(" ".join(WORDS), 100)}
+
+
+def test_writes_do_not_decode_every_base_id(tmp_path, monkeypatch):
+    index = BM25Index(str(tmp_path))
+    for doc_id, text in _docs(500).items():
+        index.add(doc_id, text)
+    index.merge()
+
+    decoded = []
+    doc_id = bm25_index._Segment.doc_id
+    monkeypatch.setattr(bm25_index._Segment, "doc_id", lambda self, i: decoded.append(i) or doc_id(self, i))
+    index.add("job-1", "python")
+    index.add("fresh", "python")
+    index.delete("job-2")
+    assert len(decoded) <= 3
+
+
+def test_torn_log_line_is_dropped(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("a", "python backend")
+    index.add("b", "java")
+    index.commit()
+    index.close()
+    log = tmp_path / "delta.log"
+    with open(log, "ab") as f:
+        f.write(b'{"op": "add", "id": "c", "ter')
+
+    reopened = BM25Index(str(tmp_path))
+    assert len(reopened) == 2
+    reopened.add("c", "python")
+    reopened.commit()
+    reopened.close()
+    assert {doc_id for doc_id, _ in BM25Index(str(tmp_path)).search("python", 5)} == {"a", "c"}
+
+
+def test_flushed_changes_survive_a_crash(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("a", "python backend")
+    index.merge()
+    index.add("b", "python")
+    index.delete("a")
+    index.flush()
+
+    # the first process died without commit or close
+    reopened = BM25Index(str(tmp_path))
+    assert [doc_id for doc_id, _ in reopened.search("python", 5)] == ["b"]
+    index.close()
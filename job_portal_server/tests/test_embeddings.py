@@ -0,0 +1,57 @@
+import numpy as np
+
+from embeddings import EmbeddingDiskCache, CachedEmbeddings
+
+
+class CountingBackend:
+    name = "test:counting"
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0] for t in texts], dtype=np.float32)
+
+
+def _vector(text):
+    return CountingBackend().encode([text])[0]
+
+
+def test_documents_are_embedded_once(tmp_path):
+    backend = CountingBackend()
+    embeddings = CachedEmbeddings(backend, batch_size=2, cache_dir=str(tmp_path))
+    first = embeddings.embed_documents(["a", "bb", "a", "ccc"])
+    assert backend.encoded == ["a", "bb", "ccc"]
+
+    reopened = CachedEmbeddings(CountingBackend(), cache_dir=str(tmp_path))
+    assert reopened.embed_documents(["ccc", "a", "bb"]) == [first[3], first[0], first[1]]
+    assert reopened.backend.encoded == []
+
+
+def test_processes_appending_to_one_cache(tmp_path):
+    # the portal and the ingest CLI, each with its own view of the files
+    portal = EmbeddingDiskCache(str(tmp_path), "test:counting")
+    cli = EmbeddingDiskCache(str(tmp_path), "test:counting")
+
+    texts = ["job one", "job two", "job three", "job four"]
+    keys = [EmbeddingDiskCache.key(t) for t in texts]
+    portal.put_many(keys[:2], [_vector(t) for t in texts[:2]])
+    cli.put_many(keys[2:], [_vector(t) for t in texts[2:]])
+    portal.put_many(keys[1:3], [_vector(t) for t in texts[1:3]])
+
+    for cache in (portal, cli, EmbeddingDiskCache(str(tmp_path), "test:counting")):
+        assert [v.tolist() for v in cache.get_many(keys)] == [_vector(t).tolist() for t in texts]
+    assert sorted(portal.rows.values()) == [0, 1, 2, 3]
+
+
+def test_torn_append_is_cut_off(tmp_path):
+    cache = EmbeddingDiskCache(str(tmp_path), "test:counting")
+    cache.put_many([EmbeddingDiskCache.key("a")], [_vector("a")])
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\0" * 6)
+
+    reopened = EmbeddingDiskCache(str(tmp_path), "test:counting")
+    assert reopened.get_many([EmbeddingDiskCache.key("a")])[0].tolist() == _vector("a").tolist()
+    reopened.put_many([EmbeddingDiskCache.key("b")], [_vector("b")])
+    assert reopened.get_many([EmbeddingDiskCache.key("b")])[0].tolist() == _vector("b").tolist()
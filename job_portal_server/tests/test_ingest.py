@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ingest import JobCatalog, JobIngestor, EmptySnapshotError, StoreInUseError, job_hash, lock_store
+
+
+class UntouchableStore:
+    def __getattr__(self, name):
+        raise AssertionError(f"vector store used: {name}")
+
+
+def test_empty_full_snapshot_keeps_the_catalog(tmp_path):
+    catalog = JobCatalog(str(tmp_path))
+    job = {"id": "1", "title": "Backend developer"}
+    catalog.put([("1", job_hash(job), job)])
+
+    with pytest.raises(EmptySnapshotError):
+        JobIngestor(UntouchableStore(), catalog).ingest(iter(()), full=True)
+    assert catalog.get("1") == job
+
+
+def test_cli_refuses_a_store_in_use(tmp_path):
+    lock = lock_store(str(tmp_path))
+    try:
+        with pytest.raises(StoreInUseError):
+            lock_store(str(tmp_path))
+        cli = subprocess.run(
+            [sys.executable, "ingest.py", "jobs.json", "--persist-directory", str(tmp_path)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, timeout=60,
+        )
+    finally:
+        lock.release()
+    assert cli.returncode == 1
+    assert "POST /ingest" in cli.stderr
+    lock_store(str(tmp_path)).release()